@@ -3,111 +3,464 @@ import pandas as pd
 import yfinance as yf
 from datetime import datetime, timedelta, date
 import config
-from scanner import yang_zhang, build_term_structure
-from polygon import RESTClient
-import time
+from scanner import check_for_macro_events, check_earnings_move, earnings_move_verdict, yf_limiter
+import term_structure
+from volatility import yang_zhang_latest
+from bar_store import get_bar_store, to_price_history
+from polygon_cache import CachedRESTClient, get_cached_client
+from polygon_async import get_async_client
+import screening
 import numpy as np
+import performance_metrics
+from earnings_store import get_earnings_store
+from universe_store import get_universe_store
+from feature_store import get_feature_store
+import instrumentation
+from instrumentation import span
+import threading
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-def get_historical_spread_price(client: RESTClient, ticker: str, trade_datetime: datetime, strike: float, short_expiry: date, long_expiry: date):
+def format_option_ticker(underlying, expiry, right, strike):
+    return f"O:{underlying.upper()}{expiry.strftime('%y%m%d')}{right[0].upper()}{str(int(strike * 1000)).zfill(8)}"
+
+# Minute closes per option ticker: {option_ticker: (covered (start_ms, end_ms) ranges, timestamps, closes)},
+# least recently used first and bounded by OPTION_MINUTE_BAR_CACHE_TICKERS.
+_minute_bar_cache = OrderedDict()
+_minute_bar_lock = threading.Lock()
+
+def get_option_minute_bars(client: CachedRESTClient, option_ticker: str, start_ms: int, end_ms: int):
     """
-    Gets the historical price of a calendar spread at a specific minute in time.
+    Returns (timestamps, closes) arrays of minute bars covering [start_ms, end_ms], fetching at most once per range.
     """
-    try:
-        def format_option_ticker(underlying, expiry, right, strike):
-            return f"O:{underlying.upper()}{expiry.strftime('%y%m%d')}{right[0].upper()}{str(int(strike * 1000)).zfill(8)}"
+    with _minute_bar_lock:
+        ranges, timestamps, closes = _minute_bar_cache.get(option_ticker, ([], np.array([], dtype=np.int64), np.array([])))
+        if option_ticker in _minute_bar_cache: _minute_bar_cache.move_to_end(option_ticker)
+    hit = any(start <= start_ms and end_ms <= end for start, end in ranges)
+    instrumentation.record_cache('option_minute_bars', hit)
+    if hit: return timestamps, closes
 
-        short_ticker = format_option_ticker(ticker, short_expiry, config.OPTION_TYPE, strike)
-        long_ticker = format_option_ticker(ticker, long_expiry, config.OPTION_TYPE, strike)
-        trade_timestamp_ms = int(trade_datetime.timestamp() * 1000)
-        
-        short_bar = client.get_aggs(short_ticker, 1, "minute", trade_timestamp_ms, trade_timestamp_ms, limit=1)
-        time.sleep(4)
-        long_bar = client.get_aggs(long_ticker, 1, "minute", trade_timestamp_ms, trade_timestamp_ms, limit=1)
-        time.sleep(4)
+    bars = client.get_aggs(option_ticker, 1, "minute", start_ms, end_ms, limit=50000)
+    bars = [bar for bar in bars or [] if bar.close is not None]
+    with _minute_bar_lock:
+        ranges, timestamps, closes = _minute_bar_cache.get(option_ticker, ([], np.array([], dtype=np.int64), np.array([])))
+        merged = dict(zip(timestamps.tolist(), closes.tolist()))
+        merged.update((bar.timestamp, bar.close) for bar in bars)
+        timestamps = np.array(sorted(merged), dtype=np.int64)
+        closes = np.array([merged[ts] for ts in timestamps.tolist()], dtype=float)
+        _minute_bar_cache[option_ticker] = (ranges + [(start_ms, end_ms)], timestamps, closes)
+        _minute_bar_cache.move_to_end(option_ticker)
+        while len(_minute_bar_cache) > config.OPTION_MINUTE_BAR_CACHE_TICKERS: _minute_bar_cache.popitem(last=False)
+    return timestamps, closes
 
-        if short_bar and long_bar and short_bar[0].close is not None and long_bar[0].close is not None:
-            return round(long_bar[0].close - short_bar[0].close, 2)
-        return None
-    except Exception:
+def price_at(timestamps, closes, timestamp_ms):
+    """Returns the close of the bar at timestamp_ms, falling back to the nearest prior bar within the staleness limit."""
+    idx = np.searchsorted(timestamps, timestamp_ms, side='right') - 1
+    if idx < 0 or timestamp_ms - timestamps[idx] > config.MAX_QUOTE_STALENESS_MINUTES * 60 * 1000:
         return None
+    return float(closes[idx])
 
-def run_scanner_with_historical_data(ticker, scan_date, client):
+def get_historical_spread_prices(client: CachedRESTClient, ticker: str, trade_datetimes: list, strike: float, short_expiry: date, long_expiry: date):
     """
-    Runs the full scanner logic using the efficient unique expiration date method.
+    Gets the historical prices of a calendar spread at several minutes in time, using one minute-bar request per leg.
     """
-    print(f"  - Scanning on {scan_date}...")
     try:
-        start_of_history = scan_date - timedelta(days=400)
-        aggs = client.get_aggs(ticker, 1, "day", start_of_history.strftime("%Y-%m-%d"), scan_date.strftime("%Y-%m-%d"))
-        time.sleep(4)
-        price_history = pd.DataFrame(aggs)
-        if price_history.empty: return "Avoid", None
-        price_history['datetime'] = pd.to_datetime(price_history['timestamp'], unit='ms')
-        price_history = price_history.set_index('datetime')
-        price_history.rename(columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}, inplace=True)
-        if 'Adj Close' not in price_history.columns: price_history['Adj Close'] = price_history['Close']
-        if len(price_history) < 30: return "Avoid", None
-        
-        avg_volume = price_history['Volume'].rolling(30).mean().iloc[-1]
-        realized_vol_30d = yang_zhang(price_history)
-        avg_volume_passed = avg_volume >= config.AVG_VOLUME_THRESHOLD
-        if not avg_volume_passed: print(f"  - FAIL: Avg Volume"); return "Avoid", None
-        
-        dtes, ivs = [], []
-        min_exp = scan_date + timedelta(days=5)
-        max_exp = scan_date + timedelta(days=90)
-        contracts = client.list_options_contracts(underlying_ticker=ticker, as_of=scan_date.strftime("%Y-%m-%d"), limit=1000)
-        time.sleep(4)
+        with span('historical_spread_price', ticker=ticker):
+            short_ticker = format_option_ticker(ticker, short_expiry, config.OPTION_TYPE, strike)
+            long_ticker = format_option_ticker(ticker, long_expiry, config.OPTION_TYPE, strike)
+            trade_timestamps_ms = [int(trade_datetime.timestamp() * 1000) for trade_datetime in trade_datetimes]
+            start_ms = min(trade_timestamps_ms) - config.MAX_QUOTE_STALENESS_MINUTES * 60 * 1000
+            end_ms = max(trade_timestamps_ms)
+
+            with span('historical_spread_price.minute_bars', ticker=ticker):
+                short_bars = get_option_minute_bars(client, short_ticker, start_ms, end_ms)
+                long_bars = get_option_minute_bars(client, long_ticker, start_ms, end_ms)
+
+            prices = []
+            for timestamp_ms in trade_timestamps_ms:
+                short_close, long_close = price_at(*short_bars, timestamp_ms), price_at(*long_bars, timestamp_ms)
+                prices.append(round(long_close - short_close, 2) if short_close is not None and long_close is not None else None)
+            return prices
+    except Exception:
+        return [None] * len(trade_datetimes)
+
+def get_historical_spread_price(client: CachedRESTClient, ticker: str, trade_datetime: datetime, strike: float, short_expiry: date, long_expiry: date):
+    """
+    Gets the historical price of a calendar spread at a specific minute in time.
+    """
+    return get_historical_spread_prices(client, ticker, [trade_datetime], strike, short_expiry, long_expiry)[0]
+
+MAX_TERM_STRUCTURE_EXPIRATIONS = 6
+
+def _new_features(ticker, scan_date):
+    return {"ticker": ticker, "scan_date": scan_date, "status": "no_history", "underlying_price": None,
+            "avg_volume": None, "rv30": None, "iv30": None, "iv_rv_ratio": None, "ts_slope": None,
+            "macro_passed": None, "macro_reason": None, "implied_move": None, "historical_move": None,
+            "earnings_move_passed": None, "earnings_move_reason": None, "term_structure_method": None}
+
+def _price_features(features, bars, min_avg_volume):
+    """
+    Fills the price and volume features from the stored bars.
+
+    Returns (price_history, run_options), where run_options says whether the option stage should run.
+    """
+    if len(bars) == 0: return None, False
+    price_history = to_price_history(bars)
+    if len(bars) < 30:
+        features["status"] = "short_history"; return None, False
+    
+    with span('historical_scan.volatility', ticker=features["ticker"]):
+        features["underlying_price"] = bars['close'][-1]
+        features["avg_volume"] = avg_volume = bars['volume'][-30:].mean()
+        features["rv30"] = yang_zhang_latest(bars['open'], bars['high'], bars['low'], bars['close'])[0]
+    if min_avg_volume is not None and not avg_volume >= min_avg_volume:
+        features["status"] = "low_volume"; return price_history, False
+    return price_history, True
+
+def _expiration_window(scan_date):
+    return scan_date + timedelta(days=5), scan_date + timedelta(days=90)
+
+def _implied_volatility(bar):
+    if bar and hasattr(bar, 'greeks') and bar.greeks.implied_volatility is not None: return bar.greeks.implied_volatility
+    return None
+
+def _term_structure_features(scans):
+    """
+    Fills the IV and earnings-move features for [(features, dtes, ivs, scan_date, bars)], evaluating every
+    term structure in one batch. Scans with fewer than two (dte, iv) points are marked 'no_options'.
+    """
+    for features, dtes, *_ in scans:
+        if len(dtes) < 2: features["status"] = "no_options"
+    scans = [scan for scan in scans if len(scan[1]) >= 2]
+    if not scans: return
+
+    with span('historical_scan.term_structure', events=len(scans)):
+        iv30, ts_slope, front_iv = term_structure.term_structure_metrics(
+            *term_structure.pack([(dtes, ivs) for _, dtes, ivs, _, _ in scans]), method=config.TERM_STRUCTURE_METHOD)
+    for (features, dtes, _, scan_date, bars), scan_iv30, scan_slope, scan_front_iv in zip(scans, iv30, ts_slope, front_iv):
+        features["iv30"], features["ts_slope"] = float(scan_iv30), float(scan_slope)
+        features["term_structure_method"] = config.TERM_STRUCTURE_METHOD
+        features["iv_rv_ratio"] = features["iv30"] / features["rv30"] if features["rv30"] > 0 else float('inf')
+        with span('historical_scan.macro', ticker=features["ticker"]):
+            features["macro_passed"], features["macro_reason"] = check_for_macro_events(as_of=scan_date)
+        with span('historical_scan.earnings_move', ticker=features["ticker"]):
+            (features["earnings_move_passed"], features["earnings_move_reason"],
+             features["implied_move"], features["historical_move"]) = check_earnings_move(features["ticker"], bars, scan_date, float(scan_front_iv), min(dtes))
+        features["status"] = "complete"
+
+def compute_historical_features(ticker, scan_date, client, min_avg_volume=None):
+    """
+    Computes the raw scanner features for a ticker as of scan_date without applying any thresholds.
+
+    The option-chain stage is skipped when avg volume is below min_avg_volume (None always runs it).
+    Returns (features, price_history); features['status'] is 'complete' when every feature is available.
+    """
+    features = _new_features(ticker, scan_date)
+    start_of_history = scan_date - timedelta(days=400)
+    bar_store = get_bar_store('polygon')
+    with span('historical_scan.bars', ticker=ticker):
+        bar_store.sync(ticker, start_of_history, scan_date, client)
+        bars = bar_store.bars(ticker, start_of_history, scan_date)
+    price_history, run_options = _price_features(features, bars, min_avg_volume)
+    if not run_options: return features, price_history
+    
+    dtes, ivs = [], []
+    min_exp, max_exp = _expiration_window(scan_date)
+    with span('historical_scan.option_ivs', ticker=ticker):
+        contracts = client.list_options_contracts(underlying_ticker=ticker, as_of=scan_date.strftime("%Y-%m-%d"),
+                                                  expiration_date_gte=min_exp.strftime("%Y-%m-%d"), expiration_date_lte=max_exp.strftime("%Y-%m-%d"), limit=1000)
         
         processed_expirations = set()
-        max_unique_expirations = 6
 
         for contract in contracts:
-            if len(processed_expirations) >= max_unique_expirations:
+            if len(processed_expirations) >= MAX_TERM_STRUCTURE_EXPIRATIONS:
                 break
 
             exp_date_str = contract.expiration_date
             if exp_date_str not in processed_expirations:
-                time.sleep(4)
                 exp_date = datetime.strptime(exp_date_str, "%Y-%m-%d").date()
                 if min_exp <= exp_date <= max_exp:
                     try:
-                        bar = client.get_daily_open_close_agg(contract.ticker, scan_date.strftime("%Y-%m-%d"))
-                        if bar and hasattr(bar, 'greeks') and bar.greeks.implied_volatility is not None:
+                        implied_volatility = _implied_volatility(client.get_daily_open_close_agg(contract.ticker, scan_date.strftime("%Y-%m-%d")))
+                        if implied_volatility is not None:
                             dtes.append((exp_date - scan_date).days)
-                            ivs.append(bar.greeks.implied_volatility)
+                            ivs.append(implied_volatility)
                             processed_expirations.add(exp_date_str)
                     except Exception:
                         continue
-        
-        if len(dtes) < 2: print("  - FAIL: Not enough options data."); return "Avoid", None
+    
+    _term_structure_features([(features, dtes, ivs, scan_date, bars)])
+    return features, price_history
 
-        term_spline = build_term_structure(dtes, ivs)
-        iv30 = float(term_spline(30))
-        iv_rv_ratio = iv30 / realized_vol_30d if realized_vol_30d > 0 else float('inf')
-        dte_start = min(dtes)
-        ts_slope = (float(term_spline(45)) - float(term_spline(dte_start))) / (45 - dte_start) if (45 - dte_start) != 0 else 0
-        
-        iv_rv_passed = iv_rv_ratio >= config.IV_RV_RATIO_THRESHOLD
-        slope_passed = ts_slope <= config.TERM_STRUCTURE_SLOPE_THRESHOLD
-        
-        if not iv_rv_passed: print(f"  - FAIL: IV/RV Ratio"); return "Avoid", None
-        if not slope_passed: print(f"  - FAIL: Term Structure Slope"); return "Avoid", None
-        
-        print(f"    - Scanner Checks: PASS")
-        return "Recommended", price_history
-        
+async def _term_structure_points_async(client, contracts, scan_date):
+    """
+    Fetches the per-expiry IVs concurrently, choosing the same expiries as the sequential loop.
+
+    Each round asks for one contract from each of the earliest expiries still needed. An expiry whose
+    contract has no IV tries its next contract in the following round. Requests stop once
+    MAX_TERM_STRUCTURE_EXPIRATIONS expiries have an IV.
+    """
+    min_exp, max_exp = _expiration_window(scan_date)
+    candidates = {}
+    for contract in contracts:
+        exp_date = datetime.strptime(contract.expiration_date, "%Y-%m-%d").date()
+        if min_exp <= exp_date <= max_exp: candidates.setdefault(exp_date, []).append(contract.ticker)
+
+    async def fetch_iv(option_ticker):
+        try:
+            return _implied_volatility(await client.get_daily_open_close_agg(option_ticker, scan_date.strftime("%Y-%m-%d")))
+        except Exception:
+            return None
+
+    found, pending = {}, list(candidates)
+    while pending and len(found) < MAX_TERM_STRUCTURE_EXPIRATIONS:
+        batch = pending[:MAX_TERM_STRUCTURE_EXPIRATIONS - len(found)]
+        results = await asyncio.gather(*(fetch_iv(candidates[exp_date].pop(0)) for exp_date in batch))
+        found.update((exp_date, iv) for exp_date, iv in zip(batch, results) if iv is not None)
+        pending = [exp_date for exp_date in pending if exp_date not in found and candidates[exp_date]]
+    exp_dates = [exp_date for exp_date in candidates if exp_date in found]
+    return [(exp_date - scan_date).days for exp_date in exp_dates], [found[exp_date] for exp_date in exp_dates]
+
+async def _historical_points_async(ticker, scan_date, client, min_avg_volume=None):
+    """
+    Fetches everything compute_historical_features_async needs for one scan, returning (features, price_history, dtes, ivs, bars).
+
+    features has its price features filled; the term structure features are left for _term_structure_features.
+    """
+    features = _new_features(ticker, scan_date)
+    start_of_history = scan_date - timedelta(days=400)
+    bar_store = get_bar_store('polygon')
+    with span('historical_scan.bars', ticker=ticker):
+        # The bar store is synchronous, so it runs in a worker thread and fetches through the client's loop.
+        await asyncio.to_thread(bar_store.sync, ticker, start_of_history, scan_date, client.blocking())
+        bars = bar_store.bars(ticker, start_of_history, scan_date)
+    price_history, run_options = _price_features(features, bars, min_avg_volume)
+    if not run_options: return features, price_history, None, None, bars
+
+    min_exp, max_exp = _expiration_window(scan_date)
+    with span('historical_scan.option_ivs', ticker=ticker):
+        contracts = await client.list_options_contracts(underlying_ticker=ticker, as_of=scan_date.strftime("%Y-%m-%d"),
+                                                        expiration_date_gte=min_exp.strftime("%Y-%m-%d"), expiration_date_lte=max_exp.strftime("%Y-%m-%d"), limit=1000)
+        dtes, ivs = await _term_structure_points_async(client, contracts, scan_date)
+    return features, price_history, dtes, ivs, bars
+
+async def compute_historical_features_async(ticker, scan_date, client, min_avg_volume=None):
+    """
+    Async compute_historical_features for an AsyncPolygonClient: same features, with the per-expiry IV requests in flight together.
+    """
+    features, price_history, dtes, ivs, bars = await _historical_points_async(ticker, scan_date, client, min_avg_volume)
+    if dtes is not None: _term_structure_features([(features, dtes, ivs, scan_date, bars)])
+    return features, price_history
+
+def evaluate_historical_features(features):
+    """
+    Applies the scanner thresholds in config.py to computed features and returns the verdict.
+    """
+    if features["status"] in ("no_history", "short_history"): return "Avoid"
+    
+    avg_volume_passed = features["avg_volume"] >= config.AVG_VOLUME_THRESHOLD
+    if not avg_volume_passed: print(f"  - FAIL: Avg Volume"); return "Avoid"
+    if features["status"] == "no_options": print("  - FAIL: Not enough options data."); return "Avoid"
+    
+    iv_rv_passed = features["iv_rv_ratio"] >= config.IV_RV_RATIO_THRESHOLD
+    slope_passed = features["ts_slope"] <= config.TERM_STRUCTURE_SLOPE_THRESHOLD
+    
+    if not iv_rv_passed: print(f"  - FAIL: IV/RV Ratio"); return "Avoid"
+    if not slope_passed: print(f"  - FAIL: Term Structure Slope"); return "Avoid"
+
+    if not features["macro_passed"]: print(f"  - FAIL: Macro Event ({features['macro_reason']})"); return "Consider (Core Passed)"
+    if features.get("earnings_move_passed") not in (None, True):
+        print(f"  - FAIL: Earnings Move ({features.get('earnings_move_reason') or 'implied move below historical'})"); return "Consider (Core Passed)"
+    
+    print(f"    - Scanner Checks: PASS")
+    return "Recommended"
+
+def _stored_features(ticker, scan_date, min_avg_volume=None):
+    """
+    Returns the feature-store row for (ticker, scan_date) if it can answer a scan with this volume bar, else None.
+
+    The macro and earnings-move verdicts of a returned row are re-derived under the current config.
+    """
+    stored = get_feature_store().lookup(ticker, scan_date, 'historical')
+    # A low-volume row skipped the option stage, so it only answers callers with an equal or higher volume bar.
+    # Rows without enough bars may come from a transient empty fetch, which bar_store.sync does not record either.
+    # iv30, ts_slope and the implied move depend on how the term structure was fitted.
+    hit = (bool(stored) and stored["status"] not in ("no_history", "short_history")
+           and (stored["status"] != "low_volume" or (min_avg_volume is not None and stored["avg_volume"] < min_avg_volume))
+           and (stored["status"] != "complete" or stored["term_structure_method"] == config.TERM_STRUCTURE_METHOD))
+    instrumentation.record_cache('feature_store', hit)
+    if not hit: return None
+    if stored["status"] == "complete":
+        stored["macro_passed"], stored["macro_reason"] = check_for_macro_events(as_of=scan_date)
+        stored["earnings_move_passed"], stored["earnings_move_reason"] = earnings_move_verdict(stored["implied_move"], stored["historical_move"])
+    return stored
+
+def get_historical_features(ticker, scan_date, client, min_avg_volume=None):
+    """
+    Returns the features for (ticker, scan_date) from the feature store, computing and storing them on a miss.
+    """
+    stored = _stored_features(ticker, scan_date, min_avg_volume)
+    if stored is not None: return stored
+    features, _ = compute_historical_features(ticker, scan_date, client, min_avg_volume=min_avg_volume)
+    get_feature_store().append(features, 'historical')
+    return features
+
+def _historical_scan(ticker, scan_date, compute):
+    """
+    Shared body of the historical scanners: runs compute() in the 'historical_scan' span and applies the thresholds.
+
+    compute returns (features, price_history). Returns (scan_result, features, price_history), or ("Avoid", None, None) on failure.
+    """
+    print(f"  - Scanning on {scan_date}...")
+    try:
+        with span('historical_scan', ticker=ticker, scan_date=scan_date):
+            features, price_history = compute()
+            scan_result = evaluate_historical_features(features)
+        return scan_result, features, price_history
+    except Exception as e:
+        print(f"  - Scanner failed: {e}"); return "Avoid", None, None
+
+def run_scanner_with_historical_data(ticker, scan_date, client):
+    """
+    Runs the full scanner logic using the efficient unique expiration date method.
+    """
+    def compute():
+        features, price_history = compute_historical_features(ticker, scan_date, client, min_avg_volume=config.AVG_VOLUME_THRESHOLD)
+        get_feature_store().append(features, 'historical')
+        return features, price_history
+
+    scan_result, _, price_history = _historical_scan(ticker, scan_date, compute)
+    return scan_result, (price_history if scan_result != "Avoid" else None)
+
+async def run_scanner_with_historical_data_async(ticker, scan_date, client):
+    """
+    Async run_scanner_with_historical_data for an AsyncPolygonClient (a batch of one for run_historical_scans_async).
+    """
+    return (await run_historical_scans_async([(ticker, scan_date)], client))[0]
+
+async def historical_features_async(scans, client, max_concurrent=config.POLYGON_ASYNC_MAX_EVENTS, reuse_stored=False):
+    """
+    Computes and stores the features of (ticker, scan_date) pairs with up to max_concurrent in flight.
+
+    The requests run per scan; the term structures of every scan are then evaluated together in one batch.
+    With reuse_stored, pairs the feature store can answer are taken from it (without a price history), as
+    get_historical_features does.
+
+    Returns:
+        list: (features, price_history) per pair in input order, or None for a scan that failed.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def fetch(ticker, scan_date):
+        print(f"  - Scanning {ticker} on {scan_date}...")
+        async with semaphore:
+            try:
+                with span('historical_scan', ticker=ticker, scan_date=scan_date):
+                    return await _historical_points_async(ticker, scan_date, client, min_avg_volume=config.AVG_VOLUME_THRESHOLD)
+            except Exception as e:
+                print(f"  - Scanner failed for {ticker} on {scan_date}: {e}"); return None
+
+    results = [None] * len(scans)
+    if reuse_stored:
+        for i, (ticker, scan_date) in enumerate(scans):
+            stored = _stored_features(ticker, scan_date, config.AVG_VOLUME_THRESHOLD)
+            if stored is not None: results[i] = (stored, None)
+    to_fetch = [i for i, result in enumerate(results) if result is None]
+    fetched = dict(zip(to_fetch, await asyncio.gather(*(fetch(*scans[i]) for i in to_fetch))))
+    with span('historical_scan.evaluate', events=len(to_fetch)):
+        pending = {i: (scan[0], scan[2], scan[3], scans[i][1], scan[4]) for i, scan in fetched.items()
+                   if scan is not None and scan[2] is not None}
+        try:
+            _term_structure_features(list(pending.values()))
+        except Exception:
+            # Redo the scans one at a time so a failing check only costs its own scan.
+            for i, item in pending.items():
+                try:
+                    _term_structure_features([item])
+                except Exception as e:
+                    print(f"  - Scanner failed for {scans[i][0]} on {scans[i][1]}: {e}"); fetched[i] = None
+    store = get_feature_store()
+    for i, scan in fetched.items():
+        if scan is None: continue
+        store.append(scan[0], 'historical')
+        results[i] = (scan[0], scan[1])
+    return results
+
+async def run_historical_scans_async(scans, client, max_concurrent=config.POLYGON_ASYNC_MAX_EVENTS):
+    """
+    Scans (ticker, scan_date) pairs with up to max_concurrent in flight, returning [(scan_result, price_history)] in input order.
+    """
+    results = []
+    for scan in await historical_features_async(scans, client, max_concurrent):
+        if scan is None: results.append(("Avoid", None)); continue
+        scan_result = evaluate_historical_features(scan[0])
+        results.append((scan_result, scan[1] if scan_result != "Avoid" else None))
+    return results
+
+def get_historical_features_many(scans, api_key=None, max_concurrent=config.POLYGON_ASYNC_MAX_EVENTS):
+    """
+    Returns {(ticker, scan_date): features} for many pairs over one pooled async Polygon session, reusing stored rows.
+
+    Pairs whose scan failed are left out, so callers can retry them one at a time.
+    """
+    async def fetch_all():
+        async with get_async_client(api_key) as client:
+            return await historical_features_async(scans, client, max_concurrent, reuse_stored=True)
+    return {scan: result[0] for scan, result in zip(scans, asyncio.run(fetch_all())) if result is not None}
+
+def screen_scans(scans, client):
+    """Returns the set of (ticker, scan_date) scans that pass the bulk volume and price filters, or all of them if the filters cannot run."""
+    try:
+        survivors, stages = screening.screen_historical_scans(scans, client)
     except Exception as e:
-        print(f"  - Scanner failed: {e}"); return "Avoid", None
+        # e.g. a Polygon plan without grouped daily bars; the per-ticker checks still apply.
+        print(f"Bulk screening failed ({e}); scanning every event.")
+        return set(scans)
+    screening.print_funnel(stages)
+    return survivors
+
+def run_historical_scans(scans, api_key=None, max_concurrent=config.POLYGON_ASYNC_MAX_EVENTS):
+    """
+    Synchronous entry point for scanning many (ticker, scan_date) pairs over one pooled async Polygon session.
+
+    Returns [(scan_result, price_history)] in input order, as run_scanner_with_historical_data would for each pair.
+    Pairs removed by the bulk volume and price filters come back as ("Avoid", None) without per-ticker requests.
+    """
+    survivors = screen_scans(scans, get_cached_client(api_key))
+    to_scan = [scan for scan in scans if scan in survivors]
+
+    async def scan_all():
+        async with get_async_client(api_key) as client:
+            return await run_historical_scans_async(to_scan, client, max_concurrent)
+    scanned = dict(zip(to_scan, asyncio.run(scan_all())))
+    return [scanned.get(scan, ("Avoid", None)) for scan in scans]
+
+def get_scan_date(event_date):
+    """Returns the last weekday before an earnings event, the day the scanner runs on."""
+    scan_date = event_date - timedelta(days=1)
+    if scan_date.weekday() >= 5: scan_date -= timedelta(days=scan_date.weekday() - 4)
+    return scan_date
+
+def get_trade_legs(entry_datetime, underlying_price):
+    """Returns (atm_strike, short_expiry, long_expiry) for the calendar spread entered at entry_datetime."""
+    atm_strike = round(underlying_price)
+    short_expiry = entry_datetime.date() + timedelta(days=20)
+    long_expiry = entry_datetime.date() + timedelta(days=20 + config.EXPIRY_GAP_DAYS)
+    return atm_strike, short_expiry, long_expiry
 
 def get_precise_trade_times(event_date, ticker):
     try:
-        stock = yf.Ticker(ticker)
-        calendar_data = stock.calendar
-        if not isinstance(calendar_data, pd.DataFrame) or calendar_data.empty or 'Earnings Date' not in calendar_data.index: return None, None
-        earnings_timestamp = calendar_data.loc['Earnings Date'][0]
-        is_amc = earnings_timestamp.time() != datetime.min.time()
-        price_reaction_day = earnings_timestamp.date() if not is_amc else earnings_timestamp.date() + timedelta(days=1)
+        found, timing = get_earnings_store().get_timing(ticker, event_date)
+        if found:
+            earnings_day, is_amc = event_date, timing == 'amc'
+        else:
+            stock = yf.Ticker(ticker)
+            calendar_data = yf_limiter.call(lambda: stock.calendar, endpoint='calendar')
+            if not isinstance(calendar_data, pd.DataFrame) or calendar_data.empty or 'Earnings Date' not in calendar_data.index: return None, None
+            earnings_timestamp = calendar_data.loc['Earnings Date'][0]
+            earnings_day, is_amc = earnings_timestamp.date(), earnings_timestamp.time() != datetime.min.time()
+        price_reaction_day = earnings_day if not is_amc else earnings_day + timedelta(days=1)
         entry_day = price_reaction_day - timedelta(days=1)
         exit_day = price_reaction_day
         if entry_day.weekday() >= 5: entry_day -= timedelta(days=entry_day.weekday() - 4)
@@ -117,91 +470,129 @@ def get_precise_trade_times(event_date, ticker):
         return entry_datetime, exit_datetime
     except Exception: return None, None
 
-def run_backtest(start_date, end_date):
-    client = RESTClient(api_key=config.POLYGON_API_KEY)
-    tickers = h_cal.get_combined_universe_tickers()
-    events = h_cal.get_historical_earnings_calendar(tickers, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+def prepare_event(event_date, ticker, client, screened_out=False, features=None):
+    """
+    Runs the network-bound part of one event: scanner verdict, trade times and entry/exit spread prices.
+
+    An event screened_out by the bulk volume and price filters is marked "Avoid" without any request.
+    features already computed for the event (e.g. by get_historical_features_many) replace the scan's own lookup.
+    """
+    scan_date = get_scan_date(event_date)
+    prepared = {"event_date": event_date, "ticker": ticker, "scan_result": None, "entry_datetime": None,
+                "exit_datetime": None, "entry_price": None, "exit_price": None}
+    if screened_out:
+        print("  - Screened out by the bulk volume and price filters."); prepared["scan_result"] = "Avoid"
+        return prepared
+
+    prepared["scan_result"], features, _ = _historical_scan(ticker, scan_date, lambda: (
+        features if features is not None else get_historical_features(ticker, scan_date, client, min_avg_volume=config.AVG_VOLUME_THRESHOLD), None))
+    if prepared["scan_result"] == "Recommended":
+        entry_datetime, exit_datetime = get_precise_trade_times(event_date, ticker)
+        if entry_datetime and exit_datetime:
+            atm_strike, short_expiry, long_expiry = get_trade_legs(entry_datetime, features["underlying_price"])
+            prepared["entry_datetime"], prepared["exit_datetime"] = entry_datetime, exit_datetime
+            prepared["entry_price"], prepared["exit_price"] = get_historical_spread_prices(
+                client, ticker, [entry_datetime, exit_datetime], atm_strike, short_expiry, long_expiry)
+    return prepared
+
+def replay_trades(prepared_events, initial_capital):
+    """
+    Applies position sizing and compounding to prepared events in chronological order. No network I/O.
+    """
     results = []
+    current_capital = initial_capital
+    for prepared in prepared_events:
+        ticker = prepared["ticker"]
+        if prepared["scan_result"] != "Recommended" or prepared["entry_datetime"] is None: continue
+        print(f"\n{ticker} on {prepared['event_date']}: Scanner Recommended. Simulating trade.")
+        entry_price, exit_price = prepared["entry_price"], prepared["exit_price"]
+
+        if entry_price is not None and entry_price > 0:
+            risk_amount = current_capital * config.RISK_ALLOCATION_PERCENT
+            cost_per_spread = entry_price * 100
+            num_contracts = int(risk_amount // cost_per_spread) if cost_per_spread > 0 else 0
+            
+            if num_contracts > 0:
+                print(f"  - Sizing: Allocating ${risk_amount:,.2f} -> Trading {num_contracts} contracts.")
+                
+                if exit_price is not None:
+                    pnl_per_contract = (exit_price - entry_price) * 100
+                    total_trade_pnl = pnl_per_contract * num_contracts
+                    current_capital += total_trade_pnl
+                    result = {"ticker": ticker, "exit_date": prepared["exit_datetime"].date(), "trade_pnl": total_trade_pnl, "portfolio_end_balance": current_capital}
+                    results.append(result)
+                    print(f"  - TRADE RESULT: P&L = ${total_trade_pnl:,.2f}. New Capital: ${current_capital:,.2f}")
+                else: print("  - TRADE SKIPPED: Could not retrieve price for exit.")
+            else: print("  - TRADE SKIPPED: Not enough capital to size position.")
+        else: print("  - TRADE SKIPPED: Could not retrieve price for entry.")
+    return results
+
+def load_backtest_events(start_date, end_date):
+    """Returns the sorted (event_date, ticker) earnings events for tickers that were index members on each date."""
+    universe = get_universe_store()
+    universe.refresh()
+    tickers = universe.members_between(start_date, end_date)
+    print(f"Loaded a point-in-time universe of {len(tickers)} tickers that were index members during the backtest.")
+    biased = universe.survivorship_biased_indexes()
+    if biased: print(f"WARNING: {', '.join(biased)} membership has no change history; results include survivorship bias from those indexes.")
+    events = h_cal.get_historical_earnings_calendar(tickers, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+    # Only scan an event if the ticker was actually in the index on that date.
+    members_by_date = {}
+    for event_date, _ in events:
+        if event_date not in members_by_date: members_by_date[event_date] = universe.members_as_of(event_date)
+    return [(event_date, ticker) for event_date, ticker in events if ticker in members_by_date[event_date]]
+
+def run_backtest(start_date, end_date, max_workers=config.BACKTEST_MAX_WORKERS):
+    client = get_cached_client()
+    events = load_backtest_events(start_date, end_date)
     
     initial_capital = 100000.00
-    current_capital = initial_capital
-    print(f"\n--- Starting Backtest with Initial Capital: ${initial_capital:,.2f} ---")
+    scans = [(ticker, get_scan_date(event_date)) for event_date, ticker in events]
+    survivors = screen_scans(scans, client)
+    features_by_scan = {}
+    if config.BACKTEST_ASYNC_SCANS:
+        to_scan = [scan for scan in dict.fromkeys(scans) if scan in survivors]
+        print(f"\n--- Stage 1a: Scanning {len(to_scan)} events over one async Polygon session ---")
+        try:
+            features_by_scan = get_historical_features_many(to_scan)
+        except Exception as e:
+            print(f"Async scanning failed ({e}); scanning each event with the workers instead.")
+    print(f"\n--- Stage 1: Fetching data for {len(events)} events with {max_workers} workers ---")
 
-    for i, (event_date, ticker) in enumerate(events):
+    def prepare(indexed_event):
+        i, (event_date, ticker) = indexed_event
         print(f"\nProcessing event {i+1}/{len(events)}: {ticker} on {event_date}")
-        scan_date = event_date - timedelta(days=1)
-        if scan_date.weekday() >= 5: scan_date -= timedelta(days=scan_date.weekday() - 4)
-        
-        scan_result, price_history = run_scanner_with_historical_data(ticker, scan_date, client)
+        scan = scans[i]
+        return prepare_event(event_date, ticker, client, screened_out=scan not in survivors, features=features_by_scan.get(scan))
 
-        if scan_result == "Recommended":
-            print(f"  - Scanner Recommended. Simulating trade for {ticker}.")
-            entry_datetime, exit_datetime = get_precise_trade_times(event_date, ticker)
-            
-            if entry_datetime and exit_datetime:
-                atm_strike = round(price_history['Close'].iloc[-1])
-                short_expiry = entry_datetime.date() + timedelta(days=20)
-                long_expiry = entry_datetime.date() + timedelta(days=20 + config.EXPIRY_GAP_DAYS)
-                entry_price = get_historical_spread_price(client, ticker, entry_datetime, atm_strike, short_expiry, long_expiry)
-                
-                if entry_price is not None and entry_price > 0:
-                    risk_amount = current_capital * config.RISK_ALLOCATION_PERCENT
-                    cost_per_spread = entry_price * 100
-                    num_contracts = int(risk_amount // cost_per_spread) if cost_per_spread > 0 else 0
-                    
-                    if num_contracts > 0:
-                        print(f"  - Sizing: Allocating ${risk_amount:,.2f} -> Trading {num_contracts} contracts.")
-                        exit_price = get_historical_spread_price(client, ticker, exit_datetime, atm_strike, short_expiry, long_expiry)
-                        
-                        if exit_price is not None:
-                            pnl_per_contract = (exit_price - entry_price) * 100
-                            total_trade_pnl = pnl_per_contract * num_contracts
-                            current_capital += total_trade_pnl
-                            result = {"ticker": ticker, "exit_date": exit_datetime.date(), "trade_pnl": total_trade_pnl, "portfolio_end_balance": current_capital}
-                            results.append(result)
-                            print(f"  - TRADE RESULT: P&L = ${total_trade_pnl:,.2f}. New Capital: ${current_capital:,.2f}")
-                        else: print("  - TRADE SKIPPED: Could not retrieve price for exit.")
-                    else: print("  - TRADE SKIPPED: Not enough capital to size position.")
-                else: print("  - TRADE SKIPPED: Could not retrieve price for entry.")
+    # executor.map keeps the results in event order, which is what the replay needs.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        prepared_events = list(executor.map(prepare, enumerate(events)))
+    get_feature_store().flush()
+
+    print(f"\n--- Stage 2: Replaying trades with Initial Capital: ${initial_capital:,.2f} ---")
+    results = replay_trades(prepared_events, initial_capital)
     return results, initial_capital
 
 def calculate_performance_metrics(results_df, initial_capital, backtest_days):
     if results_df.empty:
         return 0, 0, 0
-    
-    portfolio_values = pd.Series([initial_capital] * len(backtest_days), index=backtest_days)
-    results_df_no_tz = results_df.copy()
-    if pd.api.types.is_datetime64_any_dtype(results_df_no_tz.index) and results_df_no_tz.index.tz is not None:
-        results_df_no_tz.index = results_df_no_tz.index.tz_localize(None)
-
-    for idx, trade in results_df_no_tz.iterrows():
-        trade_date_naive = pd.to_datetime(idx).normalize()
-        if trade_date_naive in portfolio_values.index:
-            portfolio_values.loc[trade_date_naive:] += trade['trade_pnl']
+    portfolio_values = performance_metrics.build_equity_curve(results_df, initial_capital, backtest_days)
+    return performance_metrics.core_metrics(portfolio_values)
 
-    daily_returns = portfolio_values.pct_change().dropna()
-    
-    sharpe_ratio = daily_returns.mean() / daily_returns.std() if daily_returns.std() != 0 else 0
-    annualized_sharpe = sharpe_ratio * np.sqrt(252)
-    
-    cumulative_max = portfolio_values.cummax()
-    drawdown = (portfolio_values - cumulative_max) / cumulative_max
-    max_drawdown_pct = drawdown.min()
-    
-    if max_drawdown_pct == 0:
-        return annualized_sharpe, 0, 0
-
-    trough_date = drawdown.idxmin()
-    peak_date = portfolio_values.loc[:trough_date].idxmax()
-    
-    recovery_df = portfolio_values.loc[trough_date:]
-    try:
-        recovery_date = recovery_df[recovery_df >= portfolio_values[peak_date]].index[0]
-        max_drawdown_duration = (recovery_date - peak_date).days
-    except IndexError:
-        max_drawdown_duration = "N/A (Did not recover)"
-        
-    return annualized_sharpe, max_drawdown_pct, max_drawdown_duration
+def calculate_detailed_metrics(results_df, initial_capital, backtest_days, rolling_window=63):
+    """
+    Returns the equity curve plus rolling Sharpe/Sortino/Calmar, the drawdown table and per-ticker/per-month breakdowns.
+    """
+    portfolio_values = performance_metrics.build_equity_curve(results_df, initial_capital, backtest_days)
+    by_ticker, by_month = performance_metrics.trade_breakdowns(results_df)
+    return {
+        'equity_curve': portfolio_values,
+        'rolling': performance_metrics.rolling_metrics(portfolio_values, window=rolling_window),
+        'drawdowns': performance_metrics.drawdown_table(portfolio_values),
+        'by_ticker': by_ticker,
+        'by_month': by_month,
+    }
 
 if __name__ == "__main__":
     end_date = datetime.now().date()
@@ -236,4 +627,10 @@ if __name__ == "__main__":
         print("-" * 30)
         print(f"Annualized Sharpe Ratio:{sharpe:.2f}")
         print(f"Max Drawdown:           {max_dd:.2%}")
-        print(f"Max Drawdown Duration:  {dd_duration} days")
\ No newline at end of file
+        print(f"Max Drawdown Duration:  {dd_duration} days")
+
+        detailed = calculate_detailed_metrics(results_df, starting_capital, backtest_days)
+        print("\n--- Monthly Breakdown ---")
+        print(detailed['by_month'])
+        print("\n--- Worst Drawdowns ---")
+        print(detailed['drawdowns'].head(5))
\ No newline at end of file
@@ -1,6 +1,6 @@
-import yfinance as yf
 import pandas as pd
 from datetime import datetime
+from earnings_store import get_earnings_store
 
 def get_sp500_tickers():
     """Gets the list of S&P 500 tickers from Wikipedia by finding the correct table."""
@@ -56,33 +56,15 @@ def get_combined_universe_tickers():
 def get_historical_earnings_calendar(tickers, start_date, end_date):
     """
     Fetches historical earnings announcement dates for a list of tickers.
+    Reads from the local earnings store, refreshing only tickers with stale or missing data.
     """
     print(f"Fetching historical earnings dates for {len(tickers)} tickers...")
     start_date_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
     end_date_dt = datetime.strptime(end_date, "%Y-%m-%d").date()
     
-    all_earnings_events = []
-    
-    for i, ticker_symbol in enumerate(tickers):
-        ticker_symbol = ticker_symbol.strip().replace('.', '-')
-        try:
-            stock = yf.Ticker(ticker_symbol)
-            earnings_dates = stock.earnings_dates
-            
-            if earnings_dates is None or earnings_dates.empty:
-                continue
-
-            for date in earnings_dates.index:
-                event_date = date.date()
-                if start_date_dt <= event_date <= end_date_dt:
-                    all_earnings_events.append((event_date, ticker_symbol))
-            
-            if (i + 1) % 100 == 0:
-                print(f"Processed {i+1}/{len(tickers)}: {ticker_symbol}")
-        except Exception as e:
-            pass
-            
-    all_earnings_events.sort()
+    store = get_earnings_store()
+    store.refresh(tickers)
+    all_earnings_events = store.events_between(start_date_dt, end_date_dt, tickers)
     print(f"\nFound {len(all_earnings_events)} earnings events between {start_date} and {end_date}.")
     return all_earnings_events
 
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import yfinance as yf
+import config
+import instrumentation
+from rate_limiter import get_limiter
+
+BAR_DTYPE = np.dtype([('date', 'datetime64[D]'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'), ('volume', 'f8')])
+# Relative change in the overlapping bar's close that is taken as a split or dividend re-adjustment.
+ADJUSTMENT_TOLERANCE = 1e-6
+
+yf_limiter = get_limiter('yfinance')
+
+def _to_bars(dates, open_, high, low, close, volume):
+    bars = np.empty(len(dates), dtype=BAR_DTYPE)
+    bars['date'] = np.asarray(dates, dtype='datetime64[D]')
+    for name, values in (('open', open_), ('high', high), ('low', low), ('close', close), ('volume', volume)):
+        bars[name] = np.asarray(values, dtype=float)
+    return bars[np.argsort(bars['date'], kind='stable')]
+
+def fetch_yfinance(client, ticker, start_date, end_date):
+    """Daily split/dividend-adjusted bars from yfinance, start_date through end_date inclusive."""
+    history = yf_limiter.call(yf.Ticker(ticker).history, start=start_date.strftime('%Y-%m-%d'),
+                              end=(end_date + timedelta(days=1)).strftime('%Y-%m-%d'))
+    if history is None or history.empty: return np.empty(0, dtype=BAR_DTYPE)
+    return _to_bars(history.index.date, history['Open'], history['High'], history['Low'], history['Close'], history['Volume'])
+
+def fetch_polygon(client, ticker, start_date, end_date):
+    """Daily split-adjusted bars from Polygon, start_date through end_date inclusive."""
+    aggs = pd.DataFrame(client.get_aggs(ticker, 1, "day", start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
+    if aggs.empty: return np.empty(0, dtype=BAR_DTYPE)
+    dates = pd.to_datetime(aggs['timestamp'], unit='ms').dt.date
+    return _to_bars(dates, aggs['open'], aggs['high'], aggs['low'], aggs['close'], aggs['volume'])
+
+FETCHERS = {'yfinance': fetch_yfinance, 'polygon': fetch_polygon}
+
+def to_price_history(bars):
+    """Converts bars to the DataFrame layout the scanners have always used (Open/High/Low/Close/Volume by date)."""
+    return pd.DataFrame({'Open': bars['open'], 'High': bars['high'], 'Low': bars['low'], 'Close': bars['close'],
+                         'Volume': bars['volume'], 'Adj Close': bars['close']}, index=pd.DatetimeIndex(bars['date'], name='datetime'))
+
+class BarStore:
+    """
+    Append-only daily bar store with one memory-mapped file per ticker, for one data provider.
+
+    sync() downloads only the bars missing since the last sync, and bars() returns zero-copy views of
+    the mapped file. Only completed sessions are stored. Today's bar is returned by sync() but never
+    persisted. If the provider re-adjusts history (a split or dividend changes the overlapping
+    bar), the ticker is downloaded again in full.
+    """
+    def __init__(self, root, fetch):
+        self.root = root
+        self.fetch = fetch
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.ticker_locks = {}
+        self.maps = {}
+
+    def _paths(self, ticker):
+        return os.path.join(self.root, f"{ticker}.bin"), os.path.join(self.root, f"{ticker}.json")
+
+    def _ticker_lock(self, ticker):
+        with self.lock:
+            return self.ticker_locks.setdefault(ticker, threading.Lock())
+
+    def _read_meta(self, ticker):
+        meta_path = self._paths(ticker)[1]
+        if not os.path.exists(meta_path): return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return {key: datetime.strptime(value, '%Y-%m-%d').date() for key, value in meta.items()}
+
+    def _write(self, ticker, bars, meta, append):
+        data_path, meta_path = self._paths(ticker)
+        if append:
+            with open(data_path, 'ab') as f:
+                f.write(bars.tobytes())
+        else:
+            with open(data_path + '.tmp', 'wb') as f:
+                f.write(bars.tobytes())
+            os.replace(data_path + '.tmp', data_path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({key: value.strftime('%Y-%m-%d') for key, value in meta.items()}, f)
+        os.replace(meta_path + '.tmp', meta_path)
+        with self.lock:
+            self.maps.pop(ticker, None)
+
+    def _mapped(self, ticker):
+        with self.lock:
+            if ticker not in self.maps:
+                data_path = self._paths(ticker)[0]
+                size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+                self.maps[ticker] = np.memmap(data_path, dtype=BAR_DTYPE, mode='r') if size else np.empty(0, dtype=BAR_DTYPE)
+            return self.maps[ticker]
+
+    def sync(self, ticker, start_date, end_date, client=None):
+        """
+        Makes sure every completed bar between start_date and end_date is stored, fetching only what is missing.
+
+        Returns the bars dated today or later from the fetch (today's unfinished session), which are not stored.
+        """
+        today = datetime.now(config.MARKET_TIMEZONE).date()
+        with self._ticker_lock(ticker):
+            meta = self._read_meta(ticker)
+            covered = meta is not None and meta['start'] <= start_date and meta['end'] >= end_date
+            instrumentation.record_cache('bar_store', covered)
+            if covered: return np.empty(0, dtype=BAR_DTYPE)
+            stored = self._mapped(ticker)
+            backfill = meta is None or start_date < meta['start'] or len(stored) == 0
+            coverage_start = start_date if meta is None else min(start_date, meta['start'])
+            fetched = self.fetch(client, ticker, coverage_start if backfill else stored['date'][-1].astype(object), today)
+            completed, live = fetched[fetched['date'] < np.datetime64(today)], fetched[fetched['date'] >= np.datetime64(today)]
+
+            if not backfill:
+                overlap = completed[completed['date'] == stored['date'][-1]]
+                if len(overlap) and abs(overlap['close'][0] / stored['close'][-1] - 1) > ADJUSTMENT_TOLERANCE:
+                    print(f"{ticker}: history was re-adjusted (split/dividend), refetching all stored bars.")
+                    fetched = self.fetch(client, ticker, coverage_start, today)
+                    completed, live = fetched[fetched['date'] < np.datetime64(today)], fetched[fetched['date'] >= np.datetime64(today)]
+                    backfill = True
+            # Providers return an empty frame on transient errors (an incremental fetch always gets back at least the
+            # last stored bar), so record no coverage for it and let the next sync try again.
+            if len(completed) == 0: return live
+            new_bars = completed if backfill else completed[completed['date'] > stored['date'][-1]]
+            self._write(ticker, new_bars, {'start': coverage_start, 'end': today - timedelta(days=1)}, append=not backfill)
+            return live
+
+    def bars(self, ticker, start_date=None, end_date=None):
+        """Returns a zero-copy view of the stored bars with start_date <= date <= end_date, oldest first."""
+        stored = self._mapped(ticker)
+        lo = 0 if start_date is None else np.searchsorted(stored['date'], np.datetime64(start_date), side='left')
+        hi = len(stored) if end_date is None else np.searchsorted(stored['date'], np.datetime64(end_date), side='right')
+        return stored[lo:hi]
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_bar_store(provider):
+    """Returns the shared BarStore for a provider ('yfinance' or 'polygon'); each keeps its own files."""
+    with _stores_lock:
+        if provider not in _stores:
+            _stores[provider] = BarStore(os.path.join(config.CACHE_DIR, 'bars', provider), FETCHERS[provider])
+        return _stores[provider]
@@ -0,0 +1,279 @@
+"""
+Offline fixture data for the benchmark suite.
+
+FixtureSet serves price histories, option chains, Polygon daily aggs and earnings calendars either from a
+deterministic synthetic generator or from files recorded with:
+    python -m benchmarks.fixtures record AAPL MSFT NVDA --out benchmarks/fixtures_data
+Recorded files cover the yfinance history, expiries, near-term chains and earnings dates and Polygon daily aggs.
+Historical option IVs and option minute bars are always synthetic, since recording them would take thousands of calls.
+"""
+import argparse
+import collections
+import json
+import math
+import os
+import zlib
+from datetime import datetime, timedelta, date
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from polygon.rest.models import Agg, GroupedDailyAgg, OptionsContract
+import config
+
+Chain = collections.namedtuple('Chain', ['calls', 'puts'])
+CHAIN_COLUMNS = ['contractSymbol', 'strike', 'lastPrice', 'bid', 'ask', 'volume', 'openInterest', 'impliedVolatility']
+
+def _seed(*parts):
+    return zlib.crc32('|'.join(str(part) for part in parts).encode())
+
+def _parse_option_ticker(option_ticker):
+    """Splits 'O:AAPL261120C00200000' into (underlying, expiry date, right, strike)."""
+    body = option_ticker[2:]
+    underlying, rest = body[:-15], body[-15:]
+    return underlying, datetime.strptime(rest[:6], '%y%m%d').date(), rest[6], int(rest[7:]) / 1000
+
+class FixtureSet:
+    """
+    Market data for a fixed list of tickers, generated on demand (seeded per ticker) or loaded from recorded files.
+
+    Synthetic tickers get about three years of business-day bars ending on end_date, weekly expiries
+    out to 90 days, quarterly earnings and an IV term structure that is inverted ahead of earnings.
+    """
+    def __init__(self, tickers, end_date=None, seed=0, recorded=None):
+        self.tickers = list(tickers)
+        self.end_date = end_date or datetime.now(config.MARKET_TIMEZONE).date() - timedelta(days=1)
+        self.seed = seed
+        self.recorded = recorded or {}
+        self._histories = {}
+
+    @classmethod
+    def synthetic(cls, num_tickers, end_date=None, seed=0):
+        return cls([f"T{i:04d}" for i in range(num_tickers)], end_date=end_date, seed=seed)
+
+    @classmethod
+    def load(cls, path):
+        recorded = {}
+        for name in sorted(os.listdir(path)):
+            if not name.endswith('.json'): continue
+            with open(os.path.join(path, name)) as f:
+                recorded[name[:-5]] = json.load(f)
+        return cls(sorted(recorded), recorded=recorded)
+
+    # --- Price history ---
+    def history(self, ticker):
+        """Daily bars in the yfinance layout (Open/High/Low/Close/Volume, tz-aware index)."""
+        if ticker not in self._histories:
+            if ticker in self.recorded:
+                history = pd.DataFrame(self.recorded[ticker]['history'])
+                history.index = pd.to_datetime(history.pop('date')).dt.tz_localize(config.MARKET_TIMEZONE)
+            else:
+                rng = np.random.default_rng(_seed(self.seed, ticker, 'history'))
+                days = pd.bdate_range(end=self.end_date, periods=756, tz=config.MARKET_TIMEZONE)
+                close = rng.uniform(20, 400) * np.exp(np.cumsum(rng.normal(0, rng.uniform(0.01, 0.03), len(days))))
+                open_ = close * np.exp(rng.normal(0, 0.005, len(days)))
+                high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.008, len(days))))
+                low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.008, len(days))))
+                volume = rng.lognormal(math.log(rng.uniform(5e5, 6e6)), 0.3, len(days)).round()
+                history = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=days)
+            self._histories[ticker] = history
+        return self._histories[ticker]
+
+    def daily_aggs(self, ticker, start_date, end_date):
+        """Polygon Agg objects for the ticker's daily bars between two dates (inclusive)."""
+        if ticker in self.recorded and 'polygon_aggs' in self.recorded[ticker]:
+            rows = [row for row in self.recorded[ticker]['polygon_aggs']
+                    if start_date <= datetime.fromtimestamp(row['timestamp'] / 1000).date() <= end_date]
+            return [Agg(**row) for row in rows]
+        history = self.history(ticker)
+        history = history[(history.index.date >= start_date) & (history.index.date <= end_date)]
+        timestamps = (history.index.tz_convert(None).normalize() + pd.Timedelta(hours=4)).asi8 // 10**6
+        return [Agg(open=o, high=h, low=l, close=c, volume=v, timestamp=int(ts))
+                for o, h, l, c, v, ts in zip(history['Open'], history['High'], history['Low'], history['Close'], history['Volume'], timestamps)]
+
+    # --- Live option chains ---
+    def expirations(self, ticker, as_of=None):
+        if ticker in self.recorded: return tuple(self.recorded[ticker]['options'])
+        as_of = as_of or datetime.now().date()
+        fridays = [as_of + timedelta(days=d) for d in range(1, 91) if (as_of + timedelta(days=d)).weekday() == 4]
+        return tuple(day.strftime('%Y-%m-%d') for day in fridays)
+
+    def _iv(self, ticker, days_to_expiry):
+        """Synthetic ATM IV: a per-ticker base level, elevated and inverted at the front like ahead of earnings."""
+        base = 0.2 + (_seed(self.seed, ticker, 'iv') % 400) / 1000
+        return base * (1.0 + 0.6 * math.exp(-days_to_expiry / 20))
+
+    def chain(self, ticker, exp_date):
+        if ticker in self.recorded:
+            chain = self.recorded[ticker]['chains'][exp_date]
+            return Chain(pd.DataFrame(chain['calls']), pd.DataFrame(chain['puts']))
+        spot = float(self.history(ticker)['Close'].iloc[-1])
+        step = max(0.5, round(spot / 80 * 2) / 2)
+        strikes = np.arange(max(step, round(spot * 0.5 / step) * step), spot * 1.5, step)
+        days = max((datetime.strptime(exp_date, '%Y-%m-%d').date() - datetime.now().date()).days, 1)
+        atm_iv = self._iv(ticker, days)
+        iv = atm_iv * (1 + 0.5 * ((strikes - spot) / spot) ** 2)
+        price = np.maximum(0.4 * spot * iv * math.sqrt(days / 365), 0.01)
+        table = pd.DataFrame({'contractSymbol': [f"{ticker}{exp_date}C{k:g}" for k in strikes], 'strike': strikes,
+                              'lastPrice': price, 'bid': price * 0.97, 'ask': price * 1.03, 'volume': 100,
+                              'openInterest': 1000, 'impliedVolatility': iv})
+        return Chain(table, table.copy())
+
+    # --- Earnings ---
+    def earnings(self, ticker):
+        """Returns [(date, timing)] for about three years of quarterly reports."""
+        if ticker in self.recorded:
+            return [(datetime.strptime(row[0], '%Y-%m-%d').date(), row[1]) for row in self.recorded[ticker]['earnings']]
+        offset = _seed(self.seed, ticker, 'earnings') % 91
+        first = self.end_date - timedelta(days=3 * 365) + timedelta(days=offset)
+        reports = []
+        for quarter in range(13):
+            report_date = first + timedelta(days=91 * quarter)
+            while report_date.weekday() >= 5: report_date += timedelta(days=1)
+            reports.append((report_date, 'amc' if quarter % 2 else 'bmo'))
+        return reports
+
+    # --- Historical options (always synthetic) ---
+    def option_contracts(self, ticker, as_of, min_exp, max_exp):
+        spot = float(self.history(ticker)['Close'].asof(pd.Timestamp(as_of, tz=config.MARKET_TIMEZONE)))
+        contracts = []
+        for d in range((min_exp - as_of).days, (max_exp - as_of).days + 1):
+            expiry = as_of + timedelta(days=d)
+            if expiry.weekday() != 4: continue
+            strike = round(spot)
+            option_ticker = f"O:{ticker}{expiry.strftime('%y%m%d')}C{str(int(strike * 1000)).zfill(8)}"
+            contracts.append(OptionsContract(ticker=option_ticker, expiration_date=expiry.strftime('%Y-%m-%d'),
+                                             strike_price=strike, contract_type='call', underlying_ticker=ticker))
+        return contracts
+
+    def option_daily(self, option_ticker, day):
+        underlying, expiry, _, strike = _parse_option_ticker(option_ticker)
+        iv = self._iv(underlying, max((expiry - day).days, 1))
+        return SimpleNamespace(close=None, greeks=SimpleNamespace(implied_volatility=iv))
+
+    def option_minute_bars(self, option_ticker, start_ms, end_ms):
+        underlying, expiry, _, strike = _parse_option_ticker(option_ticker)
+        rng = np.random.default_rng(_seed(self.seed, option_ticker, start_ms))
+        timestamps = np.arange(start_ms - start_ms % 60000, end_ms + 1, 60000)
+        days = np.maximum((np.datetime64(expiry) - timestamps.astype('datetime64[ms]').astype('datetime64[D]')).astype(int), 1)
+        closes = 0.4 * strike * self._iv(underlying, 30) * np.sqrt(days / 365) * np.exp(rng.normal(0, 0.01, len(timestamps)))
+        return [Agg(close=float(c), timestamp=int(ts)) for c, ts in zip(closes, timestamps)]
+
+class FixtureTicker:
+    """Stands in for yfinance.Ticker, answering from a FixtureSet."""
+    def __init__(self, fixtures, ticker):
+        self.fixtures = fixtures
+        self.ticker = ticker
+
+    @property
+    def options(self):
+        return self.fixtures.expirations(self.ticker)
+
+    def option_chain(self, exp_date):
+        return self.fixtures.chain(self.ticker, exp_date)
+
+    def history(self, period=None, start=None, end=None, **kwargs):
+        history = self.fixtures.history(self.ticker)
+        if start: history = history[history.index.date >= datetime.strptime(start, '%Y-%m-%d').date()]
+        if end: history = history[history.index.date < datetime.strptime(end, '%Y-%m-%d').date()]
+        return history
+
+    @property
+    def earnings_dates(self):
+        index = pd.DatetimeIndex([datetime.combine(day, datetime.min.time()) + timedelta(hours=16 if timing == 'amc' else 8)
+                                  for day, timing in self.fixtures.earnings(self.ticker)]).tz_localize(config.MARKET_TIMEZONE)
+        return pd.DataFrame(index=index)
+
+    @property
+    def calendar(self):
+        return None
+
+class FixtureAsyncPolygonClient:
+    """Stands in for polygon_async.AsyncPolygonClient, answering from a FixturePolygonClient."""
+    def __init__(self, client):
+        self.client = client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def blocking(self):
+        return self.client
+
+    async def get_aggs(self, *args, **kwargs):
+        return self.client.get_aggs(*args, **kwargs)
+
+    async def list_options_contracts(self, **kwargs):
+        return self.client.list_options_contracts(**kwargs)
+
+    async def get_daily_open_close_agg(self, option_ticker, day):
+        return self.client.get_daily_open_close_agg(option_ticker, day)
+
+class FixturePolygonClient:
+    """Stands in for the (cached) Polygon RESTClient used by the backtest, answering from a FixtureSet."""
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.grouped = None
+
+    def get_aggs(self, ticker, multiplier, timespan, from_, to, limit=50000, **kwargs):
+        if ticker.startswith('O:'): return self.fixtures.option_minute_bars(ticker, from_, to)
+        return self.fixtures.daily_aggs(ticker, datetime.strptime(from_, '%Y-%m-%d').date(), datetime.strptime(to, '%Y-%m-%d').date())
+
+    def list_options_contracts(self, underlying_ticker, as_of, expiration_date_gte, expiration_date_lte, limit=1000, **kwargs):
+        parse = lambda value: datetime.strptime(value, '%Y-%m-%d').date()
+        return self.fixtures.option_contracts(underlying_ticker, parse(as_of), parse(expiration_date_gte), parse(expiration_date_lte))
+
+    def get_daily_open_close_agg(self, option_ticker, day):
+        return self.fixtures.option_daily(option_ticker, datetime.strptime(day, '%Y-%m-%d').date())
+
+    def get_grouped_daily_aggs(self, date, **kwargs):
+        if self.grouped is None:
+            # Index every ticker's bars by day once; a grouped response is then a dict lookup.
+            self.grouped = {}
+            for ticker in self.fixtures.tickers:
+                history = self.fixtures.history(ticker)
+                for day, o, h, l, c, v in zip(history.index.date, history['Open'], history['High'], history['Low'], history['Close'], history['Volume']):
+                    self.grouped.setdefault(day.strftime('%Y-%m-%d'), []).append(
+                        GroupedDailyAgg(ticker=ticker, open=o, high=h, low=l, close=c, volume=v))
+        return self.grouped.get(date, [])
+
+def record(tickers, out_dir, polygon_api_key=None):
+    """Records real yfinance (and, with an API key, Polygon daily agg) responses for the tickers into out_dir."""
+    import yfinance as yf
+    from polygon import RESTClient
+    os.makedirs(out_dir, exist_ok=True)
+    client = RESTClient(api_key=polygon_api_key) if polygon_api_key else None
+    for ticker in tickers:
+        stock = yf.Ticker(ticker)
+        history = stock.history(period='3y')
+        options = [exp for exp in stock.options if datetime.strptime(exp, '%Y-%m-%d').date() <= datetime.now().date() + timedelta(days=45)]
+        chains = {}
+        for exp in options:
+            chain = stock.option_chain(exp)
+            chains[exp] = {side: getattr(chain, side)[[c for c in CHAIN_COLUMNS if c in getattr(chain, side).columns]].to_dict('list')
+                           for side in ('calls', 'puts')}
+        earnings_dates = stock.earnings_dates
+        earnings = [] if earnings_dates is None else [
+            [ts.date().strftime('%Y-%m-%d'), 'amc' if ts.hour >= 16 else 'bmo'] for ts in earnings_dates.index]
+        fixture = {
+            'history': {'date': [d.strftime('%Y-%m-%d') for d in history.index],
+                        **{column: history[column].tolist() for column in ('Open', 'High', 'Low', 'Close', 'Volume')}},
+            'options': options, 'chains': chains, 'earnings': earnings,
+        }
+        if client:
+            start = (datetime.now() - timedelta(days=3 * 365)).strftime('%Y-%m-%d')
+            fixture['polygon_aggs'] = [{'open': a.open, 'high': a.high, 'low': a.low, 'close': a.close, 'volume': a.volume, 'timestamp': a.timestamp}
+                                       for a in client.get_aggs(ticker, 1, 'day', start, datetime.now().strftime('%Y-%m-%d'), limit=50000)]
+        with open(os.path.join(out_dir, f"{ticker}.json"), 'w') as f:
+            json.dump(fixture, f)
+        print(f"Recorded {ticker}: {len(history)} bars, {len(options)} expiries, {len(earnings)} earnings dates.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record benchmark fixtures from live data providers.")
+    parser.add_argument('command', choices=['record'])
+    parser.add_argument('tickers', nargs='+')
+    parser.add_argument('--out', default=os.path.join('benchmarks', 'fixtures_data'))
+    parser.add_argument('--polygon-api-key', default=None)
+    args = parser.parse_args()
+    record(args.tickers, args.out, args.polygon_api_key)
@@ -0,0 +1,114 @@
+"""
+Drives a full schedule of entries and exits through live_bot against the simulated gateway and reports latency.
+
+Run from the repository root:
+    python -m benchmarks.live_bot_latency --trades 40 --batch 5 --output live_bot_latency.json
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import config
+import live_bot
+from benchmarks.sim_gateway import SimulatedBot, RecordedQuotes, SyntheticQuotes
+
+TERMINAL_STATUSES = ('closed_by_time', 'closed_by_stop', 'skipped')
+
+def percentiles(values_ms):
+    if not values_ms: return None
+    values = np.asarray(values_ms)
+    return {'count': len(values), 'p50': float(np.percentile(values, 50)), 'p90': float(np.percentile(values, 90)),
+            'p99': float(np.percentile(values, 99)), 'max': float(values.max())}
+
+def build_schedule(bot, num_trades, batch_size, start_in, spacing, hold):
+    """Queues num_trades synthetic trades whose entries fall due batch_size at a time, spacing seconds apart."""
+    now = datetime.now(config.MARKET_TIMEZONE)
+    trades = []
+    for i in range(num_trades):
+        entry_time = now + timedelta(seconds=start_in + (i // batch_size) * spacing)
+        trade = bot.trades.add({
+            'ticker': f"SIM{i:04d}", 'status': 'pending_entry', 'entry_time': entry_time,
+            'exit_time': entry_time + timedelta(seconds=hold), 'position': 0, 'entry_order_id': None,
+            'stop_loss_order_id': None, 'contract': None, 'underlying_price': 20.0 + i % 200,
+        })
+        live_bot.prepare_trade_contracts(bot, trade)
+        trades.append(trade)
+    return trades
+
+def run(num_trades=20, batch_size=5, start_in=2.0, spacing=1.0, hold=1.0, ack_delay=0.002, fill_delay=0.05,
+        quote_interval=0.1, quotes_path=None, timeout=120):
+    """Runs one benchmark and returns the report dict."""
+    state_dir = tempfile.mkdtemp(prefix='sim_ibkr_')
+    quotes = RecordedQuotes(quotes_path) if quotes_path else SyntheticQuotes()
+    bot = SimulatedBot(state_dir, quotes=quotes, ack_delay=ack_delay, fill_delay=fill_delay, quote_interval=quote_interval)
+    scheduler = live_bot.create_scheduler(bot)
+    bot.connect()
+    bot.next_order_id_event.wait(timeout=5)
+    bot.reqAccountSummary(9001, "All", "NetLiquidation")
+    bot.account_value_event.wait(timeout=5)
+
+    setup_started = time.perf_counter()
+    trades = build_schedule(bot, num_trades, batch_size, start_in, spacing, hold)
+    setup_seconds = time.perf_counter() - setup_started
+    for trade in trades: scheduler.schedule(trade)
+
+    loop_started = time.time()
+    loop = threading.Thread(target=scheduler.run, daemon=True)
+    loop.start()
+    deadline = time.time() + timeout
+    while time.time() < deadline and not all(trade['status'] in TERMINAL_STATUSES for trade in trades):
+        time.sleep(0.05)
+    scheduler.stop()
+    loop.join()
+    elapsed = time.time() - loop_started
+    bot.disconnect()
+
+    placed_at = {placement['order_id']: placement['placed_at'] for placement in bot.gateway.placements}
+    exits = {placement['symbol']: placement['placed_at'] for placement in bot.gateway.placements
+             if placement['action'] == 'SELL' and placement['order_type'] == 'MKT'}
+    entry_latency = [(placed_at[trade['entry_order_id']] - trade['entry_time'].timestamp()) * 1000
+                     for trade in trades if trade.get('entry_order_id') in placed_at]
+    exit_latency = [(exits[trade['ticker']] - trade['exit_time'].timestamp()) * 1000 for trade in trades if trade['ticker'] in exits]
+    statuses = {}
+    for trade in trades: statuses[trade['status']] = statuses.get(trade['status'], 0) + 1
+
+    return {
+        'parameters': {'trades': num_trades, 'batch_size': batch_size, 'spacing_s': spacing, 'hold_s': hold,
+                       'ack_delay_s': ack_delay, 'fill_delay_s': fill_delay, 'quote_interval_s': quote_interval,
+                       'quotes': quotes_path or 'synthetic'},
+        'schedule_setup_ms': setup_seconds * 1000,
+        'entry_decision_to_order_ms': percentiles(entry_latency),
+        'exit_decision_to_order_ms': percentiles(exit_latency),
+        'callback_lag_ms': percentiles([lag * 1000 for lag in bot.gateway.callback_lag]),
+        'callbacks': bot.gateway.callbacks,
+        'callbacks_per_second': bot.gateway.callbacks / elapsed if elapsed > 0 else None,
+        'orders_placed': len(bot.gateway.placements),
+        'final_statuses': statuses,
+        'elapsed_s': elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trades', type=int, default=20)
+    parser.add_argument('--batch', type=int, default=5, help='Trades sharing each entry timestamp')
+    parser.add_argument('--spacing', type=float, default=1.0, help='Seconds between entry batches')
+    parser.add_argument('--hold', type=float, default=1.0, help='Seconds between a trade\'s entry and exit')
+    parser.add_argument('--ack-delay', type=float, default=0.002)
+    parser.add_argument('--fill-delay', type=float, default=0.05)
+    parser.add_argument('--quote-interval', type=float, default=0.1)
+    parser.add_argument('--quotes', help='JSONL file of recorded quotes to replay instead of synthetic ones')
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    args = parser.parse_args()
+
+    report = run(args.trades, args.batch, spacing=args.spacing, hold=args.hold, ack_delay=args.ack_delay,
+                 fill_delay=args.fill_delay, quote_interval=args.quote_interval, quotes_path=args.quotes)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
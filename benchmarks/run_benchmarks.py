@@ -0,0 +1,215 @@
+"""
+Offline benchmarks for the scanner and backtest hot paths, reported as JSON so runs can be compared between commits.
+
+Run from the repository root:
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --fixtures benchmarks/fixtures_data --baseline bench.json
+
+Every provider (yfinance, Polygon, Alpha Vantage) is answered from benchmarks.fixtures and all rate
+limits are lifted, so the numbers measure this code rather than the network. Each "cold" sample starts
+from empty stores in a fresh cache directory; "warm" samples reuse what the previous call stored.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import yfinance as yf
+import config
+import rate_limiter
+import bar_store
+import option_chains
+import feature_store
+import earnings_store
+import scanner
+import backtest_engine
+import term_structure
+import screening
+from volatility import yang_zhang_latest
+from benchmarks.fixtures import FixtureSet, FixtureTicker, FixturePolygonClient, FixtureAsyncPolygonClient
+
+DEFAULT_SIZES = (10, 100, 1500)
+
+def commit_hash():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def weekday_before(day):
+    while day.weekday() >= 5: day -= timedelta(days=1)
+    return day
+
+class OfflineEnvironment:
+    """Points every provider and store at one FixtureSet and a scratch cache directory."""
+    def __init__(self, fixtures, root):
+        self.fixtures = fixtures
+        self.root = root
+        self.client = FixturePolygonClient(fixtures)
+        self.runs = 0
+
+    def install(self):
+        config.ALPHA_VANTAGE_API_KEY = "YOUR_API_KEY_HERE"
+        config.RATE_LIMITS = {}
+        for limiter in rate_limiter._limiters.values():
+            limiter.base_rate = limiter.rate = 0
+        yf.Ticker = lambda ticker, *args, **kwargs: FixtureTicker(self.fixtures, ticker)
+        backtest_engine.get_cached_client = lambda *args, **kwargs: self.client
+        backtest_engine.get_async_client = lambda *args, **kwargs: FixtureAsyncPolygonClient(self.client)
+        backtest_engine.load_backtest_events = lambda start_date, end_date: earnings_store.get_earnings_store().events_between(
+            start_date, end_date, self.fixtures.tickers)
+        self.reset()
+
+    def reset(self):
+        """Drops every shared store and starts over in an empty cache directory (a cold start)."""
+        self.runs += 1
+        config.CACHE_DIR = os.path.join(self.root, f"run{self.runs}")
+        bar_store._stores.clear()
+        if option_chains._cache is not None: option_chains._cache.executor.shutdown(wait=False)
+        option_chains._cache = None
+        feature_store._store = None
+        earnings_store._store = None
+        backtest_engine._minute_bar_cache.clear()
+        store = earnings_store.get_earnings_store()
+        for ticker in self.fixtures.tickers:
+            store._save(ticker, [(ticker, day.strftime('%Y-%m-%d'), timing) for day, timing in self.fixtures.earnings(ticker)])
+
+def timed(fn, runs=5, number=1, setup=None):
+    """Times fn over `runs` samples of `number` calls each (setup runs untimed before each sample), in ms per call."""
+    samples = []
+    for _ in range(runs):
+        if setup: setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            for _ in range(number): fn()
+            samples.append((time.perf_counter() - started) * 1000 / number)
+    return {'runs': runs, 'number': number, 'median_ms': float(np.median(samples)), 'min_ms': float(np.min(samples)),
+            'max_ms': float(np.max(samples))}
+
+def synthetic_results(fixtures, num_trades, backtest_days):
+    """A results DataFrame shaped like run_backtest's output, for timing the metrics code on its own."""
+    rng = np.random.default_rng(0)
+    start = fixtures.end_date - timedelta(days=backtest_days)
+    exit_dates = sorted(start + timedelta(days=int(d)) for d in rng.integers(0, backtest_days, num_trades))
+    pnl = rng.normal(150, 900, num_trades)
+    results_df = pd.DataFrame({'ticker': rng.choice(fixtures.tickers, num_trades), 'exit_date': exit_dates, 'trade_pnl': pnl,
+                               'portfolio_end_balance': 100000.0 + np.cumsum(pnl)}).set_index('exit_date')
+    return results_df, pd.bdate_range(start=start, end=fixtures.end_date)
+
+def run_core(env, runs):
+    """Times each hot path on its own, against the first fixture ticker."""
+    fixtures = env.fixtures
+    ticker = fixtures.tickers[0]
+    history = fixtures.history(ticker)
+    scan_date = weekday_before(fixtures.end_date - timedelta(days=60))
+    dtes, ivs = [4, 11, 18, 25, 39, 53], [0.62, 0.51, 0.46, 0.43, 0.40, 0.38]
+    results_df, backtest_days = synthetic_results(fixtures, 400, 3 * 365)
+    backtest_end = weekday_before(fixtures.end_date - timedelta(days=30))
+    backtest_start = backtest_end - timedelta(days=180)
+
+    def term_structure():
+        spline = scanner.build_term_structure(dtes, ivs)
+        return float(spline(30)), float(spline(45)), float(spline(dtes[0]))
+
+    benchmarks = {
+        'yang_zhang': timed(lambda: scanner.yang_zhang(history), runs, number=200),
+        'build_term_structure': timed(term_structure, runs, number=500),
+        'scan_stock_cold': timed(lambda: scanner.scan_stock(ticker), runs, setup=env.reset),
+        'scan_stock_warm': timed(lambda: scanner.scan_stock(ticker), runs),
+        'run_scanner_with_historical_data_cold': timed(
+            lambda: backtest_engine.run_scanner_with_historical_data(ticker, scan_date, env.client), runs, setup=env.reset),
+        'run_scanner_with_historical_data_warm': timed(
+            lambda: backtest_engine.run_scanner_with_historical_data(ticker, scan_date, env.client), runs),
+        'calculate_performance_metrics': timed(
+            lambda: backtest_engine.calculate_performance_metrics(results_df, 100000.0, backtest_days), runs, number=10),
+        'run_backtest_cold': timed(lambda: backtest_engine.run_backtest(backtest_start, backtest_end), runs, setup=env.reset),
+        'run_backtest_warm': timed(lambda: backtest_engine.run_backtest(backtest_start, backtest_end), runs),
+    }
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, _ = backtest_engine.run_backtest(backtest_start, backtest_end)
+    benchmarks['run_backtest_cold']['trades'] = len(results)
+    benchmarks['run_backtest_cold']['events'] = len(backtest_engine.load_backtest_events(backtest_start, backtest_end))
+    return benchmarks
+
+def run_scaling(env, size, runs):
+    """Times the universe-wide paths (one call covers every ticker) for one universe size."""
+    tickers = env.fixtures.tickers[:size]
+    scan_date = weekday_before(env.fixtures.end_date - timedelta(days=60))
+    ohlc = [np.stack([env.fixtures.history(ticker)[column].to_numpy()[-60:] for ticker in tickers])
+            for column in ('Open', 'High', 'Low', 'Close')]
+    rng = np.random.default_rng(0)
+    curves = [([4, 11, 18, 25, 39, 53], rng.uniform(0.3, 0.7, 6)) for _ in tickers]
+
+    def historical_scan():
+        with ThreadPoolExecutor(max_workers=config.BACKTEST_MAX_WORKERS) as executor:
+            list(executor.map(lambda ticker: backtest_engine.run_scanner_with_historical_data(ticker, scan_date, env.client), tickers))
+
+    return {
+        'scan_many_cold': timed(lambda: list(scanner.scan_many(tickers)), runs, setup=env.reset),
+        'scan_many_warm': timed(lambda: list(scanner.scan_many(tickers)), runs),
+        'run_funnel_cold': timed(lambda: screening.run_funnel(tickers, client=env.client, as_of=screening.last_completed_session()),
+                                 runs, setup=env.reset),
+        'historical_scan_cold': timed(historical_scan, runs, setup=env.reset),
+        'yang_zhang_latest_batch': timed(lambda: yang_zhang_latest(*ohlc), runs, number=20),
+        'term_structure_batch': timed(lambda: term_structure.term_structure_metrics(*term_structure.pack(curves)), runs, number=20),
+    }
+
+def compare(report, baseline):
+    """Prints the median change of every benchmark present in both reports."""
+    def flatten(report):
+        flat = {f"core.{name}": result['median_ms'] for name, result in report['benchmarks'].items()}
+        for size, results in report.get('scaling', {}).items():
+            flat.update({f"scaling.{size}.{name}": result['median_ms'] for name, result in results.items()})
+        return flat
+    current, previous = flatten(report), flatten(baseline)
+    print(f"\nChange vs {baseline.get('commit') or 'baseline'} (median):")
+    for name in sorted(current.keys() & previous.keys()):
+        change = current[name] / previous[name] - 1 if previous[name] else float('nan')
+        print(f"  {name:<55} {previous[name]:>10.2f} -> {current[name]:>10.2f} ms  ({change:+.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Universe sizes for the scaling runs')
+    parser.add_argument('--runs', type=int, default=5, help='Samples per benchmark')
+    parser.add_argument('--fixtures', help='Directory of recorded fixtures (default: synthetic data)')
+    parser.add_argument('--quick', action='store_true', help='One sample per benchmark and sizes 10 and 100 only')
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    parser.add_argument('--baseline', help='A previous report to compare against')
+    args = parser.parse_args()
+    runs = 1 if args.quick else args.runs
+    sizes = [size for size in args.sizes if size <= 100] if args.quick else args.sizes
+
+    root = tempfile.mkdtemp(prefix='benchmarks_')
+    core_fixtures = FixtureSet.load(args.fixtures) if args.fixtures else FixtureSet.synthetic(10)
+    report = {'commit': commit_hash(), 'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+              'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'fixtures': args.fixtures or 'synthetic', 'runs': runs}
+
+    env = OfflineEnvironment(core_fixtures, os.path.join(root, 'core'))
+    env.install()
+    report['benchmarks'] = run_core(env, runs)
+
+    # Scaling always uses synthetic universes, since recordings rarely cover 1,500 tickers.
+    report['scaling'] = {}
+    for size in sizes:
+        env = OfflineEnvironment(FixtureSet.synthetic(size), os.path.join(root, f"scale{size}"))
+        env.install()
+        report['scaling'][str(size)] = run_scaling(env, size, runs)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
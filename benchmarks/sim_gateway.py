@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from ibapi.common import TickAttrib
+from ibapi.contract import ContractDetails
+from ibapi.execution import Execution
+from ibapi.order_state import OrderState
+import live_bot
+from contract_resolver import ContractResolver
+from market_data import contract_key
+from trade_state import TradeStateStore
+
+class SyntheticQuotes:
+    """Random-walk option quotes whose mid grows with strike and sqrt(time to expiry), so calendars price positive."""
+    def __init__(self, seed=0, spread=0.05, step=0.002):
+        self.rng = random.Random(seed)
+        self.spread = spread
+        self.step = step
+        self.mids = {}
+
+    def quote(self, contract):
+        key = contract_key(contract)
+        if key not in self.mids:
+            days = max((datetime.strptime(contract.lastTradeDateOrContractMonth, '%Y%m%d') - datetime.now()).days, 1)
+            self.mids[key] = 0.16 * contract.strike * math.sqrt(days / 365)
+        self.mids[key] *= 1 + self.rng.gauss(0, self.step)
+        mid = max(self.mids[key], 0.05)
+        return round(mid - self.spread / 2, 2), round(mid + self.spread / 2, 2)
+
+class RecordedQuotes:
+    """
+    Replays recorded quotes from a JSONL file of {"symbol", "expiry", "strike", "right", "bid", "ask"} rows.
+
+    Each contract cycles through its own rows in file order; contracts with no rows fall back to synthetic quotes.
+    """
+    def __init__(self, path, seed=0):
+        self.rows = {}
+        with open(path) as f:
+            for line in f:
+                row = json.loads(line)
+                key = (row['symbol'], 'OPT', row['expiry'], float(row['strike']), row['right'])
+                self.rows.setdefault(key, []).append((row['bid'], row['ask']))
+        self.positions = {}
+        self.fallback = SyntheticQuotes(seed)
+
+    def quote(self, contract):
+        rows = self.rows.get(contract_key(contract))
+        if not rows: return self.fallback.quote(contract)
+        position = self.positions.get(contract_key(contract), 0)
+        self.positions[contract_key(contract)] = position + 1
+        return rows[position % len(rows)]
+
+class SimulatedGateway:
+    """
+    In-process stand-in for TWS / IB Gateway that answers an IBKRBot through its EWrapper callbacks.
+
+    Every response is queued with a delay and delivered from the gateway's own thread, as the real
+    API reader thread would: order acks after ack_delay, fills after fill_delay and quote ticks
+    every quote_interval for each subscription. Stop orders rest until cancelled. Order placements
+    and callback delivery lag are recorded for benchmarking.
+    """
+    def __init__(self, wrapper, quotes=None, ack_delay=0.002, fill_delay=0.05, quote_interval=0.1,
+                 account_value=1000000.0, first_order_id=1):
+        self.wrapper = wrapper
+        self.quotes = quotes or SyntheticQuotes()
+        self.ack_delay = ack_delay
+        self.fill_delay = fill_delay
+        self.quote_interval = quote_interval
+        self.account_value = account_value
+        self.first_order_id = first_order_id
+        self.condition = threading.Condition()
+        self.queue = []
+        self.counter = itertools.count()
+        self.subscriptions = {}
+        self.orders = {}
+        self.placements = []
+        self.callbacks = 0
+        self.callback_lag = []
+        self.running = False
+        self.thread = None
+
+    def _at(self, delay, fn, *args):
+        with self.condition:
+            heapq.heappush(self.queue, (time.time() + delay, next(self.counter), fn, args))
+            self.condition.notify()
+
+    def _deliver(self, due_at, fn, args):
+        self.callbacks += 1
+        self.callback_lag.append(time.time() - due_at)
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Simulated callback {getattr(fn, '__name__', fn)} raised: {e}")
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                while self.running and (not self.queue or self.queue[0][0] > time.time()):
+                    self.condition.wait(self.queue[0][0] - time.time() if self.queue else None)
+                if not self.running: return
+                due_at, _, fn, args = heapq.heappop(self.queue)
+            self._deliver(due_at, fn, args)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread: self.thread.join()
+
+    # --- EClient requests ---
+    def connect(self):
+        self._at(self.ack_delay, self.wrapper.nextValidId, self.first_order_id)
+
+    def reqAccountSummary(self, reqId, groupName, tags):
+        self._at(self.ack_delay, self.wrapper.accountSummary, reqId, "SIM", "NetLiquidation", str(self.account_value), "USD")
+
+    def reqMktData(self, reqId, contract, genericTickList, snapshot, regulatorySnapshot, mktDataOptions):
+        self.subscriptions[reqId] = contract
+        self._at(self.ack_delay, self._tick, reqId)
+
+    def cancelMktData(self, reqId):
+        self.subscriptions.pop(reqId, None)
+
+    def _tick(self, reqId):
+        contract = self.subscriptions.get(reqId)
+        if contract is None: return
+        bid, ask = self.quotes.quote(contract)
+        self.wrapper.tickPrice(reqId, 1, bid, TickAttrib())
+        self.wrapper.tickPrice(reqId, 2, ask, TickAttrib())
+        self._at(self.quote_interval, self._tick, reqId)
+
+    def placeOrder(self, orderId, contract, order):
+        self.placements.append({'order_id': orderId, 'symbol': contract.symbol, 'action': order.action,
+                                'order_type': order.orderType, 'placed_at': time.time()})
+        self.orders[orderId] = {'order': order, 'contract': contract, 'status': 'Submitted', 'fill_price': None}
+        self._at(self.ack_delay, self._order_status, orderId, 'Submitted', 0, order.totalQuantity, 0.0)
+        if order.orderType in ('MKT', 'LMT'):
+            fill_price = order.lmtPrice if order.orderType == 'LMT' else 1.0
+            self._at(self.fill_delay, self._fill, orderId, fill_price)
+
+    def _fill(self, orderId, fill_price):
+        if self.orders[orderId]['status'] != 'Submitted': return
+        self.orders[orderId]['status'] = 'Filled'
+        self.orders[orderId]['fill_price'] = fill_price
+        self.orders[orderId]['order'].filledQuantity = self.orders[orderId]['order'].totalQuantity
+        self._order_status(orderId, 'Filled', self.orders[orderId]['order'].totalQuantity, 0, fill_price)
+
+    def _order_status(self, orderId, status, filled, remaining, avg_fill_price):
+        self.wrapper.orderStatus(orderId, status, filled, remaining, avg_fill_price, orderId, 0, avg_fill_price, 0, "", 0.0)
+
+    def cancelOrder(self, orderId, *args):
+        if orderId not in self.orders or self.orders[orderId]['status'] != 'Submitted': return
+        self.orders[orderId]['status'] = 'Cancelled'
+        self._at(self.ack_delay, self._order_status, orderId, 'Cancelled', 0, 0, 0.0)
+
+    def _order_state(self, status):
+        state = OrderState()
+        state.status = status
+        return state
+
+    def reqOpenOrders(self):
+        for order_id, entry in list(self.orders.items()):
+            if entry['status'] == 'Submitted':
+                self._at(self.ack_delay, self.wrapper.openOrder, order_id, entry['contract'], entry['order'], self._order_state('Submitted'))
+        self._at(self.ack_delay, self.wrapper.openOrderEnd)
+
+    def reqCompletedOrders(self, apiOnly):
+        for order_id, entry in list(self.orders.items()):
+            if entry['status'] != 'Submitted':
+                entry['order'].orderId = order_id
+                self._at(self.ack_delay, self.wrapper.completedOrder, entry['contract'], entry['order'], self._order_state(entry['status']))
+        self._at(self.ack_delay, self.wrapper.completedOrdersEnd)
+
+    def reqExecutions(self, reqId, execFilter):
+        for order_id, entry in list(self.orders.items()):
+            if entry['status'] != 'Filled': continue
+            execution = Execution()
+            execution.orderId, execution.shares, execution.price = order_id, entry['order'].totalQuantity, entry['fill_price']
+            self._at(self.ack_delay, self.wrapper.execDetails, reqId, entry['contract'], execution)
+        self._at(self.ack_delay, self.wrapper.execDetailsEnd, reqId)
+
+    def reqContractDetails(self, reqId, contract):
+        details = ContractDetails()
+        details.contract = contract
+        details.contract.conId = zlib.crc32(repr(contract_key(contract)).encode()) & 0x7FFFFFFF
+        self._at(self.ack_delay, self.wrapper.contractDetails, reqId, details)
+        self._at(self.ack_delay, self.wrapper.contractDetailsEnd, reqId)
+
+    def reqSecDefOptParams(self, reqId, underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId):
+        today = datetime.now().date()
+        fridays = [today + timedelta(days=d) for d in range(1, 181) if (today + timedelta(days=d)).weekday() == 4]
+        expirations = {d.strftime('%Y%m%d') for d in fridays}
+        strikes = {round(2.5 * i, 1) for i in range(1, 800)}
+        self._at(self.ack_delay, self.wrapper.securityDefinitionOptionParameter, reqId, "SMART", underlyingConId,
+                 underlyingSymbol, "100", expirations, strikes)
+        self._at(self.ack_delay, self.wrapper.securityDefinitionOptionParameterEnd, reqId)
+
+class SimulatedBot(live_bot.IBKRBot):
+    """An IBKRBot wired to a SimulatedGateway instead of a TWS socket, with its journal and contract cache under state_dir."""
+    def __init__(self, state_dir, **gateway_options):
+        super().__init__()
+        os.makedirs(state_dir, exist_ok=True)
+        self.gateway = SimulatedGateway(self, **gateway_options)
+        self.trades = TradeStateStore(os.path.join(state_dir, 'trade_journal.jsonl'))
+        self.contracts = ContractResolver(self, os.path.join(state_dir, 'ibkr_contracts.json'))
+
+    def connect(self, host=None, port=None, clientId=None):
+        self.gateway.start()
+        self.gateway.connect()
+
+    def disconnect(self):
+        self.gateway.stop()
+
+    def reqAccountSummary(self, *args): self.gateway.reqAccountSummary(*args)
+    def reqMktData(self, *args): self.gateway.reqMktData(*args)
+    def cancelMktData(self, *args): self.gateway.cancelMktData(*args)
+    def placeOrder(self, *args): self.gateway.placeOrder(*args)
+    def cancelOrder(self, *args): self.gateway.cancelOrder(*args)
+    def reqOpenOrders(self): self.gateway.reqOpenOrders()
+    def reqCompletedOrders(self, *args): self.gateway.reqCompletedOrders(*args)
+    def reqExecutions(self, *args): self.gateway.reqExecutions(*args)
+    def reqContractDetails(self, *args): self.gateway.reqContractDetails(*args)
+    def reqSecDefOptParams(self, *args): self.gateway.reqSecDefOptParams(*args)
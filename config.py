@@ -25,12 +25,72 @@ STOP_LOSS_PERCENTAGE = 0.40
 # --- Order Execution ---
 ORDER_TYPE = 'LMT'
 
+# --- Backtest Pricing ---
+MAX_QUOTE_STALENESS_MINUTES = 15 # Oldest minute bar accepted when the exact minute has no prints
+
 
 # === SCANNER PARAMETER THRESHOLDS ===
 # --- Core Scanner Parameters ---
 AVG_VOLUME_THRESHOLD = 1500000
 IV_RV_RATIO_THRESHOLD = 1.25
 TERM_STRUCTURE_SLOPE_THRESHOLD = -0.00406
+TERM_STRUCTURE_METHOD = 'linear' # 'linear' interpolates between expiries (extrapolating past the ends); 'variance_fit' fits a total-variance curve
+MIN_UNDERLYING_PRICE = 0.0 # Screening funnel drops stocks whose last close is below this; 0 disables it (the scanner has no price criterion of its own)
+SCREEN_LOOKBACK_SESSIONS = 30 # Sessions of Polygon grouped daily bars averaged by the funnel's bulk volume filter
 
 # --- Enhanced Scanner Parameters ---
-MACRO_EVENT_DAYS_AWAY = 1
\ No newline at end of file
+MACRO_EVENT_DAYS_AWAY = 1
+EARNINGS_MOVE_LOOKBACK = 4 # Past earnings reactions averaged into the historical move (about a year, which the ~400 days of daily bars cover)
+EARNINGS_MOVE_RATIO_THRESHOLD = 1.0 # The front-month implied move must be at least this multiple of the historical move
+
+
+# === PERFORMANCE SETTINGS ===
+# --- Local Caches ---
+CACHE_DIR = 'cache'
+MACRO_CALENDAR_TTL_HOURS = 12
+EARNINGS_STORE_TTL_DAYS = 7
+UPCOMING_EARNINGS_REFRESH_MINUTES = 60 # How often the running bot re-checks the upcoming earnings calendar for added, moved or dropped reports
+UPCOMING_EARNINGS_MIN_RETAINED = 0.5 # A calendar refresh returning fewer than this fraction of the stored events is treated as a failed download
+UNIVERSE_SNAPSHOT_MAX_AGE_DAYS = 30
+FEATURE_STORE_FLUSH_ROWS = 200
+POLYGON_CACHE_TTL_MINUTES = 60 # Applies only to responses touching today; historical responses never expire
+
+# --- Concurrency & Rate Limits ---
+SCAN_MAX_WORKERS = 8
+BACKTEST_MAX_WORKERS = 8
+BACKTEST_ASYNC_SCANS = True # run_backtest fetches scanner features over one pooled async Polygon session instead of one request at a time per worker
+SCHEDULER_MAX_WORKERS = 4 # Trade entries/exits due at the same instant are dispatched in parallel
+# Set calls_per_minute to what your subscription allows; burst is how many calls may go out back-to-back.
+RATE_LIMITS = {
+    'polygon': {'calls_per_minute': 15, 'burst': 5},
+    'yfinance': {'calls_per_minute': 120, 'burst': 10},
+}
+POLYGON_ASYNC_MAX_CONNECTIONS = 10 # Pooled keep-alive connections used by the async Polygon client
+POLYGON_ASYNC_KEEPALIVE_SECONDS = 30
+POLYGON_ASYNC_TIMEOUT_SECONDS = 60
+POLYGON_ASYNC_MAX_EVENTS = 16 # Historical scans whose requests may be in flight at once (the rate limit still applies)
+
+# --- Live Market Data ---
+MARKET_DATA_MAX_LINES = 100 # IBKR's default simultaneous quote line allowance
+MARKET_DATA_FIRST_REQ_ID = 10000000 # Market data request ids start here so they never collide with order ids
+MARKET_DATA_PREWARM_MINUTES = 5 # Subscribe to a trade's legs this long before its entry time
+MARKET_DATA_WAIT_SECONDS = 10 # Fallback wait at entry when a leg has no streaming quote yet
+SPREAD_PRICING = 'mid' # 'mid' (mid-to-mid) or 'natural' (long ask minus short bid)
+CONTRACT_RESOLVER_FIRST_REQ_ID = 20000000 # Contract detail / option chain request ids start here
+CONTRACT_RESOLVER_TIMEOUT_SECONDS = 10
+EXECUTIONS_REQ_ID = 9002 # Request id of the executions query made when recovering trades
+ORDER_RECONCILE_TIMEOUT_SECONDS = 15 # How long recovery waits for IBKR's open orders, completed orders and executions
+CONTRACT_CHAIN_TTL_DAYS = 1 # Listed expiries and strikes are re-fetched once a day; conIds are cached indefinitely
+
+# --- Market Data Stores ---
+BAR_STORE_LOOKBACK_DAYS = 400 # Calendar days of daily bars kept for the live scanner
+OPTION_CHAIN_TTL_SECONDS = 300 # Repeated scans of a ticker within this window reuse its option chains
+OPTION_CHAIN_STRIKE_BAND = 0.20 # Only strikes within +/-20% of spot are kept in memory
+OPTION_CHAIN_MAX_WORKERS = 8 # Expiries of one ticker are downloaded in parallel
+OPTION_MINUTE_BAR_CACHE_TICKERS = 5000 # Option tickers whose minute bars the backtest keeps in memory; the least recently used are dropped
+
+# --- Instrumentation ---
+INSTRUMENTATION_ENABLED = False # Collect per-stage timings, API call counts, rate-limit sleep and cache hit rates
+INSTRUMENTATION_REPORT_PATH = 'cache/instrumentation.json' # Written at exit; use a .prom file for Prometheus text format
+INSTRUMENTATION_TRACE_PATH = None # e.g. 'cache/trace.jsonl' for one JSON line per span, call and sleep
+INSTRUMENTATION_METRIC_PREFIX = 'calendar_bot_'
@@ -0,0 +1,202 @@
+import bisect
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from ibapi.contract import Contract, ComboLeg
+import config
+import instrumentation
+
+CHAIN_EXCHANGE = 'SMART'
+MAX_STRIKE_CANDIDATES = 3
+NO_SECURITY_DEFINITION = 200 # The only IBKR rejection that means the contract is not listed
+
+def _nearest(sorted_values, target, count):
+    """Returns the `count` values closest to target, nearest first, walking outwards from its bisect position."""
+    i = bisect.bisect_left(sorted_values, target)
+    lo, hi = i - 1, i
+    ordered = []
+    while len(ordered) < count and (lo >= 0 or hi < len(sorted_values)):
+        if hi >= len(sorted_values) or (lo >= 0 and abs(sorted_values[lo] - target) <= abs(sorted_values[hi] - target)):
+            ordered.append(sorted_values[lo]); lo -= 1
+        else:
+            ordered.append(sorted_values[hi]); hi += 1
+    return ordered
+
+def option_contract(symbol, expiry, strike, right, con_id=0):
+    contract = Contract(); contract.symbol = symbol; contract.secType = "OPT"
+    contract.exchange = "SMART"; contract.currency = "USD"
+    contract.lastTradeDateOrContractMonth = expiry; contract.strike = strike
+    contract.right = right; contract.multiplier = "100"; contract.conId = con_id
+    return contract
+
+def bag_contract(symbol, short_leg, long_leg):
+    """Builds the calendar BAG contract: sell the front-month leg, buy the back-month leg."""
+    contract = Contract(); contract.symbol = symbol; contract.secType = "BAG"
+    contract.currency = "USD"; contract.exchange = "SMART"
+    contract.comboLegs = []
+    for leg, action in ((short_leg, "SELL"), (long_leg, "BUY")):
+        combo_leg = ComboLeg(); combo_leg.conId = leg.conId; combo_leg.ratio = 1
+        combo_leg.action = action; combo_leg.exchange = "SMART"
+        contract.comboLegs.append(combo_leg)
+    return contract
+
+class ContractResolver:
+    """
+    Resolves listed option expiries, strikes and conIds through the IBKR API, ahead of order time.
+
+    Option chains (reqSecDefOptParams) are cached for CONTRACT_CHAIN_TTL_DAYS and conIds
+    (reqContractDetails) indefinitely, both in memory and in a JSON file, so resolving a trade's
+    legs on the critical path is normally a pair of bisect lookups. The bot forwards the matching
+    EWrapper callbacks to the on_* methods.
+    """
+    def __init__(self, client, cache_path=os.path.join(config.CACHE_DIR, 'ibkr_contracts.json'),
+                 first_req_id=config.CONTRACT_RESOLVER_FIRST_REQ_ID):
+        self.client = client
+        self.cache_path = cache_path
+        self.req_ids = itertools.count(first_req_id)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.con_ids = {}
+        self.chains = {}
+        self._load_from_disk()
+
+    def _load_from_disk(self):
+        if not os.path.exists(self.cache_path): return
+        with open(self.cache_path) as f:
+            cached = json.load(f)
+        self.con_ids = cached.get('con_ids', {})
+        self.chains = cached.get('chains', {})
+
+    def _save_to_disk(self):
+        with self.lock:
+            cached = {'con_ids': dict(self.con_ids), 'chains': dict(self.chains)}
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(cached, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _request(self, endpoint, send):
+        """
+        Sends one request under a fresh request id and blocks until its End callback or an error.
+
+        Returns the rows ([] if IBKR has no security definition for it), or None on a timeout or any other rejection.
+        """
+        req_id = next(self.req_ids)
+        pending = {'event': threading.Event(), 'rows': [], 'error_code': None}
+        with self.lock:
+            self.pending[req_id] = pending
+        started = time.perf_counter()
+        try:
+            send(req_id)
+            if not pending['event'].wait(config.CONTRACT_RESOLVER_TIMEOUT_SECONDS):
+                instrumentation.record_call('ibkr', endpoint, time.perf_counter() - started, error='timeout')
+                return None
+            error_code = pending['error_code']
+            instrumentation.record_call('ibkr', endpoint, time.perf_counter() - started, error='rejected' if error_code is not None else None)
+            if error_code is None: return pending['rows']
+            return [] if error_code == NO_SECURITY_DEFINITION else None
+        finally:
+            with self.lock:
+                self.pending.pop(req_id, None)
+
+    def owns(self, req_id):
+        with self.lock:
+            return req_id in self.pending
+
+    def on_row(self, req_id, row):
+        with self.lock:
+            pending = self.pending.get(req_id)
+        if pending: pending['rows'].append(row)
+
+    def on_end(self, req_id, error_code=None):
+        with self.lock:
+            pending = self.pending.get(req_id)
+        if pending:
+            pending['error_code'] = error_code
+            pending['event'].set()
+
+    def _contract_details(self, contract):
+        return self._request('reqContractDetails', lambda req_id: self.client.reqContractDetails(req_id, contract))
+
+    def underlying_con_id(self, symbol):
+        key = f"{symbol}|STK"
+        if key not in self.con_ids:
+            contract = Contract(); contract.symbol = symbol; contract.secType = "STK"
+            contract.exchange = "SMART"; contract.currency = "USD"
+            rows = self._contract_details(contract)
+            if not rows: return None
+            with self.lock:
+                self.con_ids[key] = rows[0].contract.conId
+            self._save_to_disk()
+        return self.con_ids[key]
+
+    def option_chain(self, symbol):
+        """Returns (sorted expiry strings, sorted strikes) listed on SMART for the symbol's standard trading class."""
+        today = datetime.now().date()
+        chain = self.chains.get(symbol)
+        fresh = chain is not None and (today - datetime.strptime(chain['fetched'], '%Y-%m-%d').date()).days < config.CONTRACT_CHAIN_TTL_DAYS
+        instrumentation.record_cache('ibkr_option_chains', fresh)
+        if fresh: return chain['expirations'], chain['strikes']
+        underlying_con_id = self.underlying_con_id(symbol)
+        if underlying_con_id is None: return [], []
+        rows = self._request('reqSecDefOptParams', lambda req_id: self.client.reqSecDefOptParams(req_id, symbol, "", "STK", underlying_con_id))
+        rows = [row for row in rows or [] if row['exchange'] == CHAIN_EXCHANGE]
+        # Prefer the standard class (e.g. SPY over weekly-only classes) when the symbol lists several.
+        rows = [row for row in rows if row['trading_class'] == symbol] or rows
+        if not rows: return [], []
+        expirations = sorted(set().union(*(row['expirations'] for row in rows)))
+        strikes = sorted(set().union(*(row['strikes'] for row in rows)))
+        with self.lock:
+            self.chains[symbol] = {'fetched': today.strftime('%Y-%m-%d'), 'expirations': expirations, 'strikes': strikes}
+        self._save_to_disk()
+        return expirations, strikes
+
+    def snap_expiry(self, expirations, target_date, after=None):
+        """Returns the listed expiry nearest to target_date, strictly later than `after` if given."""
+        if after is not None: expirations = expirations[bisect.bisect_right(expirations, after):]
+        if not expirations: return None
+        i = bisect.bisect_left(expirations, target_date.strftime('%Y%m%d'))
+        candidates = expirations[max(i - 1, 0):i + 1]
+        return min(candidates, key=lambda expiry: abs((datetime.strptime(expiry, '%Y%m%d').date() - target_date).days))
+
+    def con_id(self, symbol, expiry, strike, right):
+        """Returns the conId for one option, from the cache or a reqContractDetails round trip (None if not listed)."""
+        key = f"{symbol}|{expiry}|{strike:g}|{right}"
+        instrumentation.record_cache('ibkr_con_ids', key in self.con_ids)
+        if key in self.con_ids: return self.con_ids[key] or None
+        rows = self._contract_details(option_contract(symbol, expiry, strike, right))
+        if rows is None: return None
+        with self.lock:
+            # A conId of 0 records that IBKR does not list this contract, so it is not asked for again.
+            # Other rejections (pacing, connectivity) returned None above and are retried next time.
+            self.con_ids[key] = rows[0].contract.conId if rows else 0
+        self._save_to_disk()
+        return self.con_ids[key] or None
+
+    def resolve_calendar(self, symbol, entry_date, underlying_price, right=config.OPTION_TYPE):
+        """
+        Snaps a calendar's legs to listed contracts and resolves their conIds.
+
+        The short expiry is the listed one nearest entry + 20 days and the long one nearest
+        EXPIRY_GAP_DAYS after that. The strike is the listed strike nearest the underlying price
+        that both expiries carry.
+
+        Returns:
+            dict: {'strike', 'short_expiry', 'long_expiry', 'short_con_id', 'long_con_id'}, or None if unresolved.
+        """
+        expirations, strikes = self.option_chain(symbol)
+        if not expirations or not strikes: return None
+        short_expiry = self.snap_expiry(expirations, entry_date + timedelta(days=20))
+        long_expiry = self.snap_expiry(expirations, entry_date + timedelta(days=20 + config.EXPIRY_GAP_DAYS), after=short_expiry)
+        if short_expiry is None or long_expiry is None: return None
+        for strike in _nearest(strikes, underlying_price, MAX_STRIKE_CANDIDATES):
+            short_con_id = self.con_id(symbol, short_expiry, strike, right)
+            long_con_id = short_con_id and self.con_id(symbol, long_expiry, strike, right)
+            if short_con_id and long_con_id:
+                return {'strike': strike, 'short_expiry': short_expiry, 'long_expiry': long_expiry,
+                        'short_con_id': short_con_id, 'long_con_id': long_con_id}
+        return None
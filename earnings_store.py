@@ -0,0 +1,127 @@
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time
+import yfinance as yf
+import config
+from rate_limiter import get_limiter
+
+yf_limiter = get_limiter('yfinance')
+
+def normalize_ticker(ticker):
+    """Converts index-style symbols (BRK.B) to the form yfinance expects (BRK-B)."""
+    return ticker.strip().replace('.', '-')
+
+def classify_timing(timestamp):
+    """Maps an earnings timestamp to 'bmo', 'amc' or 'dmh'. Returns None when only the date is known."""
+    announcement_time = timestamp.time()
+    if announcement_time == dt_time(0, 0): return None
+    if announcement_time < dt_time(9, 30): return 'bmo'
+    if announcement_time >= dt_time(16, 0): return 'amc'
+    return 'dmh'
+
+class EarningsStore:
+    """
+    Local SQLite store of earnings dates keyed by (ticker, date), with the announcement timing.
+
+    Tickers are re-fetched from yfinance only when they have never been fetched or their data is
+    older than the TTL. Date-range queries are answered from a sorted in-memory index.
+    """
+    def __init__(self, db_path, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS earnings (ticker TEXT, date TEXT, timing TEXT, PRIMARY KEY (ticker, date))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS refreshed (ticker TEXT PRIMARY KEY, refreshed_at REAL)")
+        self.db.commit()
+        self.index = None
+
+    def _load_index(self):
+        with self.lock:
+            if self.index is None:
+                rows = self.db.execute("SELECT date, ticker, timing FROM earnings ORDER BY date, ticker").fetchall()
+                dates = [datetime.strptime(d, '%Y-%m-%d').date() for d, _, _ in rows]
+                self.index = {
+                    'dates': dates,
+                    'tickers': [ticker for _, ticker, _ in rows],
+                    'timing': {(ticker, event_date): timing for event_date, (_, ticker, timing) in zip(dates, rows)},
+                }
+            return self.index
+
+    def stale_tickers(self, tickers):
+        """Returns the tickers that are missing from the store or older than the TTL."""
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            fresh = {ticker for ticker, in self.db.execute("SELECT ticker FROM refreshed WHERE refreshed_at >= ?", (cutoff,))}
+        return [ticker for ticker in tickers if ticker not in fresh]
+
+    def _fetch(self, ticker):
+        earnings_dates = yf_limiter.call(lambda: yf.Ticker(ticker).earnings_dates, endpoint='earnings_dates')
+        if earnings_dates is None or earnings_dates.empty: return []
+        return [(ticker, timestamp.date().strftime('%Y-%m-%d'), classify_timing(timestamp)) for timestamp in earnings_dates.index]
+
+    def _save(self, ticker, rows):
+        with self.lock:
+            self.db.execute("DELETE FROM earnings WHERE ticker = ?", (ticker,))
+            self.db.executemany("INSERT OR REPLACE INTO earnings VALUES (?, ?, ?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO refreshed VALUES (?, ?)", (ticker, time.time()))
+            self.db.commit()
+            self.index = None
+
+    def refresh(self, tickers, max_workers=config.SCAN_MAX_WORKERS):
+        """Concurrently fetches earnings dates for the stale tickers only. Returns the number refreshed."""
+        stale = self.stale_tickers([normalize_ticker(ticker) for ticker in tickers])
+        if not stale: return 0
+        print(f"Refreshing earnings dates for {len(stale)} stale tickers...")
+
+        def fetch_and_save(ticker):
+            try:
+                self._save(ticker, self._fetch(ticker))
+                return True
+            except Exception:
+                # Leave the ticker stale so the next refresh tries it again.
+                return False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            refreshed = sum(executor.map(fetch_and_save, stale))
+        print(f"Refreshed {refreshed}/{len(stale)} tickers.")
+        return refreshed
+
+    def events_between(self, start_date, end_date, tickers=None):
+        """Returns sorted (date, ticker) events with start_date <= date <= end_date, optionally limited to tickers."""
+        index = self._load_index()
+        lo = bisect.bisect_left(index['dates'], start_date)
+        hi = bisect.bisect_right(index['dates'], end_date)
+        events = zip(index['dates'][lo:hi], index['tickers'][lo:hi])
+        if tickers is None: return list(events)
+        tickers = {normalize_ticker(ticker) for ticker in tickers}
+        return [event for event in events if event[1] in tickers]
+
+    def history(self, tickers, start_date, end_date):
+        """Returns {ticker: [(date, timing)]} for the events with start_date <= date <= end_date, oldest first."""
+        timing = self._load_index()['timing']
+        history = {}
+        for event_date, ticker in self.events_between(start_date, end_date, tickers):
+            history.setdefault(ticker, []).append((event_date, timing[(ticker, event_date)]))
+        return history
+
+    def get_timing(self, ticker, event_date):
+        """Returns (found, timing) for one earnings event."""
+        timing = self._load_index()['timing']
+        key = (normalize_ticker(ticker), event_date)
+        return key in timing, timing.get(key)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_earnings_store():
+    """Returns the shared EarningsStore instance."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EarningsStore(os.path.join(config.CACHE_DIR, 'earnings.sqlite'), config.EARNINGS_STORE_TTL_DAYS * 86400)
+        return _store
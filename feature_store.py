@@ -0,0 +1,111 @@
+import atexit
+import glob
+import os
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+import config
+
+KEY_COLUMNS = ['ticker', 'as_of', 'source']
+FEATURE_COLUMNS = KEY_COLUMNS + ['status', 'underlying_price', 'avg_volume', 'rv30', 'iv30', 'iv_rv_ratio', 'ts_slope',
+                                 'macro_passed', 'macro_reason', 'implied_move', 'historical_move', 'earnings_move_passed',
+                                 'term_structure_method', 'recorded_at']
+NUMERIC_COLUMNS = ['underlying_price', 'avg_volume', 'rv30', 'iv30', 'iv_rv_ratio', 'ts_slope', 'implied_move', 'historical_move', 'recorded_at']
+OBJECT_COLUMNS = ['status', 'macro_passed', 'macro_reason', 'earnings_move_passed', 'term_structure_method']
+
+def _partition_date(path):
+    return datetime.strptime(os.path.basename(os.path.dirname(path)).split('=')[1], '%Y-%m-%d').date()
+
+class FeatureStore:
+    """
+    Columnar store of raw, unrounded scanner features, written as Parquet partitioned by as-of date.
+
+    Rows are keyed by (ticker, as_of, source), where source is 'live' or 'historical'. Appends are
+    buffered and merged into their partitions on flush; a recomputed key replaces the older row.
+    The macro and earnings-move verdicts are kept as recorded; readers re-derive them from the raw
+    inputs when the config may have changed since.
+    """
+    def __init__(self, root, flush_rows=200):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.lock = threading.RLock()
+        self.buffer = {}
+        self.partitions = {}
+
+    def _partition_path(self, as_of):
+        return os.path.join(self.root, f"as_of={as_of.strftime('%Y-%m-%d')}", 'part.parquet')
+
+    def _read_partition(self, as_of):
+        with self.lock:
+            if as_of not in self.partitions:
+                path = self._partition_path(as_of)
+                self.partitions[as_of] = pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame(columns=FEATURE_COLUMNS)
+            return self.partitions[as_of]
+
+    def append(self, features, source):
+        """Buffers one scanner run's features (a dict with 'ticker' and 'as_of' or 'scan_date')."""
+        record = {column: features.get(column) for column in FEATURE_COLUMNS}
+        record['as_of'] = features.get('as_of') or features['scan_date']
+        record['source'] = source
+        record['recorded_at'] = time.time()
+        with self.lock:
+            self.buffer[(record['ticker'], record['as_of'], source)] = record
+            if len(self.buffer) >= self.flush_rows: self.flush()
+
+    def flush(self):
+        """Merges buffered rows into their date partitions, keeping the newest row per key."""
+        with self.lock:
+            if not self.buffer: return
+            by_date = {}
+            for record in self.buffer.values():
+                by_date.setdefault(record['as_of'], []).append(record)
+            for as_of, records in by_date.items():
+                new_rows = pd.DataFrame(records, columns=FEATURE_COLUMNS)
+                new_rows['as_of'] = pd.to_datetime(new_rows['as_of'])
+                new_rows[NUMERIC_COLUMNS] = new_rows[NUMERIC_COLUMNS].astype(float)
+                new_rows[OBJECT_COLUMNS] = new_rows[OBJECT_COLUMNS].astype(object)
+                existing = self._read_partition(as_of)
+                merged = new_rows if existing.empty else pd.concat([existing, new_rows], ignore_index=True)
+                merged = merged.drop_duplicates(KEY_COLUMNS, keep='last').reset_index(drop=True)
+                path = self._partition_path(as_of)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                merged.to_parquet(path + '.tmp', index=False)
+                os.replace(path + '.tmp', path)
+                self.partitions[as_of] = merged
+            self.buffer = {}
+
+    def lookup(self, ticker, as_of, source):
+        """Returns the stored features for one key as a dict (missing values as None), or None."""
+        with self.lock:
+            if (ticker, as_of, source) in self.buffer: return dict(self.buffer[(ticker, as_of, source)])
+            partition = self._read_partition(as_of)
+        rows = partition[(partition['ticker'] == ticker) & (partition['source'] == source)]
+        if rows.empty: return None
+        record = rows.iloc[-1].astype(object).where(rows.iloc[-1].notna(), None).to_dict()
+        record['as_of'] = as_of
+        return record
+
+    def query(self, tickers=None, start_date=None, end_date=None, source=None):
+        """Returns all stored rows in the date range (inclusive), optionally filtered by tickers and source."""
+        self.flush()
+        paths = [path for path in glob.glob(os.path.join(self.root, 'as_of=*', 'part.parquet'))
+                 if (start_date is None or _partition_date(path) >= start_date) and (end_date is None or _partition_date(path) <= end_date)]
+        if not paths: return pd.DataFrame(columns=FEATURE_COLUMNS)
+        filters = []
+        if tickers is not None: filters.append(('ticker', 'in', list(tickers)))
+        if source is not None: filters.append(('source', '==', source))
+        frames = [pd.read_parquet(path, filters=filters or None) for path in sorted(paths)]
+        return pd.concat(frames, ignore_index=True)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_feature_store():
+    """Returns the shared FeatureStore instance, flushed automatically at interpreter exit."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FeatureStore(os.path.join(config.CACHE_DIR, 'features'), config.FEATURE_STORE_FLUSH_ROWS)
+            atexit.register(_store.flush)
+        return _store
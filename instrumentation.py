@@ -0,0 +1,181 @@
+import atexit
+import json
+import os
+import threading
+import time
+import config
+
+# Everything below is a no-op while this is False, so spans can stay in hot paths at the cost of one check.
+_enabled = False
+_lock = threading.Lock()
+_spans = {}     # name -> [count, total_seconds, max_seconds]
+_calls = {}     # (provider, endpoint) -> [count, errors, throttled, total_seconds]
+_sleeps = {}    # provider -> [count, total_seconds]
+_caches = {}    # cache name -> [hits, misses]
+_trace = None
+_started_at = None
+_report_path = None
+_atexit_registered = False
+
+class _NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        with _lock:
+            totals = _spans.setdefault(self.name, [0, 0.0, 0.0])
+            totals[0] += 1; totals[1] += elapsed; totals[2] = max(totals[2], elapsed)
+        _write_trace('span', self.name, elapsed, error=exc_type.__name__ if exc_type else None, **self.tags)
+        return False
+
+def _write_trace(kind, name, seconds, **fields):
+    if _trace is None: return
+    event = {'ts': round(time.time(), 6), 'kind': kind, 'name': name, 'ms': round(seconds * 1000, 3),
+             'thread': threading.current_thread().name, **{key: value for key, value in fields.items() if value is not None}}
+    line = json.dumps(event, default=str)
+    with _lock:
+        if _trace is not None: _trace.write(line + '\n')
+
+def enabled():
+    return _enabled
+
+def enable(report_path=None, trace_path=None):
+    """
+    Starts collecting metrics. The report is written to report_path at interpreter exit (.prom or .txt
+    for Prometheus text format, anything else for JSON); trace_path gets one JSON line per span and call.
+    """
+    global _enabled, _trace, _started_at, _report_path, _atexit_registered
+    with _lock:
+        _report_path = report_path
+        if trace_path and _trace is None:
+            os.makedirs(os.path.dirname(trace_path) or '.', exist_ok=True)
+            _trace = open(trace_path, 'a', buffering=1 << 16)
+        if _started_at is None: _started_at = time.time()
+        _enabled = True
+        if not _atexit_registered:
+            atexit.register(_write_at_exit)
+            _atexit_registered = True
+
+def disable():
+    """Stops collecting and closes the trace log. Collected totals are kept until reset()."""
+    global _enabled, _trace
+    with _lock:
+        _enabled = False
+        if _trace is not None:
+            _trace.close()
+            _trace = None
+
+def reset():
+    global _started_at
+    with _lock:
+        _spans.clear(); _calls.clear(); _sleeps.clear(); _caches.clear()
+        _started_at = time.time() if _enabled else None
+
+def span(name, **tags):
+    """Times a block: `with span('scan_stock.chains', ticker=ticker): ...`. Tags only appear in the trace log."""
+    if not _enabled: return _NULL_SPAN
+    return _Span(name, tags)
+
+def record_call(provider, endpoint, seconds, error=None, throttled=False):
+    """Counts one request to a data provider endpoint, successful or not."""
+    if not _enabled: return
+    with _lock:
+        totals = _calls.setdefault((provider, endpoint), [0, 0, 0, 0.0])
+        totals[0] += 1; totals[1] += error is not None; totals[2] += throttled; totals[3] += seconds
+    _write_trace('call', f"{provider}.{endpoint}", seconds, error=error, throttled=throttled or None)
+
+def record_sleep(provider, seconds):
+    """Counts time a caller spent blocked in time.sleep waiting on a provider's rate limit."""
+    if not _enabled: return
+    with _lock:
+        totals = _sleeps.setdefault(provider, [0, 0.0])
+        totals[0] += 1; totals[1] += seconds
+    _write_trace('sleep', provider, seconds)
+
+def record_cache(cache, hit):
+    """Counts one lookup in a named cache."""
+    if not _enabled: return
+    with _lock:
+        totals = _caches.setdefault(cache, [0, 0])
+        totals[0 if hit else 1] += 1
+
+def report():
+    """Returns every collected metric as a JSON-serializable dict."""
+    with _lock:
+        calls = {}
+        for (provider, endpoint), (count, errors, throttled, seconds) in sorted(_calls.items()):
+            calls.setdefault(provider, {})[endpoint] = {'count': count, 'errors': errors, 'throttled': throttled,
+                                                        'total_ms': seconds * 1000, 'mean_ms': seconds * 1000 / count}
+        return {
+            'started_at': _started_at, 'elapsed_s': time.time() - _started_at if _started_at else 0.0,
+            'spans': {name: {'count': count, 'total_ms': total * 1000, 'mean_ms': total * 1000 / count, 'max_ms': longest * 1000}
+                      for name, (count, total, longest) in sorted(_spans.items())},
+            'calls': calls,
+            'rate_limit_sleep': {provider: {'count': count, 'total_ms': seconds * 1000} for provider, (count, seconds) in sorted(_sleeps.items())},
+            'caches': {name: {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+                       for name, (hits, misses) in sorted(_caches.items())},
+        }
+
+def _labels(labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for value in labels.values())
+    return ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped))
+
+def prometheus_text():
+    """Renders the collected metrics in the Prometheus text exposition format."""
+    data = report()
+    metrics = [
+        ('span_seconds_total', 'counter', 'Wall time spent inside each instrumented span.',
+         [({'span': name}, s['total_ms'] / 1000) for name, s in data['spans'].items()]),
+        ('span_count_total', 'counter', 'Times each instrumented span was entered.',
+         [({'span': name}, s['count']) for name, s in data['spans'].items()]),
+        ('api_calls_total', 'counter', 'Requests sent to each data provider endpoint.',
+         [({'provider': p, 'endpoint': e}, c['count']) for p, endpoints in data['calls'].items() for e, c in endpoints.items()]),
+        ('api_errors_total', 'counter', 'Requests that raised, including throttled ones.',
+         [({'provider': p, 'endpoint': e}, c['errors']) for p, endpoints in data['calls'].items() for e, c in endpoints.items()]),
+        ('api_throttled_total', 'counter', 'Requests answered with a rate-limit error.',
+         [({'provider': p, 'endpoint': e}, c['throttled']) for p, endpoints in data['calls'].items() for e, c in endpoints.items()]),
+        ('api_call_seconds_total', 'counter', 'Wall time spent waiting on each endpoint.',
+         [({'provider': p, 'endpoint': e}, c['total_ms'] / 1000) for p, endpoints in data['calls'].items() for e, c in endpoints.items()]),
+        ('rate_limit_sleep_seconds_total', 'counter', 'Time blocked in time.sleep by each provider\'s rate limiter.',
+         [({'provider': p}, s['total_ms'] / 1000) for p, s in data['rate_limit_sleep'].items()]),
+        ('cache_hits_total', 'counter', 'Lookups answered from each cache.',
+         [({'cache': name}, c['hits']) for name, c in data['caches'].items()]),
+        ('cache_misses_total', 'counter', 'Lookups each cache could not answer.',
+         [({'cache': name}, c['misses']) for name, c in data['caches'].items()]),
+    ]
+    lines = []
+    for name, kind, help_text, samples in metrics:
+        name = f"{config.INSTRUMENTATION_METRIC_PREFIX}{name}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            lines.append(f"{name}{{{_labels(labels)}}} {value:g}")
+    return '\n'.join(lines) + '\n'
+
+def write_report(path):
+    """Writes the report to path, in Prometheus text format for .prom/.txt files and JSON otherwise."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        if path.endswith(('.prom', '.txt')): f.write(prometheus_text())
+        else: json.dump(report(), f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def _write_at_exit():
+    if _report_path and (_spans or _calls or _caches):
+        write_report(_report_path)
+        print(f"Instrumentation report written to {_report_path}")
+    disable()
+
+if config.INSTRUMENTATION_ENABLED:
+    enable(config.INSTRUMENTATION_REPORT_PATH, config.INSTRUMENTATION_TRACE_PATH)
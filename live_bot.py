@@ -1,5 +1,4 @@
 import threading
-import time
 from datetime import datetime, timedelta
 import pytz
 import yfinance as yf
@@ -8,15 +7,19 @@ import config
 
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
-from ibapi.contract import Contract
 from ibapi.order import Order
+from ibapi.execution import ExecutionFilter
 from ibapi.ticktype import TickTypeEnum
 
-from scanner import scan_stock
-from live_earnings_calendar import get_upcoming_earnings
-
-# Global trade schedule
-trade_schedule = []
+from screening import run_funnel
+from live_earnings_calendar import get_upcoming_earnings, get_upcoming_earnings_cache, affected_tickers
+from earnings_store import get_earnings_store
+from trade_scheduler import TradeScheduler
+from trade_state import get_trade_store, ACTIVE_STATUSES
+from market_data import MarketDataManager, REJECTION_CODES
+from contract_resolver import ContractResolver, option_contract, bag_contract
+import instrumentation
+from instrumentation import span
 
 class IBKRBot(EWrapper, EClient):
     # ... (The IBKRBot class remains exactly the same as before) ...
@@ -25,10 +28,22 @@ class IBKRBot(EWrapper, EClient):
         EClient.__init__(self, self)
         self.next_order_id = None
         self.account_value = 0
-        self.market_data = {}
-        self.market_data_events = {}
+        self.market_data = MarketDataManager(self)
+        self.prewarmed_trades = set()
+        self.prewarm_lock = threading.Lock()
+        self.contracts = ContractResolver(self)
         self.next_order_id_event = threading.Event()
         self.account_value_event = threading.Event()
+        self.scheduler = None
+        self.trades = get_trade_store()
+        self.order_id_lock = threading.Lock()
+        # Order history reported by IBKR when reconciling recovered trades.
+        self.open_orders = set()
+        self.completed_orders = {}
+        self.executions = {}
+        self.open_orders_end = threading.Event()
+        self.completed_orders_end = threading.Event()
+        self.executions_end = threading.Event()
 
     def nextValidId(self, orderId: int):
         super().nextValidId(orderId)
@@ -46,75 +61,109 @@ class IBKRBot(EWrapper, EClient):
     def orderStatus(self, orderId: int, status: str, filled: float, remaining: float,
                     avgFillPrice: float, permId: int, parentId: int, lastFillPrice: float,
                     clientId: int, whyHeld: str, mktCapPrice: float):
-        super().orderStatus(self, orderId, status, filled, remaining, avgFillPrice, permId,
+        super().orderStatus(orderId, status, filled, remaining, avgFillPrice, permId,
                           parentId, lastFillPrice, clientId, whyHeld, mktCapPrice)
         print(f"Order Status - ID: {orderId}, Status: {status}, Filled: {filled}, Avg Price: {avgFillPrice}")
-        for trade in trade_schedule:
-            if orderId == trade.get('entry_order_id') and status == 'Filled' and trade['status'] != 'open':
-                print(f"Entry order for {trade['ticker']} filled. Placing stop-loss.")
-                trade['status'] = 'open'
-                trade['position'] = filled
-                self.place_stop_loss_order(trade, avgFillPrice)
-                break
-            elif orderId == trade.get('stop_loss_order_id') and status == 'Filled':
-                print(f"Stop-loss for {trade['ticker']} filled. Position is closed.")
-                trade['status'] = 'closed_by_stop'
-                break
+        trade, role = self.trades.find_by_order_id(orderId)
+        if trade is None or status != 'Filled': return
+        if role == 'entry': self.on_entry_filled(trade, filled, avgFillPrice)
+        elif role == 'stop_loss' and trade['status'] in ('open', 'processing_exit'):
+            print(f"Stop-loss for {trade['ticker']} filled. Position is closed.")
+            self.trades.update(trade, status='closed_by_stop')
+
+    def on_entry_filled(self, trade, filled, avg_fill_price):
+        """Opens a trade whose entry filled, protects it with a stop-loss and queues its exit. A no-op unless it is processing_entry."""
+        if not self.trades.update_if(trade, 'processing_entry', status='open', position=filled): return
+        if avg_fill_price is None:
+            print(f"WARNING: No fill price for {trade['ticker']}'s entry; no stop-loss placed, the timed exit still applies.")
+        else:
+            print(f"Entry order for {trade['ticker']} filled. Placing stop-loss.")
+            self.place_stop_loss_order(trade, avg_fill_price)
+        if self.scheduler: self.scheduler.schedule(trade)
+
+    def openOrder(self, orderId, contract, order, orderState):
+        super().openOrder(orderId, contract, order, orderState)
+        self.open_orders.add(orderId)
+
+    def openOrderEnd(self):
+        super().openOrderEnd()
+        self.open_orders_end.set()
+
+    def completedOrder(self, contract, order, orderState):
+        super().completedOrder(contract, order, orderState)
+        self.completed_orders[order.orderId] = (orderState.status, float(order.filledQuantity))
+
+    def completedOrdersEnd(self):
+        super().completedOrdersEnd()
+        self.completed_orders_end.set()
+
+    def execDetails(self, reqId, contract, execution):
+        super().execDetails(reqId, contract, execution)
+        # Combo fills are reported per leg as well; only the BAG execution carries the spread's net price.
+        if contract.secType != 'BAG': return
+        shares, notional = self.executions.get(execution.orderId, (0.0, 0.0))
+        self.executions[execution.orderId] = (shares + float(execution.shares), notional + float(execution.shares) * execution.price)
+
+    def execDetailsEnd(self, reqId):
+        super().execDetailsEnd(reqId)
+        self.executions_end.set()
 
     def error(self, reqId, errorCode, errorString):
         if errorCode < 2100 or errorCode > 2170:
              print(f"Error - Code: {errorCode}, Message: {errorString}")
+        if errorCode in REJECTION_CODES and self.market_data.owns(reqId): self.market_data.on_error(reqId)
+        if self.contracts.owns(reqId): self.contracts.on_end(reqId, error_code=errorCode)
+
+    def contractDetails(self, reqId, contractDetails):
+        super().contractDetails(reqId, contractDetails)
+        self.contracts.on_row(reqId, contractDetails)
+
+    def contractDetailsEnd(self, reqId):
+        super().contractDetailsEnd(reqId)
+        self.contracts.on_end(reqId)
+
+    def securityDefinitionOptionParameter(self, reqId, exchange, underlyingConId, tradingClass, multiplier, expirations, strikes):
+        super().securityDefinitionOptionParameter(reqId, exchange, underlyingConId, tradingClass, multiplier, expirations, strikes)
+        self.contracts.on_row(reqId, {'exchange': exchange, 'trading_class': tradingClass,
+                                      'expirations': list(expirations), 'strikes': list(strikes)})
+
+    def securityDefinitionOptionParameterEnd(self, reqId):
+        super().securityDefinitionOptionParameterEnd(reqId)
+        self.contracts.on_end(reqId)
             
     def tickPrice(self, reqId, tickType, price, attrib):
-        super().tickPrice(self, reqId, tickType, price, attrib)
-        if tickType in [1, 2]:
-            if reqId not in self.market_data: self.market_data[reqId] = {}
-            if tickType == 1: self.market_data[reqId]['bid'] = price
-            elif tickType == 2: self.market_data[reqId]['ask'] = price
-            if 'bid' in self.market_data[reqId] and 'ask' in self.market_data[reqId]:
-                if reqId in self.market_data_events: self.market_data_events[reqId].set()
+        super().tickPrice(reqId, tickType, price, attrib)
+        self.market_data.on_tick(reqId, tickType, price)
 
     def get_next_order_id(self):
-        if self.next_order_id is not None:
-            current_id = self.next_order_id
-            self.next_order_id += 1
-            return current_id
-        else:
-            raise ConnectionError("Could not get a valid order ID from IBKR.")
-
-    def create_option_contract(self, symbol, expiry, strike, right):
-        contract = Contract(); contract.symbol = symbol; contract.secType = "OPT";
-        contract.exchange = "SMART"; contract.currency = "USD";
-        contract.lastTradeDateOrContractMonth = expiry; contract.strike = strike;
-        contract.right = right; contract.multiplier = "100"
-        return contract
+        # Entries due at the same time run on separate threads, so ids are handed out under a lock.
+        with self.order_id_lock:
+            if self.next_order_id is not None:
+                current_id = self.next_order_id
+                self.next_order_id += 1
+                return current_id
+            else:
+                raise ConnectionError("Could not get a valid order ID from IBKR.")
 
     def request_spread_price(self, short_leg_contract, long_leg_contract):
-        short_req_id = self.get_next_order_id(); long_req_id = self.get_next_order_id()
-        self.market_data_events[short_req_id] = threading.Event()
-        self.market_data_events[long_req_id] = threading.Event()
-        self.reqMktData(short_req_id, short_leg_contract, "", False, False, [])
-        self.reqMktData(long_req_id, long_leg_contract, "", False, False, [])
-        short_received = self.market_data_events[short_req_id].wait(timeout=10)
-        long_received = self.market_data_events[long_req_id].wait(timeout=10)
-        self.cancelMktData(short_req_id); self.cancelMktData(long_req_id)
-        natural_price = None
-        if short_received and long_received:
-            short_mid = (self.market_data[short_req_id]['bid'] + self.market_data[short_req_id]['ask']) / 2
-            long_mid = (self.market_data[long_req_id]['bid'] + self.market_data[long_req_id]['ask']) / 2
-            natural_price = round(long_mid - short_mid, 2)
-            print(f"Calculated natural price for spread: ${natural_price:.2f}")
+        """Prices the spread from the streaming quote cache, subscribing and waiting only if the legs were not prewarmed."""
+        legs = [leg for leg in (short_leg_contract, long_leg_contract) if self.market_data.subscribe(leg)]
+        try:
+            natural_price = self.market_data.spread_price(short_leg_contract, long_leg_contract)
+            instrumentation.record_cache('live_quotes', natural_price is not None)
+            if natural_price is None and self.market_data.wait_for_quotes(legs, config.MARKET_DATA_WAIT_SECONDS):
+                natural_price = self.market_data.spread_price(short_leg_contract, long_leg_contract)
+        finally:
+            for leg in legs: self.market_data.release(leg)
+        if natural_price is not None: print(f"Calculated natural price for spread: ${natural_price:.2f}")
         else: print("Failed to receive market data for one or both legs within timeout.")
-        del self.market_data_events[short_req_id]; del self.market_data_events[long_req_id]
-        if short_req_id in self.market_data: del self.market_data[short_req_id]
-        if long_req_id in self.market_data: del self.market_data[long_req_id]
         return natural_price
 
-    def place_order(self, contract, direction, quantity, order_type="MKT", limit_price=0, transmit=True):
+    def place_order(self, contract, direction, quantity, order_type="MKT", limit_price=0, transmit=True, order_id=None):
         order = Order(); order.action = direction; order.orderType = order_type
         order.totalQuantity = quantity; order.transmit = transmit
         if order_type == "LMT": order.lmtPrice = limit_price
-        order_id = self.get_next_order_id()
+        if order_id is None: order_id = self.get_next_order_id()
         self.placeOrder(order_id, contract, order)
         print(f"Placed {direction} {order_type} order for {quantity} {contract.symbol} contracts. Order ID: {order_id}")
         return order_id
@@ -125,17 +174,98 @@ class IBKRBot(EWrapper, EClient):
         order.totalQuantity = trade['position']; order.auxPrice = stop_price
         order.transmit = True
         stop_loss_id = self.get_next_order_id()
-        trade['stop_loss_order_id'] = stop_loss_id
+        self.trades.update(trade, stop_loss_order_id=stop_loss_id)
         self.placeOrder(stop_loss_id, trade['contract'], order)
         print(f"Placed stop-loss order for {trade['ticker']} at STP ${stop_price:.2f}. Order ID: {stop_loss_id}")
 
-def create_bag_contract(ticker):
-    contract = Contract(); contract.symbol = ticker; contract.secType = "BAG"
-    contract.currency = "USD"; contract.exchange = "SMART"
-    leg1 = {"conId": 0, "ratio": 1, "action": "SELL", "exchange": "SMART"}
-    leg2 = {"conId": 0, "ratio": 1, "action": "BUY", "exchange": "SMART"}
-    contract.comboLegs = [leg1, leg2]
-    return contract
+def load_order_history(bot, timeout=config.ORDER_RECONCILE_TIMEOUT_SECONDS):
+    """Requests the orders still working, the completed orders and today's executions from IBKR. Returns False on a timeout."""
+    ends = (bot.open_orders_end, bot.completed_orders_end, bot.executions_end)
+    for end in ends: end.clear()
+    bot.reqOpenOrders()
+    bot.reqCompletedOrders(True)
+    bot.reqExecutions(config.EXECUTIONS_REQ_ID, ExecutionFilter())
+    return all(end.wait(timeout) for end in ends)
+
+def order_outcome(bot, order_id):
+    """
+    Returns (outcome, filled, avg_price) for an order from the history fetched by load_order_history().
+
+    outcome is 'filled', 'working' (still open, so orderStatus will report its fill), 'cancelled', or 'unknown'
+    when IBKR has no record of it. avg_price is None when no BAG execution was reported.
+    """
+    shares, notional = bot.executions.get(order_id, (0.0, 0.0))
+    status, completed_filled = bot.completed_orders.get(order_id, (None, 0.0))
+    avg_price = notional / shares if shares else None
+    if status == 'Filled': return 'filled', shares or completed_filled, avg_price
+    if order_id in bot.open_orders: return 'working', 0.0, None
+    if shares: return 'filled', shares, avg_price
+    if status in ('Cancelled', 'ApiCancelled', 'Inactive'): return 'cancelled', 0.0, None
+    return 'unknown', 0.0, None
+
+def reconcile_trade(bot, trade, history_complete, now):
+    """
+    Resolves a recovered trade against IBKR's order history, applying fills and cancellations that happened while offline.
+
+    A pending entry whose time passed while the bot was down is skipped, as populate_trade_schedule skips new ones.
+    An entry that never reached IBKR is retried if its time has not come and skipped otherwise; an exit that never
+    reached it (or was cancelled) returns the trade to 'open' so it is re-queued. Without a complete history only
+    positive evidence is acted on, and orders IBKR has no record of are left for a manual check.
+    """
+    status, ticker = trade['status'], trade['ticker']
+    if status == 'pending_entry':
+        if trade['entry_time'] <= now and bot.trades.update_if(trade, 'pending_entry', status='skipped'):
+            print(f"Skipping {ticker}: Entry time {trade['entry_time'].strftime('%Y-%m-%d %H:%M')} passed while the bot was down.")
+        return
+    if status in ('open', 'processing_exit') and trade.get('stop_loss_order_id') is not None:
+        if order_outcome(bot, trade['stop_loss_order_id'])[0] == 'filled':
+            print(f"Stop-loss for {ticker} filled while offline. Position is closed.")
+            bot.trades.update_if(trade, status, status='closed_by_stop')
+            return
+
+    if status == 'processing_entry':
+        order_id = trade.get('entry_order_id')
+        outcome, filled, avg_price = order_outcome(bot, order_id) if order_id is not None else ('never_placed', 0.0, None)
+        if outcome == 'filled':
+            print(f"Entry order for {ticker} filled while offline.")
+            if avg_price is None: avg_price = bot.request_spread_price(*get_entry_legs(trade)) if prepare_trade_contracts(bot, trade) else None
+            bot.on_entry_filled(trade, filled, avg_price)
+        elif outcome == 'cancelled' or outcome == 'never_placed' or (outcome == 'unknown' and history_complete):
+            retry = trade['entry_time'] > now
+            bot.trades.update_if(trade, 'processing_entry', status='pending_entry' if retry else 'skipped')
+            print(f"Entry for {ticker} did not go through ({outcome}); {'retrying at its entry time' if retry else 'skipped'}.")
+        elif outcome == 'unknown':
+            print(f"WARNING: IBKR reported no status for {ticker}'s entry order {order_id}; check the account manually.")
+
+    elif status == 'processing_exit':
+        order_id = trade.get('exit_order_id')
+        outcome = order_outcome(bot, order_id)[0] if order_id is not None else 'never_placed'
+        if outcome in ('filled', 'working'):
+            bot.trades.update_if(trade, 'processing_exit', status='closed_by_time')
+            print(f"Exit order for {ticker} was sent before the restart ({outcome}). Position is closed.")
+        elif outcome == 'cancelled' or outcome == 'never_placed' or (outcome == 'unknown' and history_complete):
+            bot.trades.update_if(trade, 'processing_exit', status='open')
+            print(f"Exit for {ticker} did not go through ({outcome}); exiting again.")
+        else:
+            print(f"WARNING: IBKR reported no status for {ticker}'s exit order {order_id}; check the account manually.")
+
+def recover_trade_schedule(bot):
+    """Restores active trades from the journal, reconciles them with IBKR and re-queues them. Returns the number recovered."""
+    recovered = bot.trades.recover()
+    if not recovered: return 0
+    print(f"Recovered {len(recovered)} active trades from the journal; skipping the earnings scan.")
+    for trade in recovered:
+        prepare_trade_contracts(bot, trade)
+        print(f"  - {trade['ticker']}: {trade['status']} (entry order {trade.get('entry_order_id')}, stop {trade.get('stop_loss_order_id')})")
+    # Fills and cancellations of orders that finished while the bot was down never reach orderStatus,
+    # so they are looked up in the completed orders and executions instead.
+    history_complete = load_order_history(bot)
+    if not history_complete: print("Timed out waiting for IBKR's order history; only confirmed fills and cancellations are applied.")
+    now = datetime.now(config.MARKET_TIMEZONE)
+    for trade in recovered:
+        reconcile_trade(bot, trade, history_complete, now)
+        if bot.scheduler: bot.scheduler.schedule(trade)
+    return len(recovered)
 
 def populate_trade_schedule(bot):
     print("Populating trade schedule for the week...")
@@ -143,49 +273,252 @@ def populate_trade_schedule(bot):
     if not events:
         print("No upcoming earnings found from Polygon.io.")
         return
+    refresh_earnings_history(events)
+    scan_and_schedule(bot, events)
+
+def refresh_earnings_history(events):
+    """
+    Fetches past earnings dates for the tickers of the given events whose stored dates are stale.
 
+    The scanner's earnings-move check reads only the local store, so this runs at startup and from the
+    calendar refresh loop instead of before each scan.
+    """
+    try:
+        get_earnings_store().refresh({event['ticker'] for event in events})
+    except Exception as e:
+        print(f"Earnings history refresh failed: {e}. The earnings-move check uses the stored dates.")
+
+def scan_and_schedule(bot, events):
+    """Scans the tickers of the given earnings events and schedules a trade for each recommended event."""
+    events_by_ticker = {}
     for event in events:
-        ticker = event['ticker']
-        print(f"\n--- Scanning {ticker} for schedule ---")
-        scan_result = scan_stock(ticker)
+        # Keyed the way run_funnel and scan_stock normalise tickers, so results map back to their events.
+        events_by_ticker.setdefault(event['ticker'].strip().upper(), []).append(event)
+
+    print(f"\n--- Scanning {len(events_by_ticker)} tickers for schedule ---")
+    scan_results, _ = run_funnel(list(events_by_ticker))
+    for scan_result in scan_results:
+        ticker = scan_result['ticker']
         if scan_result.get('error') or scan_result['recommendation'] != 'Recommended':
-            print(f"Skipping {ticker}: {scan_result.get('error', 'Not Recommended')}")
+            print(f"Skipping {ticker}: {scan_result.get('error') or 'Not Recommended'}")
             continue
-        try:
-            # The earnings date and time now come directly from our calendar function
-            earnings_day = event['report_date']
-            # Timing: 'amc' (After Market Close), 'bmo' (Before Market Open), 'dmh' (During Market Hours)
-            is_amc = event['timing'] == 'amc'
-
-            price_reaction_day = earnings_day + timedelta(days=1) if is_amc else earnings_day
-            entry_day = earnings_day - timedelta(days=1)
-            exit_day = price_reaction_day
-            
-            if entry_day.weekday() >= 5: entry_day -= timedelta(days=entry_day.weekday() - 4)
-            if exit_day.weekday() >= 5: exit_day += timedelta(days=7 - exit_day.weekday())
+        for event in events_by_ticker[ticker]:
+            trade = schedule_trade(event, scan_result)
+            if not trade: continue
+            if not prepare_trade_contracts(bot, trade):
+                print(f"Could not resolve option contracts for {ticker} yet; will retry before entry.")
+            if bot.scheduler: bot.scheduler.schedule(trade)
+
+def trade_times(event):
+    """Returns the (entry_time, exit_time) of the calendar spread traded around an earnings event."""
+    # The earnings date and time now come directly from our calendar function
+    earnings_day = event['report_date']
+    # Timing: 'amc' (After Market Close), 'bmo' (Before Market Open), 'dmh' (During Market Hours)
+    is_amc = event['timing'] == 'amc'
+
+    price_reaction_day = earnings_day + timedelta(days=1) if is_amc else earnings_day
+    entry_day = earnings_day - timedelta(days=1)
+    exit_day = price_reaction_day
+    
+    if entry_day.weekday() >= 5: entry_day -= timedelta(days=entry_day.weekday() - 4)
+    if exit_day.weekday() >= 5: exit_day += timedelta(days=7 - exit_day.weekday())
+
+    entry_time = config.MARKET_TIMEZONE.localize(datetime.combine(entry_day, datetime.min.time()) + timedelta(hours=15, minutes=45))
+    exit_time = config.MARKET_TIMEZONE.localize(datetime.combine(exit_day, datetime.min.time()) + timedelta(hours=9, minutes=45))
+    return entry_time, exit_time
 
-            entry_time = config.MARKET_TIMEZONE.localize(datetime.combine(entry_day, datetime.min.time()) + timedelta(hours=15, minutes=45))
-            exit_time = config.MARKET_TIMEZONE.localize(datetime.combine(exit_day, datetime.min.time()) + timedelta(hours=9, minutes=45))
+def schedule_trade(event, scan_result):
+    """Adds a pending trade for a recommended earnings event to the schedule and returns it (None if skipped)."""
+    ticker = event['ticker']
+    try:
+        entry_time, exit_time = trade_times(event)
+        if entry_time < datetime.now(config.MARKET_TIMEZONE):
+            print(f"Skipping {ticker}: Entry time {entry_time.strftime('%Y-%m-%d %H:%M')} is in the past.")
+            return
             
-            if entry_time < datetime.now(config.MARKET_TIMEZONE):
-                print(f"Skipping {ticker}: Entry time {entry_time.strftime('%Y-%m-%d %H:%M')} is in the past.")
-                continue
-                
-            trade = {
-                'ticker': ticker, 'status': 'pending_entry', 'entry_time': entry_time,
-                'exit_time': exit_time, 'position': 0, 'entry_order_id': None,
-                'stop_loss_order_id': None, 'contract': create_bag_contract(ticker),
-                'underlying_price': scan_result['details']['underlying_price']
-            }
-            trade_schedule.append(trade)
-            print(f"Scheduled trade for {ticker}: Entry at {entry_time.strftime('%Y-%m-%d %H:%M')}, Exit at {exit_time.strftime('%Y-%m-%d %H:%M')}")
-        except Exception as e:
-            print(f"Could not schedule trade for {ticker}: {e}")
+        trade = {
+            'ticker': ticker, 'status': 'pending_entry', 'entry_time': entry_time,
+            'exit_time': exit_time, 'position': 0, 'entry_order_id': None,
+            'stop_loss_order_id': None, 'contract': None,
+            'underlying_price': scan_result['details']['underlying_price']
+        }
+        trade = get_trade_store().add(trade)
+        print(f"Scheduled trade for {ticker}: Entry at {entry_time.strftime('%Y-%m-%d %H:%M')}, Exit at {exit_time.strftime('%Y-%m-%d %H:%M')}")
+        return trade
+    except Exception as e:
+        print(f"Could not schedule trade for {ticker}: {e}")
+
+def cancel_trade(bot, trade, reason):
+    """
+    Drops a trade that has not been entered yet; its queued prewarm and entry are skipped once it is no longer pending.
+
+    Returns False, leaving the trade alone, if its entry has already started.
+    """
+    if not bot.trades.update_if(trade, 'pending_entry', status='cancelled'): return False
+    release_trade_legs(bot, trade)
+    print(f"Cancelled trade for {trade['ticker']} (entry {trade['entry_time'].strftime('%Y-%m-%d %H:%M')}): {reason}")
+    return True
+
+def apply_earnings_changes(bot, diff):
+    """
+    Brings the schedule in line with a calendar diff from UpcomingEarningsCache.refresh(), touching only the affected tickers.
+
+    Pending trades of every affected ticker are cancelled. Tickers with new or moved reports are then
+    re-scanned and rescheduled, except those with a position on or an entry in flight, which only take the new exit time.
+    """
+    tickers = affected_tickers(diff)
+    if not tickers: return
+    new_events = {}
+    for event in diff['added'] + [event for _, events in diff['changed'] for event in events]:
+        new_events.setdefault(event['ticker'], []).append(event)
+    print(f"\n--- Earnings calendar changed for {len(tickers)} tickers: {', '.join(tickers)} ---")
+
+    rescan = []
+    for ticker in tickers:
+        trades = [trade for trade in bot.trades.trades_for_ticker(ticker) if trade['status'] in ACTIVE_STATUSES]
+        reason = 'earnings date or timing changed' if ticker in new_events else 'report dropped from the earnings calendar'
+        in_position = [trade for trade in trades if not cancel_trade(bot, trade, reason)]
+        if ticker not in new_events: continue
+        if not in_position:
+            rescan.extend(new_events[ticker]); continue
+        exit_time = trade_times(new_events[ticker][0])[1]
+        for trade in in_position:
+            # An entry still being filled takes the new exit time too, so its fill schedules the right exit.
+            if trade['status'] not in ('processing_entry', 'open') or trade['exit_time'] == exit_time: continue
+            bot.trades.update(trade, exit_time=exit_time)
+            print(f"Moved exit for {ticker} to {exit_time.strftime('%Y-%m-%d %H:%M')}.")
+            if bot.scheduler: bot.scheduler.schedule(trade)
+    if rescan: scan_and_schedule(bot, rescan)
+
+def start_earnings_refresh(bot, stop_event, interval_seconds=config.UPCOMING_EARNINGS_REFRESH_MINUTES * 60):
+    """
+    Starts a daemon thread that refreshes the upcoming earnings calendar every interval and applies what changed.
+
+    The earnings history of the calendar's tickers is refreshed after each pass, once its stored dates go stale.
+    """
+    def refresh_loop():
+        while not stop_event.wait(interval_seconds):
+            try:
+                get_upcoming_earnings_cache().refresh(apply=lambda diff: apply_earnings_changes(bot, diff))
+            except Exception as e:
+                print(f"Earnings calendar refresh failed: {e}")
+            refresh_earnings_history(get_upcoming_earnings_cache().events(start_date=datetime.now().date()))
+
+    thread = threading.Thread(target=refresh_loop, name='earnings-refresh', daemon=True)
+    thread.start()
+    return thread
+
+def prepare_trade_contracts(bot, trade):
+    """
+    Resolves a trade's legs to listed contracts and builds its BAG contract. Returns False if unresolved.
+
+    The snapped strike, expiries and conIds are journaled with the trade, so recovered trades rebuild
+    their contracts without another round trip.
+    """
+    if trade.get('contract') is not None: return True
+    if not trade.get('short_con_id'):
+        legs = bot.contracts.resolve_calendar(trade['ticker'], trade['entry_time'].date(), trade['underlying_price'])
+        if legs is None: return False
+        bot.trades.update(trade, **legs)
+    short_leg, long_leg = get_entry_legs(trade)
+    trade['contract'] = bag_contract(trade['ticker'], short_leg, long_leg)
+    return True
+
+def get_entry_legs(trade):
+    """Returns the (short, long) option contracts of a trade whose legs have been resolved."""
+    short_leg = option_contract(trade['ticker'], trade['short_expiry'], trade['strike'], config.OPTION_TYPE, trade['short_con_id'])
+    long_leg = option_contract(trade['ticker'], trade['long_expiry'], trade['strike'], config.OPTION_TYPE, trade['long_con_id'])
+    return short_leg, long_leg
+
+def prewarm_trade(bot, trade):
+    """Starts streaming quotes for a trade's legs shortly before its entry so pricing at entry is instant."""
+    if not prepare_trade_contracts(bot, trade): return
+    short_leg, long_leg = get_entry_legs(trade)
+    with bot.prewarm_lock:
+        # Entries and cancellations change the status before releasing, so either this sees it or their release waits.
+        if trade['status'] != 'pending_entry' or trade['trade_id'] in bot.prewarmed_trades: return
+        if bot.market_data.subscribe(short_leg):
+            if bot.market_data.subscribe(long_leg):
+                bot.prewarmed_trades.add(trade['trade_id'])
+                print(f"Streaming quotes for {trade['ticker']} legs ahead of entry.")
+            else:
+                bot.market_data.release(short_leg)
+
+def release_trade_legs(bot, trade):
+    with bot.prewarm_lock:
+        if trade['trade_id'] not in bot.prewarmed_trades: return
+        bot.prewarmed_trades.discard(trade['trade_id'])
+        for leg in get_entry_legs(trade): bot.market_data.release(leg)
+
+def enter_trade(bot, trade):
+    """Prices the spread and places the sized entry order for a trade whose entry time has come."""
+    with span('live_entry', ticker=trade['ticker']):
+        _enter_trade(bot, trade)
+
+def _enter_trade(bot, trade):
+    if not bot.trades.update_if(trade, 'pending_entry', status='processing_entry'):
+        print(f"Trade for {trade['ticker']} is no longer pending ({trade['status']}). Skipping entry.")
+        return
+    print(f"\n>>> Time to enter trade for {trade['ticker']} <<<")
+    with span('live_entry.contracts', ticker=trade['ticker']):
+        resolved = prepare_trade_contracts(bot, trade)
+    if not resolved:
+        print(f"Could not resolve option contracts for {trade['ticker']}. Skipping entry."); bot.trades.update(trade, status='skipped')
+        return
+    short_leg, long_leg = get_entry_legs(trade)
+    try:
+        with span('live_entry.quote', ticker=trade['ticker']):
+            natural_price = bot.request_spread_price(short_leg, long_leg)
+    finally:
+        release_trade_legs(bot, trade)
+    if natural_price and natural_price > 0:
+        risk_amount = bot.account_value * config.RISK_ALLOCATION_PERCENT
+        cost_per_spread = natural_price * 100
+        num_contracts = int(risk_amount // cost_per_spread) if cost_per_spread > 0 else 0
+        if num_contracts > 0:
+            print(f"  - Sizing: Allocating ${risk_amount:,.2f} -> Trading {num_contracts} contracts.")
+            with span('live_entry.order', ticker=trade['ticker']):
+                # Index the order id before placing the order so a fast fill callback can find the trade.
+                entry_order_id = bot.get_next_order_id()
+                bot.trades.update(trade, entry_order_id=entry_order_id)
+                bot.place_order(trade['contract'], "BUY", num_contracts, config.ORDER_TYPE, natural_price, order_id=entry_order_id)
+        else:
+            print(f"Not enough capital for {trade['ticker']}. Skipping entry."); bot.trades.update(trade, status='skipped')
+    else:
+        print(f"Could not get price for {trade['ticker']}. Skipping entry."); bot.trades.update(trade, status='skipped')
+
+def exit_trade(bot, trade):
+    """Cancels the stop-loss and closes an open position at market once its exit time has come."""
+    # A stop-loss fill can land between the scheduler's status check and here; it already closed the position.
+    if not bot.trades.update_if(trade, 'open', status='processing_exit'):
+        print(f"Trade for {trade['ticker']} is no longer open ({trade['status']}). Skipping exit.")
+        return
+    print(f"\n>>> Time to exit trade for {trade['ticker']} <<<")
+    # A recovered entry without a fill price has no stop-loss to cancel.
+    if trade.get('stop_loss_order_id') is not None:
+        print(f"Cancelling existing stop-loss order {trade['stop_loss_order_id']} for {trade['ticker']}.")
+        bot.cancelOrder(trade['stop_loss_order_id'])
+    # Journal the order id before placing the order so recovery can tell whether the close was sent.
+    exit_order_id = bot.get_next_order_id()
+    bot.trades.update(trade, exit_order_id=exit_order_id)
+    bot.place_order(trade['contract'], "SELL", trade['position'], "MKT", order_id=exit_order_id)
+    bot.trades.update(trade, status='closed_by_time')
+
+def create_scheduler(bot):
+    """Builds the trade scheduler that drives a bot's prewarms, entries and exits, and attaches it to the bot."""
+    bot.scheduler = TradeScheduler({
+        'prewarm': lambda trade: prewarm_trade(bot, trade),
+        'entry': lambda trade: enter_trade(bot, trade),
+        'exit': lambda trade: exit_trade(bot, trade),
+    })
+    return bot.scheduler
 
 def main():
     # ... (The main function remains exactly the same as before) ...
     print("--- Starting Earnings Calendar Spread Bot ---")
     bot = IBKRBot()
+    scheduler = create_scheduler(bot)
+    stop_refresh = threading.Event()
     try:
         print(f"Connecting to IBKR on {config.IBKR_HOST}:{config.IBKR_PORT}...")
         bot.connect(config.IBKR_HOST, config.IBKR_PORT, clientId=config.IBKR_CLIENT_ID)
@@ -194,44 +527,24 @@ def main():
         if not bot.next_order_id_event.wait(timeout=10): raise ConnectionError("Failed to get next order ID from IBKR.")
         bot.reqAccountSummary(9001, "All", "NetLiquidation")
         if not bot.account_value_event.wait(timeout=10): raise ConnectionError("Failed to get account value from IBKR.")
-        populate_trade_schedule(bot)
-        print("\n--- Starting Persistent Trading Loop (Checks every 30s) ---")
-        while True:
-            current_time = datetime.now(config.MARKET_TIMEZONE)
-            for trade in trade_schedule:
-                if trade['status'] == 'pending_entry' and current_time >= trade['entry_time']:
-                    print(f"\n>>> Time to enter trade for {trade['ticker']} <<<")
-                    trade['status'] = 'processing_entry'
-                    atm_strike = round(trade['underlying_price'])
-                    short_expiry = (datetime.now() + timedelta(days=20)).strftime('%Y%m%d')
-                    long_expiry = (datetime.now() + timedelta(days=20 + config.EXPIRY_GAP_DAYS)).strftime('%Y%m%d')
-                    short_leg = bot.create_option_contract(trade['ticker'], short_expiry, atm_strike, config.OPTION_TYPE)
-                    long_leg = bot.create_option_contract(trade['ticker'], long_expiry, atm_strike, config.OPTION_TYPE)
-                    natural_price = bot.request_spread_price(short_leg, long_leg)
-                    if natural_price and natural_price > 0:
-                        risk_amount = bot.account_value * config.RISK_ALLOCATION_PERCENT
-                        cost_per_spread = natural_price * 100
-                        num_contracts = int(risk_amount // cost_per_spread) if cost_per_spread > 0 else 0
-                        if num_contracts > 0:
-                            print(f"  - Sizing: Allocating ${risk_amount:,.2f} -> Trading {num_contracts} contracts.")
-                            entry_order_id = bot.place_order(trade['contract'], "BUY", num_contracts, config.ORDER_TYPE, natural_price)
-                            trade['entry_order_id'] = entry_order_id
-                        else:
-                            print(f"Not enough capital for {trade['ticker']}. Skipping entry."); trade['status'] = 'skipped'
-                    else:
-                        print(f"Could not get price for {trade['ticker']}. Skipping entry."); trade['status'] = 'skipped'
-                if trade['status'] == 'open' and current_time >= trade['exit_time']:
-                    print(f"\n>>> Time to exit trade for {trade['ticker']} <<<")
-                    trade['status'] = 'processing_exit'
-                    print(f"Cancelling existing stop-loss order {trade['stop_loss_order_id']} for {trade['ticker']}.")
-                    bot.cancelOrder(trade['stop_loss_order_id'])
-                    bot.place_order(trade['contract'], "SELL", trade['position'], "MKT")
-                    trade['status'] = 'closed_by_time'
-            time.sleep(30)
+        recovered = recover_trade_schedule(bot)
+        if not recovered: populate_trade_schedule(bot)
+        else:
+            refresh_earnings_history(get_upcoming_earnings_cache().events(start_date=datetime.now().date()))
+            # Pick up calendar changes made while the bot was down (relative to the snapshot it last saw).
+            try:
+                get_upcoming_earnings_cache().refresh(apply=lambda diff: apply_earnings_changes(bot, diff))
+            except Exception as e:
+                print(f"Earnings calendar refresh failed: {e}. The changes will be applied by the next refresh.")
+        start_earnings_refresh(bot, stop_refresh)
+        print("\n--- Starting Event-Driven Trading Scheduler ---")
+        scheduler.run()
     except KeyboardInterrupt: print("Bot shutdown requested by user.")
     except Exception as e:
         print(f"An critical error occurred: {e}")
     finally:
+        stop_refresh.set()
+        scheduler.stop()
         print("Disconnecting from IBKR...")
         bot.disconnect()
         print("Bot has shut down.")
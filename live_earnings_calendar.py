@@ -1,6 +1,124 @@
+import os
+import sqlite3
+import threading
 from datetime import datetime, timedelta
 import config
 from polygon import RESTClient
+from rate_limiter import get_limiter
+
+polygon_limiter = get_limiter('polygon')
+
+def _event_key(event):
+    return event['report_date'], event['timing']
+
+def diff_events(old_events, new_events):
+    """
+    Compares two calendar snapshots ticker by ticker.
+
+    Returns:
+        dict: 'added' and 'removed' list the events of tickers that only appear in one snapshot;
+        'changed' lists (old_events, new_events) for tickers whose report dates or timings differ.
+    """
+    old_by_ticker, new_by_ticker = {}, {}
+    for event in old_events: old_by_ticker.setdefault(event['ticker'], []).append(event)
+    for event in new_events: new_by_ticker.setdefault(event['ticker'], []).append(event)
+    diff = {'added': [], 'removed': [], 'changed': []}
+    for ticker, events in new_by_ticker.items():
+        if ticker not in old_by_ticker: diff['added'].extend(events)
+        elif sorted(map(_event_key, events)) != sorted(map(_event_key, old_by_ticker[ticker])):
+            diff['changed'].append((old_by_ticker[ticker], events))
+    for ticker, events in old_by_ticker.items():
+        if ticker not in new_by_ticker: diff['removed'].extend(events)
+    return diff
+
+def affected_tickers(diff):
+    """Returns the sorted tickers touched by a diff from diff_events()."""
+    tickers = {event['ticker'] for event in diff['added'] + diff['removed']}
+    tickers.update(new[0]['ticker'] for _, new in diff['changed'])
+    return sorted(tickers)
+
+class UpcomingEarningsCache:
+    """
+    Local SQLite copy of the upcoming earnings calendar that refreshes in place.
+
+    refresh() downloads the calendar window once and replaces the stored snapshot, returning what
+    changed since the previous one (which may be from an earlier run of the bot). A failed download,
+    including an empty or implausibly shrunken response, leaves the stored snapshot untouched, as does
+    an apply callback that raises, so the same changes are reported again by the next refresh. Events
+    that have already been reported are never reported as removed; they simply age out of the window.
+    """
+    def __init__(self, db_path, client=None):
+        self.client = client
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS upcoming (ticker TEXT, report_date TEXT, timing TEXT, PRIMARY KEY (ticker, report_date))")
+        self.db.commit()
+
+    def _client(self):
+        if self.client is None: self.client = RESTClient(config.POLYGON_API_KEY)
+        return self.client
+
+    def events(self, start_date=None, end_date=None):
+        """Returns the stored events (dicts with ticker, report_date and timing) with start_date <= report_date <= end_date."""
+        start = (start_date or datetime.min.date()).strftime('%Y-%m-%d')
+        end = (end_date or datetime.max.date()).strftime('%Y-%m-%d')
+        with self.lock:
+            rows = self.db.execute("SELECT ticker, report_date, timing FROM upcoming WHERE report_date BETWEEN ? AND ? ORDER BY report_date, ticker",
+                                   (start, end)).fetchall()
+        return [{"ticker": ticker, "report_date": datetime.strptime(report_date, "%Y-%m-%d").date(), "timing": timing}
+                for ticker, report_date, timing in rows]
+
+    def _fetch(self, start_date, end_date):
+        client = self._client()
+        resp = polygon_limiter.call(lambda: list(client.get_earnings_calendar(from_=start_date, to=end_date)), endpoint='get_earnings_calendar')
+        # The time (bmo, amc, etc.) is included in the response
+        return [{"ticker": event.ticker, "report_date": datetime.strptime(event.report_date, "%Y-%m-%d").date(), "timing": event.time}
+                for event in resp]
+
+    def refresh(self, days_ahead=7, apply=None):
+        """
+        Downloads the next days_ahead days of the calendar and stores it.
+
+        Args:
+            apply (callable): Called with the diff before the new snapshot is stored; if it raises, the old one is kept.
+
+        Returns:
+            dict: The diff_events() diff, or None if the download failed.
+        """
+        today = datetime.now().date()
+        end_date = today + timedelta(days=days_ahead)
+        try:
+            events = self._fetch(today, end_date)
+        except Exception as e:
+            print(f"ERROR: Could not fetch upcoming earnings from Polygon.io: {e}")
+            return None
+        stored = self.events(today, end_date)
+        if stored and len(events) < len(stored) * config.UPCOMING_EARNINGS_MIN_RETAINED:
+            # An empty or truncated page would otherwise read as every report being dropped.
+            print(f"ERROR: Polygon.io returned {len(events)} upcoming earnings events against {len(stored)} stored; keeping the stored calendar.")
+            return None
+        diff = diff_events(stored, events)
+        if apply is not None: apply(diff)
+        with self.lock:
+            self.db.execute("DELETE FROM upcoming")
+            self.db.executemany("INSERT OR REPLACE INTO upcoming VALUES (?, ?, ?)",
+                                [(event['ticker'], event['report_date'].strftime('%Y-%m-%d'), event['timing']) for event in events])
+            self.db.commit()
+        print(f"Found {len(events)} upcoming earnings events from Polygon.io "
+              f"({len(diff['added'])} added, {len(diff['removed'])} removed, {len(diff['changed'])} changed).")
+        return diff
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_upcoming_earnings_cache():
+    """Returns the shared UpcomingEarningsCache instance."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = UpcomingEarningsCache(os.path.join(config.CACHE_DIR, 'upcoming_earnings.sqlite'))
+        return _cache
 
 def get_upcoming_earnings(days_ahead=7):
     """
@@ -17,30 +135,11 @@ def get_upcoming_earnings(days_ahead=7):
         print("ERROR: Polygon API key not set in config.py.")
         return []
 
-    client = RESTClient(api_key)
-    upcoming_events = []
-    
-    try:
-        # Define the date range for the calendar lookup
-        today = datetime.now().date()
-        end_date = today + timedelta(days=days_ahead)
-        
-        # Fetch the calendar data from Polygon
-        resp = client.get_earnings_calendar(from_=today, to=end_date)
-        
-        for event in resp:
-            # The time (bmo, amc, etc.) is included in the response
-            upcoming_events.append({
-                "ticker": event.ticker,
-                "report_date": datetime.strptime(event.report_date, "%Y-%m-%d").date(),
-                "timing": event.time
-            })
-            
-    except Exception as e:
-        print(f"ERROR: Could not fetch upcoming earnings from Polygon.io: {e}")
-
-    print(f"Found {len(upcoming_events)} upcoming earnings events from Polygon.io.")
-    return upcoming_events
+    cache = get_upcoming_earnings_cache()
+    cache.refresh(days_ahead)
+    # On a failed download this is the last stored snapshot, which is better than nothing.
+    today = datetime.now().date()
+    return cache.events(today, today + timedelta(days=days_ahead))
 
 # --- Example of how to use this module ---
 if __name__ == "__main__":
@@ -48,4 +147,4 @@ if __name__ == "__main__":
     if events:
         print("\nSample of upcoming events:")
         for event in events[:15]:
-            print(f"  Ticker: {event['ticker']}, Date: {event['report_date']}, Time: {event['timing']}")
\ No newline at end of file
+            print(f"  Ticker: {event['ticker']}, Date: {event['report_date']}, Time: {event['timing']}")
@@ -0,0 +1,130 @@
+import bisect
+import csv
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import requests
+import config
+import instrumentation
+
+FAILED_FETCH_RETRY_SECONDS = 300
+IMPORTANT_EVENTS = ["FOMC", "CPI", "Retail Sales", "Non-Farm Payrolls", "GDP", "Unemployment Rate"]
+
+class MacroCalendar:
+    """
+    Process-wide index of important economic events from the Alpha Vantage calendar.
+
+    The calendar is downloaded at most once per TTL and persisted to disk. Every download is
+    merged into the on-disk copy, so the index keeps past events and can answer historical queries.
+    """
+    def __init__(self, api_key, ttl_seconds, cache_path):
+        self.api_key = api_key
+        self.ttl_seconds = ttl_seconds
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.fetched_at = 0.0
+        self.last_error = None
+        self.coverage_start = None
+        self.event_dates = []
+        self.event_names = []
+
+    def _set_events(self, events, fetched_at, coverage_start):
+        events = sorted(set(events))
+        self.event_dates = [event_date for event_date, _ in events]
+        self.event_names = [event_name for _, event_name in events]
+        self.fetched_at = fetched_at
+        self.coverage_start = coverage_start
+
+    def _load_from_disk(self):
+        if not os.path.exists(self.cache_path): return False
+        with open(self.cache_path) as f:
+            cached = json.load(f)
+        events = [(datetime.strptime(d, '%Y-%m-%d').date(), name) for d, name in cached['events']]
+        self._set_events(events, cached['fetched_at'], datetime.strptime(cached['coverage_start'], '%Y-%m-%d').date())
+        return True
+
+    def _save_to_disk(self):
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        cached = {
+            'fetched_at': self.fetched_at, 'coverage_start': self.coverage_start.strftime('%Y-%m-%d'),
+            'events': [[d.strftime('%Y-%m-%d'), name] for d, name in zip(self.event_dates, self.event_names)]
+        }
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(cached, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _download(self):
+        url = f'https://www.alphavantage.co/query?function=ECONOMIC_CALENDAR&horizon=3month&apikey={self.api_key}'
+        started = time.perf_counter()
+        response = requests.get(url)
+        instrumentation.record_call('alpha_vantage', 'ECONOMIC_CALENDAR', time.perf_counter() - started,
+                                    error=None if response.ok else str(response.status_code))
+        response.raise_for_status()
+        events = []
+        for row in csv.DictReader(io.StringIO(response.text)):
+            event_name = row.get('event') or ''
+            event_date_str = row.get('date')
+            if not event_date_str: continue
+            if any(important_event in event_name for important_event in IMPORTANT_EVENTS):
+                events.append((datetime.strptime(event_date_str, '%Y-%m-%d').date(), event_name))
+        return events
+
+    def refresh(self):
+        """Makes sure the index is no older than the TTL, downloading only when both caches are stale."""
+        with self.lock:
+            if time.time() - self.fetched_at < self.ttl_seconds: return
+            if not self.event_dates and self._load_from_disk() and time.time() - self.fetched_at < self.ttl_seconds: return
+            try:
+                events = self._download()
+            except Exception as e:
+                # Back off so a failing endpoint is not hit again by every ticker in a scan.
+                self.last_error = e
+                self.fetched_at = time.time() - self.ttl_seconds + FAILED_FETCH_RETRY_SECONDS
+                raise
+            self.last_error = None
+            today = datetime.now().date()
+            known = list(zip(self.event_dates, self.event_names))
+            # Past events are kept from earlier downloads; upcoming ones are replaced by the fresh download.
+            merged = [event for event in known if event[0] < today] + events
+            self._set_events(merged, time.time(), min(self.coverage_start or today, today))
+            self._save_to_disk()
+
+    def find_event(self, as_of, days_away):
+        """Returns the first important (date, event) within days_away of as_of, or None."""
+        idx = bisect.bisect_left(self.event_dates, as_of)
+        if idx < len(self.event_dates) and self.event_dates[idx] <= as_of + timedelta(days=days_away):
+            return self.event_dates[idx], self.event_names[idx]
+        return None
+
+    def check(self, as_of=None, days_away=None):
+        """Runs the macro-event check as of a date (today by default), returning (passed, reason)."""
+        as_of = as_of or datetime.now().date()
+        days_away = config.MACRO_EVENT_DAYS_AWAY if days_away is None else days_away
+        try:
+            self.refresh()
+        except Exception:
+            pass
+        if not self.event_dates and self.last_error:
+            return True, f"Macro check failed: {self.last_error}"
+        if self.coverage_start is None or as_of < self.coverage_start:
+            return True, f"No macro calendar data for {as_of}"
+        event = self.find_event(as_of, days_away)
+        if event:
+            return False, f"Upcoming Event: {event[1]} on {event[0].strftime('%Y-%m-%d')}"
+        return True, "No major macro events found"
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+def get_macro_calendar():
+    """Returns the shared MacroCalendar instance."""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = MacroCalendar(config.ALPHA_VANTAGE_API_KEY, config.MACRO_CALENDAR_TTL_HOURS * 3600,
+                                      os.path.join(config.CACHE_DIR, 'macro_calendar.json'))
+        return _calendar
@@ -0,0 +1,112 @@
+import itertools
+import threading
+import time
+import config
+
+BID, ASK = 1, 2
+# IBKR errors that mean a quote subscription was refused: max tickers, no security definition, not subscribed, competing session.
+REJECTION_CODES = (101, 200, 354, 10197)
+
+def contract_key(contract):
+    return (contract.symbol, contract.secType, contract.lastTradeDateOrContractMonth, float(contract.strike), contract.right)
+
+class MarketDataManager:
+    """
+    Streaming bid/ask cache for option legs, with its own request-id space.
+
+    Legs are subscribed ahead of time (reference-counted per contract) and quotes are kept as they
+    stream in, so pricing at entry is a dictionary read. Open subscriptions are capped at
+    max_lines to stay within the account's market data line limit.
+    """
+    def __init__(self, client, max_lines=config.MARKET_DATA_MAX_LINES, first_req_id=config.MARKET_DATA_FIRST_REQ_ID):
+        self.client = client
+        self.max_lines = max_lines
+        self.req_ids = itertools.count(first_req_id)
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+        self.quotes = {}
+        self.events = {}
+
+    def subscribe(self, contract):
+        """Starts (or shares) a streaming subscription. Returns False when the line limit is reached."""
+        key = contract_key(contract)
+        with self.lock:
+            if key in self.subscriptions:
+                self.subscriptions[key]['refs'] += 1
+                return True
+            if len(self.subscriptions) >= self.max_lines:
+                print(f"Market data line limit ({self.max_lines}) reached; not subscribing {key}.")
+                return False
+            req_id = next(self.req_ids)
+            self.subscriptions[key] = {'req_id': req_id, 'refs': 1}
+            self.quotes[req_id] = {}
+            self.events[req_id] = threading.Event()
+        self.client.reqMktData(req_id, contract, "", False, False, [])
+        return True
+
+    def release(self, contract):
+        """Drops one reference to a subscription, cancelling it when nobody needs it anymore."""
+        key = contract_key(contract)
+        with self.lock:
+            subscription = self.subscriptions.get(key)
+            if subscription is None: return
+            subscription['refs'] -= 1
+            if subscription['refs'] > 0: return
+            del self.subscriptions[key]
+            req_id = subscription['req_id']
+            self.quotes.pop(req_id, None); self.events.pop(req_id, None)
+        self.client.cancelMktData(req_id)
+
+    def owns(self, req_id):
+        with self.lock:
+            return req_id in self.quotes
+
+    def on_tick(self, req_id, tick_type, price):
+        """Records a bid/ask tick from the API thread."""
+        if tick_type not in (BID, ASK) or price <= 0: return
+        with self.lock:
+            quote = self.quotes.get(req_id)
+            if quote is None: return
+            quote['bid' if tick_type == BID else 'ask'] = price
+            quote['updated'] = time.time()
+            if 'bid' in quote and 'ask' in quote: self.events[req_id].set()
+
+    def on_error(self, req_id):
+        """Frees the line of a subscription IBKR rejected."""
+        with self.lock:
+            key = next((key for key, sub in self.subscriptions.items() if sub['req_id'] == req_id), None)
+            if key is None: return
+            del self.subscriptions[key]
+            self.quotes.pop(req_id, None); self.events.pop(req_id, None)
+        print(f"Market data subscription {req_id} for {key} was rejected and released.")
+
+    def quote(self, contract):
+        """Returns the latest {'bid', 'ask', 'updated'} for a subscribed contract without blocking, or None."""
+        with self.lock:
+            subscription = self.subscriptions.get(contract_key(contract))
+            if subscription is None: return None
+            quote = self.quotes[subscription['req_id']]
+            return dict(quote) if 'bid' in quote and 'ask' in quote else None
+
+    def wait_for_quotes(self, contracts, timeout):
+        """Waits until every contract has a two-sided quote, sharing one deadline across all of them."""
+        deadline = time.monotonic() + timeout
+        for contract in contracts:
+            with self.lock:
+                subscription = self.subscriptions.get(contract_key(contract))
+                event = self.events.get(subscription['req_id']) if subscription else None
+            if event is None or not event.wait(max(0, deadline - time.monotonic())): return False
+        return True
+
+    def spread_price(self, short_leg, long_leg, method=config.SPREAD_PRICING):
+        """
+        Prices a long calendar (sell short_leg, buy long_leg) from the cached quotes, without blocking.
+
+        method 'mid' uses both mids; 'natural' pays the long leg's ask and receives the short leg's bid.
+        Returns None if either leg has no two-sided quote yet.
+        """
+        short_quote, long_quote = self.quote(short_leg), self.quote(long_leg)
+        if short_quote is None or long_quote is None: return None
+        if method == 'natural':
+            return round(long_quote['ask'] - short_quote['bid'], 2)
+        return round((long_quote['bid'] + long_quote['ask']) / 2 - (short_quote['bid'] + short_quote['ask']) / 2, 2)
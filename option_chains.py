@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+import instrumentation
+from rate_limiter import get_limiter
+
+CHAIN_COLUMNS = ['contractSymbol', 'strike', 'lastPrice', 'bid', 'ask', 'volume', 'openInterest', 'impliedVolatility']
+
+yf_limiter = get_limiter('yfinance')
+
+def trim_to_band(table, spot, band):
+    """Keeps the rows with strikes within +/- band of spot; keeps the nearest strike if none fall inside it."""
+    table = table[[column for column in CHAIN_COLUMNS if column in table.columns]]
+    if table.empty: return table
+    in_band = table[(table['strike'] - spot).abs() <= band * spot]
+    if in_band.empty: in_band = table.loc[[(table['strike'] - spot).abs().idxmin()]]
+    return in_band.reset_index(drop=True)
+
+class OptionChainCache:
+    """
+    Near-the-money option chains from yfinance, fetched concurrently per expiry and cached for a short TTL.
+
+    Only strikes within strike_band (a fraction of spot) are kept. A cached chain is reused while it is
+    fresh and the current spot still lies inside the band it was trimmed to.
+    """
+    def __init__(self, ttl_seconds, strike_band, max_workers):
+        self.ttl_seconds = ttl_seconds
+        self.strike_band = strike_band
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.expirations = {}
+        self.chains = {}
+
+    def get_expirations(self, stock):
+        """Returns the ticker's listed expiry strings, cached for the TTL."""
+        now = time.time()
+        with self.lock:
+            cached = self.expirations.get(stock.ticker)
+        instrumentation.record_cache('option_expirations', bool(cached and cached[0] > now))
+        if cached and cached[0] > now: return cached[1]
+        expirations = yf_limiter.call(lambda: stock.options, endpoint='options')
+        with self.lock:
+            self.expirations[stock.ticker] = (now + self.ttl_seconds, expirations)
+        return expirations
+
+    def _fetch(self, stock, exp_date, spot):
+        chain = yf_limiter.call(stock.option_chain, exp_date)
+        calls = trim_to_band(chain.calls, spot, self.strike_band)
+        puts = trim_to_band(chain.puts, spot, self.strike_band)
+        entry = (time.time() + self.ttl_seconds, spot * (1 - self.strike_band), spot * (1 + self.strike_band), calls, puts)
+        with self.lock:
+            self.chains[(stock.ticker, exp_date)] = entry
+        return calls, puts
+
+    def get_chains(self, stock, exp_dates, spot):
+        """
+        Returns {exp_date: (calls, puts)} for the given expiries, fetching the missing or stale ones in parallel.
+
+        Expiries that fail to download are left out.
+        """
+        now = time.time()
+        chains, futures = {}, {}
+        with self.lock:
+            for exp_date in exp_dates:
+                cached = self.chains.get((stock.ticker, exp_date))
+                if cached and cached[0] > now and cached[1] <= spot <= cached[2]: chains[exp_date] = cached[3:]
+        for exp_date in exp_dates:
+            instrumentation.record_cache('option_chains', exp_date in chains)
+            if exp_date not in chains: futures[exp_date] = self.executor.submit(self._fetch, stock, exp_date, spot)
+        for exp_date, future in futures.items():
+            try:
+                chains[exp_date] = future.result()
+            except Exception as e:
+                print(f"Could not fetch {stock.ticker} options expiring {exp_date}: {e}")
+        return {exp_date: chains[exp_date] for exp_date in exp_dates if exp_date in chains}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_option_chain_cache():
+    """Returns the shared OptionChainCache instance."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OptionChainCache(config.OPTION_CHAIN_TTL_SECONDS, config.OPTION_CHAIN_STRIKE_BAND, config.OPTION_CHAIN_MAX_WORKERS)
+        return _cache
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+def _trade_dates(results_df):
+    index = pd.to_datetime(results_df.index)
+    if index.tz is not None: index = index.tz_localize(None)
+    return index.normalize()
+
+def build_equity_curve(results_df, initial_capital, backtest_days):
+    """
+    Builds the daily portfolio value series from trade P&L with one cumulative sum.
+
+    Each trade's P&L is booked from its exit date onwards. Trades dated outside backtest_days are ignored.
+    """
+    backtest_days = pd.DatetimeIndex(backtest_days)
+    values = np.full(len(backtest_days), initial_capital, dtype=float)
+    if results_df.empty: return pd.Series(values, index=backtest_days)
+
+    trade_dates = _trade_dates(results_df)
+    in_range = trade_dates.isin(backtest_days)
+    positions = backtest_days.get_indexer(trade_dates[in_range])
+    pnl = results_df['trade_pnl'].to_numpy(dtype=float)[in_range]
+    order = np.argsort(positions, kind='stable')
+    positions, pnl = positions[order], pnl[order]
+
+    # cumulative[m] is the capital after the first m trades; each day takes the prefix of trades booked by then.
+    cumulative = np.cumsum(np.concatenate([[float(initial_capital)], pnl]))
+    trades_booked = np.searchsorted(positions, np.arange(len(backtest_days)), side='right')
+    return pd.Series(cumulative[trades_booked], index=backtest_days)
+
+def core_metrics(portfolio_values):
+    """Returns (annualized Sharpe, max drawdown %, max drawdown duration in days) for an equity curve."""
+    daily_returns = portfolio_values.pct_change().dropna()
+
+    sharpe_ratio = daily_returns.mean() / daily_returns.std() if daily_returns.std() != 0 else 0
+    annualized_sharpe = sharpe_ratio * np.sqrt(TRADING_DAYS)
+
+    cumulative_max = portfolio_values.cummax()
+    drawdown = (portfolio_values - cumulative_max) / cumulative_max
+    max_drawdown_pct = drawdown.min()
+
+    if max_drawdown_pct == 0:
+        return annualized_sharpe, 0, 0
+
+    trough_date = drawdown.idxmin()
+    peak_date = portfolio_values.loc[:trough_date].idxmax()
+
+    recovery_df = portfolio_values.loc[trough_date:]
+    try:
+        recovery_date = recovery_df[recovery_df >= portfolio_values[peak_date]].index[0]
+        max_drawdown_duration = (recovery_date - peak_date).days
+    except IndexError:
+        max_drawdown_duration = "N/A (Did not recover)"
+
+    return annualized_sharpe, max_drawdown_pct, max_drawdown_duration
+
+def rolling_metrics(portfolio_values, window=63):
+    """Returns a DataFrame of rolling annualized Sharpe, Sortino and Calmar ratios over `window` trading days."""
+    returns = portfolio_values.pct_change()
+    mean = returns.rolling(window).mean()
+    std = returns.rolling(window).std()
+    downside = np.sqrt((returns.clip(upper=0) ** 2).rolling(window).mean())
+    sharpe = (mean / std.replace(0, np.nan)) * np.sqrt(TRADING_DAYS)
+    sortino = (mean / downside.replace(0, np.nan)) * np.sqrt(TRADING_DAYS)
+
+    calmar = pd.Series(np.nan, index=portfolio_values.index)
+    values = portfolio_values.to_numpy(dtype=float)
+    if len(values) >= window + 1:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window + 1)
+        max_drawdown = (windows / np.maximum.accumulate(windows, axis=1) - 1).min(axis=1)
+        annual_return = (windows[:, -1] / windows[:, 0]) ** (TRADING_DAYS / window) - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            calmar.iloc[window:] = np.where(max_drawdown < 0, annual_return / -max_drawdown, np.nan)
+    return pd.DataFrame({'sharpe': sharpe, 'sortino': sortino, 'calmar': calmar})
+
+def drawdown_table(portfolio_values):
+    """Returns one row per drawdown episode: peak, trough and recovery dates, depth and duration."""
+    cumulative_max = portfolio_values.cummax()
+    drawdown = portfolio_values / cumulative_max - 1
+    underwater = (drawdown < 0).to_numpy()
+    columns = ['peak_date', 'trough_date', 'recovery_date', 'depth', 'duration_days']
+    if not underwater.any(): return pd.DataFrame(columns=columns)
+
+    # Each run of underwater days is one episode; its peak is the last day before the run starts.
+    run_starts = underwater & ~np.concatenate([[False], underwater[:-1]])
+    run_ends = underwater & ~np.concatenate([underwater[1:], [False]])
+    grouped = drawdown[underwater].groupby(np.cumsum(run_starts)[underwater])
+    troughs = grouped.idxmin()
+
+    index = portfolio_values.index
+    recovery_dates = [index[pos + 1] if pos + 1 < len(index) else pd.NaT for pos in np.flatnonzero(run_ends)]
+    peak_dates = [index[max(start - 1, 0)] for start in np.flatnonzero(run_starts)]
+    table = pd.DataFrame({
+        'peak_date': peak_dates, 'trough_date': troughs.to_numpy(), 'recovery_date': recovery_dates,
+        'depth': grouped.min().to_numpy(),
+    })
+    table['duration_days'] = (table['recovery_date'] - table['peak_date']).dt.days
+    return table.sort_values('depth').reset_index(drop=True)[columns]
+
+def trade_breakdowns(results_df):
+    """Returns (per-ticker, per-month) DataFrames of trade count, total and average P&L, and win rate."""
+    if results_df.empty: return pd.DataFrame(), pd.DataFrame()
+    pnl = results_df['trade_pnl']
+
+    def summarize(keys):
+        summary = pnl.groupby(keys).agg(['count', 'sum', 'mean'])
+        summary.columns = ['trades', 'total_pnl', 'avg_pnl']
+        summary['win_rate'] = (pnl > 0).groupby(keys).mean()
+        return summary
+
+    by_ticker = summarize(results_df['ticker'].to_numpy()).rename_axis('ticker')
+    by_month = summarize(_trade_dates(results_df).to_period('M')).rename_axis('month')
+    return by_ticker, by_month
+
+def score_curves(curves, names, trade_counts):
+    """
+    Scores a (days x curves) matrix of equity curves column by column in one vectorized pass.
+
+    Returns:
+        pd.DataFrame: One row per name with trade count, total return, Sharpe, Sortino, max drawdown and Calmar.
+    """
+    returns = curves[1:] / curves[:-1] - 1
+    mean = returns.mean(axis=0)
+    std = returns.std(axis=0, ddof=1)
+    downside = np.sqrt((np.minimum(returns, 0) ** 2).mean(axis=0))
+    max_drawdown = (curves / np.maximum.accumulate(curves, axis=0) - 1).min(axis=0)
+    total_return = curves[-1] / curves[0] - 1
+    annual_return = (curves[-1] / curves[0]) ** (TRADING_DAYS / len(returns)) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = pd.DataFrame({
+            'trades': trade_counts,
+            'total_return': total_return,
+            'sharpe': np.where(std != 0, mean / std, 0) * np.sqrt(TRADING_DAYS),
+            'sortino': np.where(downside != 0, mean / downside, 0) * np.sqrt(TRADING_DAYS),
+            'max_drawdown': max_drawdown,
+            'calmar': np.where(max_drawdown < 0, annual_return / -max_drawdown, np.nan),
+        }, index=names)
+    return scores
+
+def score_many(results_frames, initial_capital, backtest_days):
+    """
+    Scores many results frames (e.g. one per parameter set) in one batched pass.
+
+    Args:
+        results_frames (dict): Maps a name to a results DataFrame indexed by exit date with a 'trade_pnl' column.
+
+    Returns:
+        pd.DataFrame: One row per name, as returned by score_curves.
+    """
+    names = list(results_frames)
+    columns = ['trades', 'total_return', 'sharpe', 'sortino', 'max_drawdown', 'calmar']
+    if not names or len(backtest_days) < 2: return pd.DataFrame(index=names, columns=columns, dtype=float)
+    curves = np.column_stack([build_equity_curve(results_frames[name], initial_capital, backtest_days).to_numpy() for name in names])
+    return score_curves(curves, names, [len(results_frames[name]) for name in names])
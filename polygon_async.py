@@ -0,0 +1,126 @@
+import asyncio
+import json
+from datetime import datetime
+from enum import Enum
+import aiohttp
+from polygon.exceptions import BadResponse
+from polygon.rest.models import Agg, DailyOpenCloseAgg, OptionsContract
+import config
+from polygon_cache import get_cached_client, polygon_limiter
+
+BASE_URL = 'https://api.polygon.io'
+
+def _query_params(kwargs):
+    """Builds query parameters the way the Polygon RESTClient does (expiration_date_gte -> expiration_date.gte, bools lowercased)."""
+    params = {}
+    for name, value in kwargs.items():
+        if value is None: continue
+        if isinstance(value, Enum): value = value.value
+        elif isinstance(value, bool): value = str(value).lower()
+        elif isinstance(value, datetime): value = int(value.timestamp() * 1000)
+        for suffix in ('lt', 'lte', 'gt', 'gte', 'any_of'):
+            if name.endswith(f"_{suffix}"):
+                name = f"{name[:-len(suffix) - 1]}.{suffix}"
+                if suffix == 'any_of': value = ','.join(value)
+                break
+        params[name] = str(value)
+    return params
+
+class _BlockingView:
+    """Synchronous proxy for an AsyncPolygonClient, for code that runs in a worker thread while the client's loop is running."""
+    def __init__(self, client, loop):
+        self.client = client
+        self.loop = loop
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        return lambda *args, **kwargs: asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self.loop).result()
+
+class AsyncPolygonClient:
+    """
+    asyncio Polygon client that keeps one pooled keep-alive HTTP session for all requests.
+
+    Responses go through the same SQLite cache as a CachedRESTClient (with the same keys, so the sync
+    and async paths share hits) and every network request goes through the shared Polygon rate
+    limiter. Responses are returned as the same polygon model objects the RESTClient returns.
+    """
+    def __init__(self, cache, api_key, max_connections=config.POLYGON_ASYNC_MAX_CONNECTIONS, base_url=BASE_URL):
+        self.cache = cache
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.headers = {"Authorization": f"Bearer {api_key}", "Accept-Encoding": "gzip"}
+        self.session = None
+
+    async def _session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=config.POLYGON_ASYNC_KEEPALIVE_SECONDS)
+            self.session = aiohttp.ClientSession(headers=self.headers, connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(total=config.POLYGON_ASYNC_TIMEOUT_SECONDS))
+        return self.session
+
+    async def close(self):
+        if self.session is not None: await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def blocking(self):
+        """Returns a synchronous view of this client, for worker threads started from inside its event loop."""
+        return _BlockingView(self, asyncio.get_running_loop())
+
+    async def _get_json(self, url, params=None):
+        session = await self._session()
+        async with session.get(url, params=params) as response:
+            body = await response.text()
+            if response.status == 429: raise BadResponse(f"429 Too Many Requests: {body}")
+            if response.status != 200: raise BadResponse(body)
+            return json.loads(body)
+
+    async def _call(self, endpoint, params, dates, fetch):
+        key, cached = self.cache._cached(endpoint, params)
+        if cached is not None:
+            kind, value = cached
+            if kind == 'error': raise BadResponse(value)
+            return value
+        try:
+            result = await polygon_limiter.call_async(fetch, endpoint=endpoint)
+        except BadResponse as e:
+            self.cache._remember_error(key, dates, e)
+            raise
+        self.cache._store(key, ('ok', result), self.cache._expiry(dates)[1])
+        return result
+
+    async def get_aggs(self, ticker, multiplier, timespan, from_, to, **kwargs):
+        params = {'ticker': ticker, 'multiplier': multiplier, 'timespan': timespan, 'from_': from_, 'to': to, **kwargs}
+        url = f"{self.base_url}/v2/aggs/ticker/{ticker}/range/{multiplier}/{timespan}/{from_}/{to}"
+
+        async def fetch():
+            response = await self._get_json(url, _query_params(kwargs))
+            return [Agg.from_dict(row) for row in response.get('results', [])]
+        return await self._call('get_aggs', params, [from_, to], fetch)
+
+    async def list_options_contracts(self, **kwargs):
+        async def fetch():
+            contracts, url, params = [], f"{self.base_url}/v3/reference/options/contracts", _query_params(kwargs)
+            while url:
+                response = await self._get_json(url, params)
+                contracts.extend(OptionsContract.from_dict(row) for row in response.get('results', []))
+                # next_url already carries the cursor and every filter.
+                url, params = response.get('next_url'), None
+            return contracts
+        return await self._call('list_options_contracts', kwargs, [kwargs.get('as_of')], fetch)
+
+    async def get_daily_open_close_agg(self, ticker, date, **kwargs):
+        params = {'ticker': ticker, 'date': date, **kwargs}
+        url = f"{self.base_url}/v1/open-close/{ticker}/{date}"
+
+        async def fetch():
+            return DailyOpenCloseAgg.from_dict(await self._get_json(url, _query_params(kwargs)))
+        return await self._call('get_daily_open_close_agg', params, [date], fetch)
+
+def get_async_client(api_key=None):
+    """Builds an AsyncPolygonClient sharing the response cache of get_cached_client()."""
+    return AsyncPolygonClient(get_cached_client(api_key), api_key or config.POLYGON_API_KEY)
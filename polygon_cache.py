@@ -0,0 +1,117 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import datetime, date
+from polygon import RESTClient
+from polygon.exceptions import BadResponse
+import config
+import instrumentation
+from rate_limiter import get_limiter
+
+polygon_limiter = get_limiter('polygon')
+
+def _to_date(value):
+    """Converts the date-like arguments Polygon accepts (str, date, datetime, ms timestamp) to a date."""
+    if value is None: return None
+    if isinstance(value, datetime): return value.date()
+    if isinstance(value, date): return value
+    if isinstance(value, (int, float)): return datetime.fromtimestamp(value / 1000).date()
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+def _materialize(result):
+    # Paginated endpoints return lazy iterators; drain them so the whole response can be cached.
+    if not isinstance(result, (list, dict)) and hasattr(result, '__iter__'): return list(result)
+    return result
+
+class CachedRESTClient:
+    """
+    Wraps a Polygon RESTClient and stores every response in a local SQLite cache.
+
+    Responses for dates strictly before today are immutable and cached permanently. Anything
+    touching today (or with no date at all) expires after the configured TTL. Only cache misses
+    reach the network, so only they go through the shared Polygon rate limiter.
+    """
+    def __init__(self, client, cache_path, ttl_seconds):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(cache_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+        self.db.commit()
+
+    def _lookup(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()): return None
+        return pickle.loads(row[0])
+
+    def _store(self, key, value, expires_at):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, pickle.dumps(value), expires_at))
+            self.db.commit()
+
+    def _cached(self, endpoint, params):
+        """Returns (key, cached) for a request, where cached is ('ok'|'error', value) or None on a miss."""
+        key = json.dumps([endpoint, params], sort_keys=True, default=str)
+        cached = self._lookup(key)
+        instrumentation.record_cache('polygon', cached is not None)
+        return key, cached
+
+    def _expiry(self, dates):
+        """Returns (is_historical, expires_at) for a response covering the given dates."""
+        today = datetime.now().date()
+        dates = [_to_date(d) for d in dates]
+        is_historical = bool(dates) and all(d is not None and d < today for d in dates)
+        return is_historical, None if is_historical else time.time() + self.ttl_seconds
+
+    def _remember_error(self, key, dates, error):
+        # A historical "not found" will never change, so remember it instead of asking again.
+        is_historical, expires_at = self._expiry(dates)
+        if is_historical and 'NOT_FOUND' in str(error): self._store(key, ('error', str(error)), expires_at)
+
+    def _call(self, endpoint, params, dates, fetch):
+        key, cached = self._cached(endpoint, params)
+        if cached is not None:
+            kind, value = cached
+            if kind == 'error': raise BadResponse(value)
+            return value
+        try:
+            result = polygon_limiter.call(lambda: _materialize(fetch()), endpoint=endpoint)
+        except BadResponse as e:
+            self._remember_error(key, dates, e)
+            raise
+        self._store(key, ('ok', result), self._expiry(dates)[1])
+        return result
+
+    def get_aggs(self, ticker, multiplier, timespan, from_, to, **kwargs):
+        params = {'ticker': ticker, 'multiplier': multiplier, 'timespan': timespan, 'from_': from_, 'to': to, **kwargs}
+        return self._call('get_aggs', params, [from_, to],
+                          lambda: self.client.get_aggs(ticker, multiplier, timespan, from_, to, **kwargs))
+
+    def list_options_contracts(self, **kwargs):
+        return self._call('list_options_contracts', kwargs, [kwargs.get('as_of')],
+                          lambda: self.client.list_options_contracts(**kwargs))
+
+    def get_daily_open_close_agg(self, ticker, date, **kwargs):
+        params = {'ticker': ticker, 'date': date, **kwargs}
+        return self._call('get_daily_open_close_agg', params, [date],
+                          lambda: self.client.get_daily_open_close_agg(ticker, date, **kwargs))
+
+    def get_grouped_daily_aggs(self, date, **kwargs):
+        params = {'date': date, **kwargs}
+        return self._call('get_grouped_daily_aggs', params, [date],
+                          lambda: self.client.get_grouped_daily_aggs(date, **kwargs))
+
+    def __getattr__(self, name):
+        # Endpoints without a cache wrapper go straight to the underlying client.
+        return getattr(self.client, name)
+
+def get_cached_client(api_key=None):
+    """Builds a CachedRESTClient around a new Polygon RESTClient using the settings in config.py."""
+    client = RESTClient(api_key=api_key or config.POLYGON_API_KEY)
+    return CachedRESTClient(client, os.path.join(config.CACHE_DIR, 'polygon_cache.sqlite'),
+                            config.POLYGON_CACHE_TTL_MINUTES * 60)
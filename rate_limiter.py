@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+import config
+import instrumentation
+
+MAX_THROTTLE_RETRIES = 5
+MIN_RATE_FRACTION = 1 / 16
+
+def is_rate_limited(error):
+    """Returns True if an exception looks like an HTTP 429 / rate-limit response."""
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message or 'ratelimit' in type(error).__name__.lower()
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every caller of one provider.
+
+    Tokens refill at calls_per_minute and the bucket holds up to `burst` tokens, so idle time can be
+    spent as a short burst. On HTTP 429 the refill rate is halved; each success then restores it
+    gradually towards the configured rate.
+    """
+    def __init__(self, calls_per_minute, burst=1, provider=None):
+        self.provider = provider
+        self.base_rate = calls_per_minute / 60.0
+        self.rate = self.base_rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Takes a token and returns how many seconds the caller must wait before using it."""
+        if not self.base_rate: return 0
+        with self.lock:
+            self._refill(time.monotonic())
+            # Reserve a token now; a negative balance is the queue of callers already waiting.
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def acquire(self):
+        """Blocks until the caller is allowed to make its next request."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+            instrumentation.record_sleep(self.provider, wait)
+
+    async def acquire_async(self):
+        """Like acquire(), but waits with asyncio.sleep so the event loop keeps running other requests."""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+            instrumentation.record_sleep(self.provider, wait)
+
+    def report_throttled(self):
+        """Slows the bucket down after the provider answered with HTTP 429."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.rate / 2, self.base_rate * MIN_RATE_FRACTION)
+            self.tokens = min(self.tokens, 0)
+
+    def report_success(self):
+        """Moves the refill rate back towards the configured rate after a successful call."""
+        if self.rate < self.base_rate:
+            with self.lock:
+                self._refill(time.monotonic())
+                self.rate = min(self.base_rate, self.rate * 1.25)
+
+    def call(self, fn, *args, endpoint=None, **kwargs):
+        """
+        Calls fn under the rate limit, retrying with adaptive backoff when it is throttled.
+
+        endpoint names the request in the instrumentation counters (fn's name by default).
+        """
+        endpoint = endpoint or getattr(fn, '__name__', 'call')
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            self.acquire()
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                instrumentation.record_call(self.provider, endpoint, time.perf_counter() - started, error=type(e).__name__, throttled=throttled)
+                if not self.base_rate or not throttled or attempt == MAX_THROTTLE_RETRIES: raise
+                print(f"Rate limited ({e}). Backing off and retrying...")
+                self.report_throttled()
+                continue
+            instrumentation.record_call(self.provider, endpoint, time.perf_counter() - started)
+            self.report_success()
+            return result
+
+    async def call_async(self, fn, *args, endpoint=None, **kwargs):
+        """Awaits the coroutine function fn under the same token bucket and throttle backoff as call()."""
+        endpoint = endpoint or getattr(fn, '__name__', 'call')
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            await self.acquire_async()
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                instrumentation.record_call(self.provider, endpoint, time.perf_counter() - started, error=type(e).__name__, throttled=throttled)
+                if not self.base_rate or not throttled or attempt == MAX_THROTTLE_RETRIES: raise
+                print(f"Rate limited ({e}). Backing off and retrying...")
+                self.report_throttled()
+                continue
+            instrumentation.record_call(self.provider, endpoint, time.perf_counter() - started)
+            self.report_success()
+            return result
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider):
+    """Returns the process-wide limiter shared by every caller of a provider (e.g. 'polygon', 'yfinance')."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            limits = config.RATE_LIMITS.get(provider, {})
+            _limiters[provider] = RateLimiter(limits.get('calls_per_minute', 0), limits.get('burst', 1), provider)
+        return _limiters[provider]
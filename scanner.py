@@ -2,11 +2,19 @@ import yfinance as yf
 from datetime import datetime, timedelta
 from scipy.interpolate import interp1d
 import numpy as np
-import pandas as pd
-import requests
-import csv
-import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import config # Import the new config file
+from rate_limiter import get_limiter
+from macro_calendar import get_macro_calendar
+from volatility import yang_zhang_latest
+from feature_store import get_feature_store
+from bar_store import get_bar_store
+from option_chains import get_option_chain_cache
+from earnings_store import get_earnings_store, normalize_ticker
+from instrumentation import span
+from term_structure import pack as pack_term_structures, term_structure_metrics
+
+yf_limiter = get_limiter('yfinance')
 
 def filter_dates(dates):
     """Finds expiration dates between today and 45 days out."""
@@ -24,21 +32,9 @@ def filter_dates(dates):
     return sorted(valid_dates)
 
 def yang_zhang(price_data, window=30, trading_periods=252):
-    """Calculates the Yang-Zhang volatility."""
-    log_ho = (price_data['High'] / price_data['Open']).apply(np.log)
-    log_lo = (price_data['Low'] / price_data['Open']).apply(np.log)
-    log_co = (price_data['Close'] / price_data['Open']).apply(np.log)
-    log_oc = (price_data['Open'] / price_data['Close'].shift(1)).apply(np.log)
-    log_oc_sq = log_oc**2
-    log_cc = (price_data['Close'] / price_data['Close'].shift(1)).apply(np.log)
-    log_cc_sq = log_cc**2
-    rs = log_ho * (log_ho - log_co) + log_lo * (log_lo - log_co)
-    close_vol = log_cc_sq.rolling(window=window).sum() * (1.0 / (window - 1.0))
-    open_vol = log_oc_sq.rolling(window=window).sum() * (1.0 / (window - 1.0))
-    window_rs = rs.rolling(window=window).sum() * (1.0 / (window - 1.0))
-    k = 0.34 / (1.34 + ((window + 1) / (window - 1)))
-    result = (open_vol + k * close_vol + (1 - k) * window_rs).apply(np.sqrt) * np.sqrt(trading_periods)
-    return result.iloc[-1]
+    """Calculates the latest Yang-Zhang volatility."""
+    ohlc = (price_data[column].to_numpy(dtype=float) for column in ('Open', 'High', 'Low', 'Close'))
+    return yang_zhang_latest(*ohlc, window=window, trading_periods=trading_periods)[0]
 
 def build_term_structure(days, ivs):
     """Builds a spline for the IV term structure."""
@@ -51,86 +47,150 @@ def build_term_structure(days, ivs):
     spline = interp1d(days, ivs, kind='linear', fill_value="extrapolate")
     return spline
 
-def get_average_historical_earnings_move(stock, price_history):
-    """Calculates the average absolute price move on the day following the last 8 earnings announcements."""
-    try:
-        earnings_dates = stock.earnings_dates
-        if earnings_dates is None or earnings_dates.empty: return None
-        earnings_dates.index = pd.to_datetime(earnings_dates.index, utc=True)
-        price_history.index = pd.to_datetime(price_history.index, utc=True)
-        recent_earnings_dates = earnings_dates.index.dropna().sort_values(ascending=False)[:8]
-        moves = []
-        for date in recent_earnings_dates:
-            try:
-                loc_t0 = price_history.index.get_loc(date, method='ffill')
-                if loc_t0 + 1 < len(price_history):
-                    price_t0 = price_history.iloc[loc_t0]['Close']
-                    price_t1 = price_history.iloc[loc_t0 + 1]['Close']
-                    if price_t0 > 0: moves.append(abs((price_t1 - price_t0) / price_t0))
-            except KeyError: continue
-        return np.mean(moves) if moves else None
-    except Exception: return None
-
-def check_for_macro_events():
-    """Checks for major upcoming economic events using the Alpha Vantage API."""
+def get_historical_earnings_moves(bars_by_ticker, events_by_ticker, as_of, count=config.EARNINGS_MOVE_LOOKBACK):
+    """
+    Calculates the average absolute close-to-close reaction to the last `count` earnings of many tickers in one pass.
+
+    Args:
+        bars_by_ticker (dict): ticker -> daily bars (bar_store.BAR_DTYPE), oldest first.
+        events_by_ticker (dict): ticker -> [(earnings date, timing)] as returned by EarningsStore.history.
+        as_of (date): Only reactions completed by this date are used.
+
+    Returns:
+        dict: ticker -> (mean absolute move, number of moves) for the tickers with at least one usable move.
+    """
+    tickers = [ticker for ticker in bars_by_ticker if len(bars_by_ticker[ticker]) >= 2 and events_by_ticker.get(ticker)]
+    if not tickers: return {}
+    # Key every bar and event by (ticker position, day) so one searchsorted covers all tickers.
+    key_stride = np.int64(1 << 20)
+    bars = [bars_by_ticker[ticker] for ticker in tickers]
+    bar_keys = np.concatenate([i * key_stride + b['date'].astype(np.int64) for i, b in enumerate(bars)])
+    closes = np.concatenate([b['close'] for b in bars])
+    bar_ticker = np.repeat(np.arange(len(tickers)), [len(b) for b in bars])
+
+    events = [sorted(events_by_ticker[ticker]) for ticker in tickers]
+    event_ticker = np.repeat(np.arange(len(tickers)), [len(e) for e in events])
+    event_day = np.array([day for e in events for day, _ in e], dtype='datetime64[D]').astype(np.int64)
+    reacts_same_day = np.array([timing in ('bmo', 'dmh') for e in events for _, timing in e])
+    event_keys = event_ticker * key_stride + event_day
+    # Reports before the open or during market hours react on the report day; after-close ones on the next session.
+    t0 = np.where(reacts_same_day, np.searchsorted(bar_keys, event_keys, side='left'), np.searchsorted(bar_keys, event_keys, side='right')) - 1
+    t1 = t0 + 1
+    valid = (t0 >= 0) & (t1 < len(bar_keys))
+    t0, t1, event_ticker = t0[valid], t1[valid], event_ticker[valid]
+    valid = ((bar_ticker[t0] == event_ticker) & (bar_ticker[t1] == event_ticker)
+             & (bar_keys[t1] - event_ticker * key_stride <= np.datetime64(as_of, 'D').astype(np.int64)) & (closes[t0] > 0))
+    t0, t1, event_ticker = t0[valid], t1[valid], event_ticker[valid]
+
+    moves = np.abs(closes[t1] / closes[t0] - 1)
+    # Events are sorted by ticker then date, so the last `count` of each ticker are those nearest its group end.
+    group_end = np.searchsorted(event_ticker, event_ticker, side='right')
+    recent = group_end - np.arange(len(event_ticker)) <= count
+    sums = np.bincount(event_ticker[recent], weights=moves[recent], minlength=len(tickers))
+    counts = np.bincount(event_ticker[recent], minlength=len(tickers))
+    return {ticker: (sums[i] / counts[i], int(counts[i])) for i, ticker in enumerate(tickers) if counts[i]}
+
+def check_earnings_move(ticker, bars, as_of, front_iv, front_dte):
+    """
+    Compares the front-month implied move (IV * sqrt(dte / 365)) with the ticker's historical earnings move.
+
+    Uses only the local bar and earnings stores (the live bot refreshes the latter out of band). Returns
+    (passed, reason, implied_move, historical_move); the check passes when the store has no usable history for the ticker.
+    """
+    implied_move = front_iv * np.sqrt(max(front_dte, 1) / 365)
+    # Reports older than the bars (BAR_STORE_LOOKBACK_DAYS live, the same window in backtests) could not be measured anyway.
+    events = get_earnings_store().history([ticker], as_of - timedelta(days=config.BAR_STORE_LOOKBACK_DAYS), as_of)
+    historical = get_historical_earnings_moves({normalize_ticker(ticker): bars}, events, as_of).get(normalize_ticker(ticker))
+    historical_move, num_moves = historical or (None, None)
+    return (*earnings_move_verdict(implied_move, historical_move, num_moves), implied_move, historical_move)
+
+def earnings_move_verdict(implied_move, historical_move, num_moves=None):
+    """Applies EARNINGS_MOVE_RATIO_THRESHOLD to an implied and historical move, returning (passed, reason)."""
+    if historical_move is None: return True, "No earnings history in the local store"
+    reports = f" over {num_moves} reports" if num_moves else ""
+    return implied_move >= config.EARNINGS_MOVE_RATIO_THRESHOLD * historical_move, f"Implied {implied_move:.1%} vs historical {historical_move:.1%}{reports}"
+
+def get_daily_bars(ticker, lookback_bars=60):
+    """Returns the trailing daily bars for a ticker from the local bar store, ending with today's bar when the session is open."""
+    store = get_bar_store('yfinance')
+    today = datetime.now(config.MARKET_TIMEZONE).date()
+    live = store.sync(ticker, today - timedelta(days=config.BAR_STORE_LOOKBACK_DAYS), today)
+    stored = store.bars(ticker)[-lookback_bars:]
+    return np.concatenate([stored, live]) if len(live) else stored
+
+def check_for_macro_events(as_of=None):
+    """Checks for major economic events near a date (today by default) using the cached Alpha Vantage calendar."""
     api_key = config.ALPHA_VANTAGE_API_KEY
-    days_away_threshold = config.MACRO_EVENT_DAYS_AWAY
     if not api_key or api_key == "YOUR_API_KEY_HERE":
         return True, "API key not set for macro check"
-    IMPORTANT_EVENTS = ["FOMC", "CPI", "Retail Sales", "Non-Farm Payrolls", "GDP", "Unemployment Rate"]
-    url = f'https://www.alphavantage.co/query?function=ECONOMIC_CALENDAR&horizon=3month&apikey={api_key}'
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        csv_file = io.StringIO(response.text)
-        reader = csv.DictReader(csv_file)
-        today = datetime.now().date()
-        for row in reader:
-            event_name = row.get('event')
-            if any(important_event in event_name for important_event in IMPORTANT_EVENTS):
-                event_date_str = row.get('date')
-                if not event_date_str: continue
-                event_date = datetime.strptime(event_date_str, '%Y-%m-%d').date()
-                delta_days = (event_date - today).days
-                if 0 <= delta_days <= days_away_threshold:
-                    return False, f"Upcoming Event: {event_name} on {event_date_str}"
-        return True, "No major macro events found"
-    except Exception as e:
-        return True, f"Macro check failed: {e}"
+    return get_macro_calendar().check(as_of=as_of)
 
-def scan_stock(ticker):
-    """Runs the full scan for a single stock ticker."""
+def scan_stock(ticker, fail_fast=False):
+    """
+    Runs the full scan for a single stock ticker.
+
+    With fail_fast, a ticker that fails the average volume check is returned as "Avoid" straight away,
+    before any option data is downloaded; its result then only carries the avg_volume check and failed_fast.
+    """
     ticker = ticker.strip().upper()
+    with span('scan_stock', ticker=ticker):
+        return _scan_stock(ticker, fail_fast)
+
+def _volume_failure(ticker, avg_volume, underlying_price):
+    return {
+        'ticker': ticker, 'recommendation': "Avoid",
+        'checks': {'avg_volume': {'value': f"{avg_volume:,.0f}", 'passed': False}},
+        'details': {'underlying_price': round(underlying_price, 2)}, 'failed_fast': True, 'error': None
+    }
+
+def _scan_stock(ticker, fail_fast=False):
     try:
         stock = yf.Ticker(ticker)
-        exp_dates = filter_dates(stock.options)
-        if not exp_dates: return {'error': f"No suitable options found for {ticker}."}
-        price_history_3y = stock.history(period='3y')
-        underlying_price = price_history_3y['Close'].iloc[-1]
-        
-        avg_volume = price_history_3y['Volume'].rolling(30).mean().iloc[-1]
-        rv30 = yang_zhang(price_history_3y, window=30)
+        chain_cache = get_option_chain_cache()
+        with span('scan_stock.bars', ticker=ticker):
+            bars = get_daily_bars(ticker)
+        if len(bars) == 0: return {'ticker': ticker, 'error': f"No price history found for {ticker}."}
+        underlying_price = bars['close'][-1]
+        avg_volume = bars['volume'][-30:].mean() if len(bars) >= 30 else float('nan')
+        if fail_fast and not avg_volume >= config.AVG_VOLUME_THRESHOLD: return _volume_failure(ticker, avg_volume, underlying_price)
+
+        with span('scan_stock.expirations', ticker=ticker):
+            exp_dates = filter_dates(chain_cache.get_expirations(stock))
+        if not exp_dates: return {'ticker': ticker, 'error': f"No suitable options found for {ticker}."}
+        with span('scan_stock.volatility', ticker=ticker):
+            rv30 = yang_zhang_latest(bars['open'], bars['high'], bars['low'], bars['close'], window=30)[0]
         
         dtes, ivs = [], []
         today = datetime.today().date()
-        for exp_date in exp_dates:
-            chain = stock.option_chain(exp_date)
-            if chain.calls.empty or chain.puts.empty: continue
-            atm_strike_idx = (chain.calls['strike'] - underlying_price).abs().idxmin()
-            call_iv = chain.calls.loc[atm_strike_idx, 'impliedVolatility']
-            put_iv = chain.puts.loc[(chain.puts['strike'] - underlying_price).abs().idxmin(), 'impliedVolatility']
-            dtes.append((datetime.strptime(exp_date, "%Y-%m-%d").date() - today).days)
-            ivs.append((call_iv + put_iv) / 2.0)
+        with span('scan_stock.option_chains', ticker=ticker):
+            chains = chain_cache.get_chains(stock, exp_dates, underlying_price)
+        with span('scan_stock.atm_iv', ticker=ticker):
+            for exp_date, (calls, puts) in chains.items():
+                if calls.empty or puts.empty: continue
+                atm_strike_idx = (calls['strike'] - underlying_price).abs().idxmin()
+                call_iv = calls.loc[atm_strike_idx, 'impliedVolatility']
+                put_iv = puts.loc[(puts['strike'] - underlying_price).abs().idxmin(), 'impliedVolatility']
+                dtes.append((datetime.strptime(exp_date, "%Y-%m-%d").date() - today).days)
+                ivs.append((call_iv + put_iv) / 2.0)
         
-        if not dtes: return {'error': f"Could not calculate ATM IV for {ticker}."}
-        term_spline = build_term_structure(dtes, ivs)
-        iv30 = float(term_spline(30))
-        iv30_rv30_ratio = iv30 / rv30 if rv30 > 0 else float('inf')
-        
-        dte_start = dtes[0]
-        ts_slope = (float(term_spline(45)) - float(term_spline(dte_start))) / (45 - dte_start) if (45 - dte_start) != 0 else 0
+        if not dtes: return {'ticker': ticker, 'error': f"Could not calculate ATM IV for {ticker}."}
+        with span('scan_stock.term_structure', ticker=ticker):
+            iv30, ts_slope, _ = (float(value[0]) for value in term_structure_metrics(
+                *pack_term_structures([(dtes, ivs)]), method=config.TERM_STRUCTURE_METHOD))
+            iv30_rv30_ratio = iv30 / rv30 if rv30 > 0 else float('inf')
 
-        macro_event_passed, macro_event_reason = check_for_macro_events()
+        with span('scan_stock.macro', ticker=ticker):
+            macro_event_passed, macro_event_reason = check_for_macro_events()
+        with span('scan_stock.earnings_move', ticker=ticker):
+            earnings_move_passed, earnings_move_reason, implied_move, historical_move = check_earnings_move(
+                ticker, get_bar_store('yfinance').bars(ticker), today, ivs[0], dtes[0])
+        get_feature_store().append({
+            'ticker': ticker, 'as_of': today, 'status': 'complete', 'underlying_price': underlying_price,
+            'avg_volume': avg_volume, 'rv30': rv30, 'iv30': iv30, 'iv_rv_ratio': iv30_rv30_ratio,
+            'ts_slope': ts_slope, 'macro_passed': macro_event_passed, 'macro_reason': macro_event_reason,
+            'implied_move': implied_move, 'historical_move': historical_move, 'earnings_move_passed': earnings_move_passed,
+            'term_structure_method': config.TERM_STRUCTURE_METHOD,
+        }, 'live')
 
         results = {
             'core': {
@@ -140,6 +200,7 @@ def scan_stock(ticker):
             },
             'enhanced': {
                 'macro_event': {'value': macro_event_reason, 'passed': macro_event_passed},
+                'earnings_move': {'value': earnings_move_reason, 'passed': earnings_move_passed},
             }
         }
         
@@ -157,7 +218,18 @@ def scan_stock(ticker):
                 'underlying_price': round(underlying_price, 2),
                 'iv30': round(iv30, 4),
                 'rv30': round(rv30, 4),
+                'implied_move': round(implied_move, 4),
+                'historical_move': round(historical_move, 4) if historical_move is not None else None,
             }, 'error': None
         }
     except Exception as e:
-        return {'ticker': ticker, 'error': str(e)}
\ No newline at end of file
+        return {'ticker': ticker, 'error': str(e)}
+
+def scan_many(tickers, max_workers=config.SCAN_MAX_WORKERS, fail_fast=False):
+    """
+    Scans many tickers concurrently, yielding each scan_stock result as soon as it finishes.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(scan_stock, ticker, fail_fast) for ticker in tickers]
+        for future in as_completed(futures):
+            yield future.result()
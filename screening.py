@@ -0,0 +1,171 @@
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from polygon.exceptions import BadResponse
+import config
+from earnings_store import normalize_ticker
+from polygon_cache import get_cached_client
+from scanner import scan_many
+from instrumentation import span
+
+# Weekdays in a row without a session before the walk back gives up (covers any run of market holidays).
+MAX_CLOSED_WEEKDAYS = 5
+
+class GroupedDailyHistory:
+    """
+    Whole-market daily bars from Polygon's grouped daily endpoint, one request per session for every ticker.
+
+    Sessions are kept in memory once loaded, so screening many dates with overlapping windows loads
+    each session once; given tickers, only their bars are kept rather than the whole market's.
+    Requests go through the client's response cache, where past sessions never expire.
+    """
+    def __init__(self, client, tickers=None):
+        self.client = client
+        self.tickers = None if tickers is None else {normalize_ticker(ticker) for ticker in tickers}
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def session(self, day):
+        """Returns {ticker: (volume, close)} for one day, or None when the market was closed."""
+        with self.lock:
+            if day in self.sessions: return self.sessions[day]
+        try:
+            aggs = self.client.get_grouped_daily_aggs(day.strftime('%Y-%m-%d'), adjusted=True)
+        except BadResponse as e:
+            if 'NOT_FOUND' not in str(e): raise
+            aggs = []
+        session = {normalize_ticker(agg.ticker): (agg.volume, agg.close) for agg in aggs} if aggs else None
+        if session and self.tickers is not None: session = {ticker: bar for ticker, bar in session.items() if ticker in self.tickers}
+        with self.lock:
+            self.sessions[day] = session
+        return session
+
+    def window(self, as_of, num_sessions):
+        """Returns up to num_sessions sessions ending on or before as_of, most recent first."""
+        sessions, day, closed = [], as_of, 0
+        while len(sessions) < num_sessions and closed < MAX_CLOSED_WEEKDAYS:
+            if day.weekday() < 5:
+                session = self.session(day)
+                if session is not None: sessions.append(session); closed = 0
+                else: closed += 1
+            day -= timedelta(days=1)
+        return sessions
+
+    def liquidity(self, tickers, as_of, num_sessions=config.SCREEN_LOOKBACK_SESSIONS):
+        """
+        Returns (avg_volume, last_close) arrays for the tickers as of a date.
+
+        avg_volume is the mean over the sessions in the window that have a bar for the ticker and last_close
+        is its most recent close in the window; both are NaN for tickers without any bar.
+        """
+        sessions = self.window(as_of, num_sessions)
+        if not sessions: return np.full(len(tickers), np.nan), np.full(len(tickers), np.nan)
+        volume = np.full((len(tickers), len(sessions)), np.nan)
+        close = np.full((len(tickers), len(sessions)), np.nan)
+        for j, session in enumerate(sessions):
+            for i, ticker in enumerate(tickers):
+                bar = session.get(normalize_ticker(ticker))
+                if bar is not None: volume[i, j], close[i, j] = bar
+        has_bar = ~np.isnan(close)
+        present = has_bar.sum(axis=1)
+        avg_volume = np.where(present > 0, np.nansum(volume, axis=1) / np.maximum(present, 1), np.nan)
+        last_close = np.where(present > 0, close[np.arange(len(tickers)), np.argmax(has_bar, axis=1)], np.nan)
+        return avg_volume, last_close
+
+def _stage(name, entered, removed):
+    return {'stage': name, 'in': entered, 'removed': removed, 'out': entered - removed}
+
+def screen_liquidity(tickers, as_of, history, min_avg_volume=config.AVG_VOLUME_THRESHOLD, min_price=config.MIN_UNDERLYING_PRICE):
+    """
+    Applies the bulk volume and price filters to a universe as of a date.
+
+    Tickers missing from the grouped bars (e.g. newly listed or renamed) cannot be judged in bulk and are
+    kept, so the per-ticker scan still decides them.
+
+    Returns:
+        (survivors, stages): The tickers that passed, in input order, and the per-stage counts.
+    """
+    avg_volume, last_close = history.liquidity(tickers, as_of)
+    unknown = np.isnan(avg_volume)
+    volume_passed = unknown | (avg_volume >= min_avg_volume)
+    price_passed = unknown | ~(last_close < (min_price or 0))
+    stages = [_stage('bulk_volume', len(tickers), int((~volume_passed).sum())),
+              _stage('bulk_price', int(volume_passed.sum()), int((volume_passed & ~price_passed).sum()))]
+    stages[0]['no_data'] = int(unknown.sum())
+    return [ticker for ticker, passed in zip(tickers, volume_passed & price_passed) if passed], stages
+
+def _merge_stages(totals, stages):
+    for stage in stages:
+        total = next((t for t in totals if t['stage'] == stage['stage']), None)
+        if total is None: totals.append(dict(stage)); continue
+        for key, value in stage.items():
+            if key != 'stage': total[key] = total.get(key, 0) + value
+    return totals
+
+def print_funnel(stages):
+    """Prints how many tickers entered each stage and how many it removed."""
+    print("\n--- Screening funnel ---")
+    for stage in stages:
+        note = f" ({stage['no_data']} without bulk data passed through)" if stage.get('no_data') else ""
+        print(f"  {stage['stage']:<18} {stage['in']:>6} in  {stage['removed']:>6} removed  {stage['out']:>6} left{note}")
+
+def _has_polygon_key():
+    return bool(config.POLYGON_API_KEY) and config.POLYGON_API_KEY != "YOUR_POLYGON_API_KEY_HERE"
+
+def last_completed_session(now=None):
+    """Returns the most recent weekday before today in market time; grouped bars for today are not final yet."""
+    day = (now or datetime.now(config.MARKET_TIMEZONE)).date() - timedelta(days=1)
+    while day.weekday() >= 5: day -= timedelta(days=1)
+    return day
+
+def run_funnel(tickers, as_of=None, client=None, max_workers=config.SCAN_MAX_WORKERS):
+    """
+    Screens a universe cheapest stage first and fully scans only the survivors.
+
+    The bulk volume and price filters use Polygon grouped daily bars (one request per session for the
+    whole universe). Survivors go through scan_stock with fail_fast, which re-checks volume on the
+    ticker's own bars before any option chain is downloaded. Without a Polygon key the bulk stages are skipped.
+
+    Returns:
+        (results, stages): scan_stock results for the tickers that reached the scan, and the per-stage counts.
+    """
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers))
+    survivors, stages = tickers, []
+    if client is None and not _has_polygon_key():
+        print("Polygon API key not set; skipping the bulk volume and price filters.")
+    else:
+        try:
+            with span('screening.bulk', tickers=len(tickers)):
+                history = GroupedDailyHistory(client or get_cached_client())
+                survivors, stages = screen_liquidity(tickers, as_of or last_completed_session(), history)
+        except Exception as e:
+            print(f"Bulk screening failed ({e}); scanning every ticker.")
+
+    with span('screening.scan', tickers=len(survivors)):
+        results = list(scan_many(survivors, max_workers=max_workers, fail_fast=True))
+    volume_failed = sum(1 for r in results if r.get('failed_fast'))
+    errors = sum(1 for r in results if r.get('error'))
+    avoided = sum(1 for r in results if not r.get('error') and not r.get('failed_fast') and r['recommendation'] == 'Avoid')
+    stages.append(_stage('history_volume', len(survivors), volume_failed))
+    stages.append(_stage('option_data', stages[-1]['out'], errors))
+    stages.append(_stage('thresholds', stages[-1]['out'], avoided))
+    print_funnel(stages)
+    return results, stages
+
+def screen_historical_scans(scans, client, min_avg_volume=config.AVG_VOLUME_THRESHOLD, min_price=config.MIN_UNDERLYING_PRICE):
+    """
+    Applies the bulk volume and price filters to historical (ticker, scan_date) scans, one universe per scan date.
+
+    Returns:
+        (survivors, stages): The set of scans that passed and the per-stage counts summed over all dates.
+    """
+    history = GroupedDailyHistory(client, {ticker for ticker, _ in scans})
+    by_date = {}
+    for ticker, scan_date in scans: by_date.setdefault(scan_date, []).append(ticker)
+    survivors, stages = set(), []
+    with span('screening.bulk', scans=len(scans), dates=len(by_date)):
+        for scan_date, tickers in sorted(by_date.items()):
+            passed, date_stages = screen_liquidity(list(dict.fromkeys(tickers)), scan_date, history, min_avg_volume, min_price)
+            survivors.update((ticker, scan_date) for ticker in passed)
+            _merge_stages(stages, date_stages)
+    return survivors, stages
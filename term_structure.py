@@ -0,0 +1,107 @@
+import numpy as np
+
+METHODS = ('linear', 'variance_fit')
+
+def pack(curves):
+    """
+    Packs ragged per-ticker (dtes, ivs) pairs into flat arrays.
+
+    Returns:
+        (days, ivs, offsets): Ticker i owns days[offsets[i]:offsets[i + 1]] and the matching ivs.
+    """
+    curves = [(np.asarray(dtes, dtype=float).ravel(), np.asarray(ivs, dtype=float).ravel()) for dtes, ivs in curves]
+    offsets = np.zeros(len(curves) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(dtes) for dtes, _ in curves])
+    if not curves: return np.empty(0), np.empty(0), offsets
+    return np.concatenate([dtes for dtes, _ in curves]), np.concatenate([ivs for _, ivs in curves]), offsets
+
+def _sorted_segments(days, ivs, offsets):
+    """Sorts each ticker's points by dte (stable, so ties keep their input order). Returns (owner, days, ivs, counts)."""
+    days, ivs, offsets = np.asarray(days, dtype=float), np.asarray(ivs, dtype=float), np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    order = np.lexsort((days, owner))
+    return owner, days[order], ivs[order], counts
+
+def _linear(owner, days, ivs, offsets, counts, targets):
+    """
+    Piecewise-linear values at every target, computed the way interp1d(kind='linear', fill_value='extrapolate') does:
+    the segment is found with a left searchsorted clipped to 1..n-1, so both ends extrapolate along their outer segments.
+    """
+    # Points below each target per ticker = the left searchsorted index within that ticker's segment.
+    below = np.zeros((len(days) + 1, targets.shape[1]), dtype=np.int64)
+    np.cumsum(days[:, None] < targets[owner], axis=0, out=below[1:])
+    index = below[offsets[1:]] - below[offsets[:-1]]
+    hi = offsets[:-1, None] + np.clip(index, 1, np.maximum(counts - 1, 1)[:, None])
+    lo = hi - 1
+    usable = counts >= 2
+    hi, lo = np.where(usable[:, None], hi, 0), np.where(usable[:, None], lo, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (ivs[hi] - ivs[lo]) / (days[hi] - days[lo])
+        values = slope * (targets - days[lo]) + ivs[lo]
+    return values
+
+def _variance_fit(owner, days, ivs, counts, targets):
+    """
+    Least-squares fit of total variance (iv^2 * dte) as a line in dte per ticker, read back as iv = sqrt(a / dte + b).
+
+    The fitted curve is smooth and never crosses into negative variance, which keeps a single noisy expiry
+    from swinging iv30 or the slope the way it can with piecewise-linear extrapolation.
+    """
+    n = len(counts)
+    variance = ivs ** 2 * days
+    sum_t, sum_w = np.bincount(owner, days, n), np.bincount(owner, variance, n)
+    sum_tt, sum_tw = np.bincount(owner, days * days, n), np.bincount(owner, days * variance, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = (counts * sum_tw - sum_t * sum_w) / (counts * sum_tt - sum_t ** 2)
+        a = (sum_w - b * sum_t) / counts
+        return np.sqrt(np.maximum(a[:, None] / targets + b[:, None], 0.0))
+
+def evaluate(days, ivs, offsets, targets, method='linear'):
+    """
+    Evaluates every ticker's term structure at the target dtes in one vectorized pass.
+
+    Args:
+        days, ivs, offsets: Packed points, as returned by pack(). Points need not be sorted.
+        targets: DTEs to evaluate at, shared by every ticker, or an array shaped (tickers, k) of per-ticker DTEs.
+        method (str): 'linear' matches scanner.build_term_structure exactly, including its extrapolation;
+            'variance_fit' uses a fitted total-variance curve instead.
+
+    Returns:
+        np.ndarray: Shaped (tickers, k). A ticker with one point is flat at that IV and one with none is 0,
+        as with build_term_structure. A variance fit needs two distinct dtes and falls back to 'linear' otherwise.
+    """
+    if method not in METHODS: raise ValueError(f"Unknown term structure method '{method}'. Expected one of {METHODS}.")
+    owner, days, ivs, counts = _sorted_segments(days, ivs, offsets)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    targets = np.asarray(targets, dtype=float)
+    if targets.ndim < 2: targets = np.broadcast_to(targets, (len(counts), targets.size))
+
+    values = _linear(owner, days, ivs, offsets, counts, targets)
+    if method == 'variance_fit':
+        fitted = _variance_fit(owner, days, ivs, counts, targets)
+        values = np.where(np.isfinite(fitted), fitted, values)
+    first = np.zeros(len(counts))
+    first[counts > 0] = ivs[offsets[:-1][counts > 0]]
+    return np.where((counts >= 2)[:, None], values, first[:, None])
+
+def term_structure_metrics(days, ivs, offsets, method='linear', near_dte=30, far_dte=45):
+    """
+    Returns (iv30, ts_slope, front_iv) arrays for every packed ticker.
+
+    iv30 is the curve at near_dte, ts_slope is the change from the front expiry to far_dte per day (0 when the
+    front expiry is already at far_dte), and front_iv is the quoted IV of the nearest expiry. Tickers without
+    any points get iv30 = 0 and NaN for front_iv.
+    """
+    owner, days, ivs, counts = _sorted_segments(days, ivs, offsets)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    has_points = counts > 0
+    front_dte, front_iv = np.full(len(counts), np.nan), np.full(len(counts), np.nan)
+    front_dte[has_points], front_iv[has_points] = days[offsets[:-1][has_points]], ivs[offsets[:-1][has_points]]
+
+    fixed = evaluate(days, ivs, offsets, [near_dte, far_dte], method)
+    at_front = evaluate(days, ivs, offsets, np.where(has_points, front_dte, near_dte)[:, None], method)[:, 0]
+    gap = far_dte - front_dte
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ts_slope = np.where(gap != 0, (fixed[:, 1] - at_front) / gap, 0.0)
+    return fixed[:, 0], ts_slope, front_iv
@@ -0,0 +1,136 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import config
+import backtest_engine as engine
+import performance_metrics
+from feature_store import get_feature_store
+
+SWEEP_PARAMETERS = ('AVG_VOLUME_THRESHOLD', 'IV_RV_RATIO_THRESHOLD', 'TERM_STRUCTURE_SLOPE_THRESHOLD')
+# Every record from collect_event_features() has these columns.
+EVENT_COLUMNS = (*engine._new_features(None, None), 'event_date', 'exit_date', 'entry_price', 'exit_price')
+
+def collect_event_features(events, client, grid, max_workers=config.BACKTEST_MAX_WORKERS):
+    """
+    Computes the raw scanner features and entry/exit spread prices once per event.
+
+    Events that fail even the loosest thresholds in the grid are not priced, since no combination can trade them.
+
+    Returns:
+        pd.DataFrame: One row per event, in event order.
+    """
+    min_volume = min(grid['AVG_VOLUME_THRESHOLD'])
+    min_ratio = min(grid['IV_RV_RATIO_THRESHOLD'])
+    max_slope = max(grid['TERM_STRUCTURE_SLOPE_THRESHOLD'])
+
+    def collect(indexed_event):
+        i, (event_date, ticker) = indexed_event
+        print(f"Collecting features for event {i+1}/{len(events)}: {ticker} on {event_date}")
+        scan_date = engine.get_scan_date(event_date)
+        try:
+            features = engine.get_historical_features(ticker, scan_date, client, min_avg_volume=min_volume)
+        except Exception as e:
+            print(f"  - Feature collection failed: {e}")
+            features = {**engine._new_features(ticker, scan_date), "status": "error"}
+        record = {"event_date": event_date, "scan_date": scan_date, **features, "exit_date": None, "entry_price": None, "exit_price": None}
+
+        if (features["status"] == "complete" and features["macro_passed"] and features.get("earnings_move_passed") in (None, True)
+                and features["iv_rv_ratio"] >= min_ratio and features["ts_slope"] <= max_slope):
+            entry_datetime, exit_datetime = engine.get_precise_trade_times(event_date, ticker)
+            if entry_datetime and exit_datetime:
+                legs = engine.get_trade_legs(entry_datetime, features["underlying_price"])
+                record["exit_date"] = exit_datetime.date()
+                record["entry_price"], record["exit_price"] = engine.get_historical_spread_prices(
+                    client, ticker, [entry_datetime, exit_datetime], *legs)
+        return record
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        records = list(executor.map(collect, enumerate(events)))
+    get_feature_store().flush()
+    return pd.DataFrame(records)
+
+def evaluate_grid(features_df, grid, initial_capital, backtest_days):
+    """
+    Evaluates every threshold combination in the grid against precomputed event features.
+
+    The scanner checks are evaluated for all combinations at once as an (events x combinations)
+    mask. Capital is then replayed in event order, as one vector across all combinations, with
+    the same sizing rules as backtest_engine.replay_trades.
+
+    Returns:
+        pd.DataFrame: One row per combination with its thresholds, trade count, win rate,
+        ending capital, total return, Sharpe, Sortino, max drawdown and Calmar. Empty when there are no events.
+    """
+    # A sweep without events has no columns at all.
+    features_df = features_df.reindex(columns=features_df.columns.union(EVENT_COLUMNS, sort=False))
+    combos = list(itertools.product(*(grid[name] for name in SWEEP_PARAMETERS)))
+    thresholds = np.array(combos, dtype=float)
+
+    def column(name):
+        return pd.to_numeric(features_df[name], errors='coerce').to_numpy(dtype=float)
+
+    complete = ((features_df['status'] == 'complete') & features_df['macro_passed'].eq(True)).to_numpy()
+    # Events scanned before the earnings-move check existed have no verdict and are not held back by it.
+    if 'earnings_move_passed' in features_df: complete &= features_df['earnings_move_passed'].ne(False).to_numpy()
+    with np.errstate(invalid='ignore'):
+        passed = (complete[:, None]
+                  & (column('avg_volume')[:, None] >= thresholds[None, :, 0])
+                  & (column('iv_rv_ratio')[:, None] >= thresholds[None, :, 1])
+                  & (column('ts_slope')[:, None] <= thresholds[None, :, 2]))
+    entry_prices, exit_prices = column('entry_price'), column('exit_price')
+    tradable = (entry_prices > 0) & ~np.isnan(exit_prices)
+
+    capital = np.full(len(combos), float(initial_capital))
+    trade_pnl = np.zeros(passed.shape)
+    traded = np.zeros(passed.shape, dtype=bool)
+    for i in np.flatnonzero(tradable & passed.any(axis=1)):
+        risk_amount = capital * config.RISK_ALLOCATION_PERCENT
+        num_contracts = risk_amount // (entry_prices[i] * 100)
+        traded[i] = passed[i] & (num_contracts > 0)
+        trade_pnl[i] = np.where(traded[i], (exit_prices[i] - entry_prices[i]) * 100 * num_contracts, 0.0)
+        capital += trade_pnl[i]
+
+    # Book each trade's P&L on its exit day to build all equity curves at once.
+    backtest_days = pd.DatetimeIndex(backtest_days)
+    exit_days = pd.to_datetime(features_df['exit_date']).dt.normalize()
+    positions = backtest_days.get_indexer(exit_days)
+    booked = positions >= 0
+    daily_pnl = np.zeros((len(backtest_days), len(combos)))
+    np.add.at(daily_pnl, positions[booked], trade_pnl[booked])
+    curves = initial_capital + np.cumsum(daily_pnl, axis=0)
+
+    trade_counts = traded.sum(axis=0)
+    scores = performance_metrics.score_curves(curves, range(len(combos)), trade_counts)
+    table = pd.DataFrame(thresholds, columns=list(SWEEP_PARAMETERS))
+    table['win_rate'] = np.where(trade_counts > 0, (traded & (trade_pnl > 0)).sum(axis=0) / np.maximum(trade_counts, 1), np.nan)
+    table['ending_capital'] = capital
+    table = pd.concat([table, scores], axis=1)
+    return table.iloc[:0] if features_df.empty else table
+
+def run_sweep(start_date, end_date, grid, features_df=None, initial_capital=100000.00):
+    """
+    Runs a threshold sweep over a backtest period. Pass features_df from an earlier run to skip all data fetching.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): The metrics table sorted by Sharpe, and the event features used.
+    """
+    if features_df is None:
+        events = engine.load_backtest_events(start_date, end_date)
+        features_df = collect_event_features(events, engine.get_cached_client(), grid)
+    backtest_days = pd.to_datetime(pd.bdate_range(start=start_date, end=end_date))
+    table = evaluate_grid(features_df, grid, initial_capital, backtest_days)
+    return table.sort_values('sharpe', ascending=False).reset_index(drop=True), features_df
+
+if __name__ == "__main__":
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=365)
+    grid = {
+        'AVG_VOLUME_THRESHOLD': [1000000, 1500000, 2000000],
+        'IV_RV_RATIO_THRESHOLD': [1.0, 1.25, 1.5],
+        'TERM_STRUCTURE_SLOPE_THRESHOLD': [-0.002, -0.00406, -0.006],
+    }
+    results_table, _ = run_sweep(start_date, end_date, grid)
+    print("\n--- Threshold Sweep Results (best Sharpe first) ---")
+    print(results_table.to_string())
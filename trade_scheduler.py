@@ -0,0 +1,84 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+# Which trade status each action needs, which trade field holds its due time, and the offset from it in seconds.
+ACTIONS = {
+    'prewarm': ('pending_entry', 'entry_time', -config.MARKET_DATA_PREWARM_MINUTES * 60),
+    'entry': ('pending_entry', 'entry_time', 0),
+    'exit': ('open', 'exit_time', 0),
+}
+# Actions that only help ahead of time and are dropped rather than run late.
+SKIP_IF_LATE = ('prewarm',)
+
+class TradeScheduler:
+    """
+    Runs trade prewarms, entries and exits at their exact due time from a priority queue.
+
+    The loop sleeps on a condition until the earliest due action, and schedule() wakes it
+    whenever the queue changes. A trade gets its prewarm and entry queued while it is
+    'pending_entry' and its exit once it is 'open'; actions without a handler are never queued, and
+    a prewarm already past due when scheduled is skipped.
+    Calling schedule() again after changing a trade's times replaces the queued action.
+    Actions that fall due at the same moment run concurrently.
+    """
+    def __init__(self, handlers, max_workers=config.SCHEDULER_MAX_WORKERS):
+        self.handlers = handlers
+        self.condition = threading.Condition()
+        self.queue = []
+        self.due = {}
+        self.counter = itertools.count()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.running = False
+
+    def schedule(self, trade):
+        """Queues the trade's next actions for its current status; a no-op for finished trades."""
+        for action, (status, time_field, offset) in ACTIONS.items():
+            if trade['status'] != status or action not in self.handlers: continue
+            due_at = trade[time_field].timestamp() + offset
+            if action in SKIP_IF_LATE and due_at <= time.time(): continue
+            key = (id(trade), action)
+            with self.condition:
+                if self.due.get(key) == due_at: continue
+                self.due[key] = due_at
+                heapq.heappush(self.queue, (due_at, next(self.counter), action, trade))
+                self.condition.notify()
+
+    def _pop_due(self, now):
+        """Removes and returns every valid action due by now. Entries superseded by a reschedule are dropped."""
+        ready = []
+        while self.queue and self.queue[0][0] <= now:
+            due_at, _, action, trade = heapq.heappop(self.queue)
+            key = (id(trade), action)
+            if self.due.get(key) != due_at: continue
+            del self.due[key]
+            if trade['status'] == ACTIONS[action][0]: ready.append((action, trade))
+        return ready
+
+    def _dispatch(self, action, trade):
+        try:
+            self.handlers[action](trade)
+        except Exception as e:
+            print(f"Scheduled {action} for {trade['ticker']} failed: {e}")
+
+    def run(self):
+        """Blocks, dispatching actions as they fall due, until stop() is called."""
+        self.running = True
+        with self.condition:
+            while self.running:
+                now = time.time()
+                for action, trade in self._pop_due(now):
+                    self.executor.submit(self._dispatch, action, trade)
+                timeout = self.queue[0][0] - now if self.queue else None
+                if timeout is None or timeout > 0:
+                    self.condition.wait(timeout)
+
+    def stop(self):
+        """Stops the run loop and waits for in-flight actions to finish."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import config
+
+ACTIVE_STATUSES = ('pending_entry', 'processing_entry', 'open', 'processing_exit')
+ORDER_ID_FIELDS = {'entry_order_id': 'entry', 'stop_loss_order_id': 'stop_loss', 'exit_order_id': 'exit'}
+TIME_FIELDS = ('entry_time', 'exit_time')
+# Rebuilt by the bot after recovery rather than serialized.
+UNJOURNALED_FIELDS = ('contract',)
+
+def trade_id_for(ticker, entry_time):
+    return f"{ticker}-{entry_time.strftime('%Y%m%d%H%M')}"
+
+def _encode(fields):
+    record = {}
+    for name, value in fields.items():
+        if name in UNJOURNALED_FIELDS: continue
+        record[name] = value.isoformat() if name in TIME_FIELDS else value
+    return record
+
+def _decode(record):
+    for name in TIME_FIELDS:
+        if record.get(name): record[name] = datetime.fromisoformat(record[name]).astimezone(config.MARKET_TIMEZONE)
+    return record
+
+class TradeStateStore:
+    """
+    In-memory trade state indexed by trade id, order id and ticker, backed by an append-only JSONL journal.
+
+    Every change goes through add(), update() or update_if() under one lock and is appended to the journal
+    before the call returns. recover() replays the journal to rebuild the active trades after a
+    restart. It then compacts the journal down to just those trades.
+    """
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        os.makedirs(os.path.dirname(journal_path) or '.', exist_ok=True)
+        self.lock = threading.RLock()
+        self.trades = {}
+        self.by_order_id = {}
+        self.by_ticker = {}
+        self.journal = None
+
+    def _append(self, op, trade_id, fields):
+        if self.journal is None: self.journal = open(self.journal_path, 'a')
+        self.journal.write(json.dumps({'op': op, 'trade_id': trade_id, 'at': time.time(), 'fields': _encode(fields)}) + '\n')
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def _index(self, trade, fields):
+        for field, role in ORDER_ID_FIELDS.items():
+            if fields.get(field) is not None: self.by_order_id[fields[field]] = (trade, role)
+        self.by_ticker.setdefault(trade['ticker'], {})[trade['trade_id']] = trade
+
+    def add(self, trade):
+        """
+        Stores a new trade (assigning its trade_id) and returns it; returns the stored trade if an active one already exists.
+
+        A finished trade with the same id (e.g. one cancelled when its earnings date moved) is replaced.
+        """
+        with self.lock:
+            trade.setdefault('trade_id', trade_id_for(trade['ticker'], trade['entry_time']))
+            existing = self.trades.get(trade['trade_id'])
+            if existing is not None and existing['status'] in ACTIVE_STATUSES: return existing
+            self.trades[trade['trade_id']] = trade
+            self._index(trade, trade)
+            self._append('add', trade['trade_id'], trade)
+            return trade
+
+    def update(self, trade, **changes):
+        """Applies a state transition to a stored trade and journals it."""
+        with self.lock:
+            trade.update(changes)
+            self._index(trade, changes)
+            self._append('update', trade['trade_id'], changes)
+
+    def update_if(self, trade, expected, **changes):
+        """Applies a transition only if the trade is still in the expected status. Returns whether it was applied."""
+        with self.lock:
+            if trade['status'] != expected: return False
+            self.update(trade, **changes)
+            return True
+
+    def find_by_order_id(self, order_id):
+        """Returns (trade, 'entry' | 'stop_loss' | 'exit') for an order id, or (None, None)."""
+        with self.lock:
+            return self.by_order_id.get(order_id, (None, None))
+
+    def trades_for_ticker(self, ticker):
+        with self.lock:
+            return list(self.by_ticker.get(ticker, {}).values())
+
+    def all_trades(self):
+        with self.lock:
+            return list(self.trades.values())
+
+    def active_trades(self):
+        with self.lock:
+            return [trade for trade in self.trades.values() if trade['status'] in ACTIVE_STATUSES]
+
+    def recover(self):
+        """Rebuilds the active trades from the journal and compacts it. Returns the recovered trades."""
+        with self.lock:
+            if not os.path.exists(self.journal_path): return []
+            trades = {}
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-write can leave a truncated last line; everything before it is intact.
+                        continue
+                    fields = _decode(entry['fields'])
+                    if entry['op'] == 'add': trades[entry['trade_id']] = fields
+                    elif entry['trade_id'] in trades: trades[entry['trade_id']].update(fields)
+
+            self.trades, self.by_order_id, self.by_ticker = {}, {}, {}
+            for trade_id, trade in trades.items():
+                if trade['status'] not in ACTIVE_STATUSES: continue
+                self.trades[trade_id] = trade
+                self._index(trade, trade)
+
+            if self.journal is not None: self.journal.close(); self.journal = None
+            with open(self.journal_path + '.tmp', 'w') as f:
+                for trade_id, trade in self.trades.items():
+                    f.write(json.dumps({'op': 'add', 'trade_id': trade_id, 'at': time.time(), 'fields': _encode(trade)}) + '\n')
+            os.replace(self.journal_path + '.tmp', self.journal_path)
+            return list(self.trades.values())
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_trade_store():
+    """Returns the shared TradeStateStore instance."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TradeStateStore(os.path.join(config.CACHE_DIR, 'trade_journal.jsonl'))
+        return _store
@@ -0,0 +1,168 @@
+import bisect
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+import config
+from earnings_store import normalize_ticker
+
+INDEX_PAGES = {
+    'SP500': 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies',
+    'SP400': 'https://en.wikipedia.org/wiki/List_of_S%26P_400_companies',
+    'SP600': 'https://en.wikipedia.org/wiki/List_of_S%26P_600_companies',
+}
+
+def _flat_columns(table):
+    return [' '.join(dict.fromkeys(str(part) for part in col)) if isinstance(col, tuple) else str(col) for col in table.columns]
+
+def _find_column(columns, *words):
+    for i, column in enumerate(columns):
+        if all(word in column for word in words): return i
+    return None
+
+def reconstruct_history(current_members, changes):
+    """
+    Walks a list of (effective_date, added, removed) changes backwards from today's membership.
+
+    Returns [(effective_date, members)] oldest first; each entry is the membership from that date on.
+    The oldest entry is dated the day before the earliest change and holds the reconstructed original membership.
+    """
+    changes_by_date = {}
+    for effective_date, added, removed in changes:
+        day_added, day_removed = changes_by_date.setdefault(effective_date, (set(), set()))
+        day_added.update(added); day_removed.update(removed)
+
+    members = set(current_members)
+    snapshots = []
+    for effective_date in sorted(changes_by_date, reverse=True):
+        snapshots.append((effective_date, frozenset(members)))
+        added, removed = changes_by_date[effective_date]
+        members = (members - added) | removed
+    if changes_by_date:
+        snapshots.append((min(changes_by_date) - timedelta(days=1), frozenset(members)))
+    return snapshots[::-1]
+
+def fetch_index_history(url):
+    """Reads current constituents and, when the page has one, the dated changes table from a Wikipedia index page."""
+    current, changes = None, []
+    for table in pd.read_html(url):
+        columns = _flat_columns(table)
+        if current is None and 'Symbol' in columns:
+            current = [normalize_ticker(str(symbol)) for symbol in table.iloc[:, columns.index('Symbol')].dropna()]
+            continue
+        date_col, added_col, removed_col = _find_column(columns, 'Date'), _find_column(columns, 'Added', 'Ticker'), _find_column(columns, 'Removed', 'Ticker')
+        if changes or None in (date_col, added_col, removed_col): continue
+        for _, row in table.iterrows():
+            effective_date = pd.to_datetime(row.iloc[date_col], errors='coerce')
+            if pd.isna(effective_date): continue
+            added = [normalize_ticker(str(row.iloc[added_col]))] if pd.notna(row.iloc[added_col]) else []
+            removed = [normalize_ticker(str(row.iloc[removed_col]))] if pd.notna(row.iloc[removed_col]) else []
+            changes.append((effective_date.date(), added, removed))
+    if current is None:
+        raise ValueError(f"Could not find the components table with a 'Symbol' column at {url}.")
+    return current, changes
+
+class UniverseStore:
+    """
+    Dated constituent snapshots of the S&P 500/400/600, answering "members as of date D" from memory.
+
+    Snapshots are stored in SQLite. Each one holds an index's membership from its date until the
+    next snapshot of the same index. Indexes whose page had no changes table only have today's members,
+    and are recorded as such in index_meta so results drawn from them can be flagged for survivorship bias.
+    """
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS constituents (snapshot_date TEXT, index_name TEXT, ticker TEXT, "
+                        "PRIMARY KEY (snapshot_date, index_name, ticker))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS index_meta (index_name TEXT PRIMARY KEY, refreshed TEXT, changes INTEGER)")
+        self.db.commit()
+        self.index = None
+
+    def _load_index(self):
+        with self.lock:
+            if self.index is None:
+                snapshots = {}
+                for snapshot_date, index_name, ticker in self.db.execute("SELECT snapshot_date, index_name, ticker FROM constituents"):
+                    snapshots.setdefault(index_name, {}).setdefault(snapshot_date, set()).add(ticker)
+                self.index = {}
+                for index_name, by_date in snapshots.items():
+                    dates = sorted(by_date)
+                    self.index[index_name] = ([datetime.strptime(d, '%Y-%m-%d').date() for d in dates],
+                                              [frozenset(by_date[d]) for d in dates])
+            return self.index
+
+    def save_snapshot(self, snapshot_date, index_name, tickers):
+        """Stores (or replaces) one index's membership as of snapshot_date."""
+        date_str = snapshot_date.strftime('%Y-%m-%d')
+        with self.lock:
+            self.db.execute("DELETE FROM constituents WHERE snapshot_date = ? AND index_name = ?", (date_str, index_name))
+            self.db.executemany("INSERT OR REPLACE INTO constituents VALUES (?, ?, ?)",
+                                [(date_str, index_name, ticker) for ticker in set(tickers)])
+            self.db.commit()
+            self.index = None
+
+    def save_meta(self, index_name, refreshed, num_changes):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO index_meta VALUES (?, ?, ?)", (index_name, refreshed.strftime('%Y-%m-%d'), num_changes))
+            self.db.commit()
+
+    def survivorship_biased_indexes(self):
+        """Returns the indexes whose last refresh found no change history, so their past membership is today's."""
+        with self.lock:
+            return sorted(name for name, in self.db.execute("SELECT index_name FROM index_meta WHERE changes = 0"))
+
+    def latest_snapshot_date(self):
+        dates = [snapshot_dates[-1] for snapshot_dates, _ in self._load_index().values()]
+        return min(dates) if len(dates) == len(INDEX_PAGES) else None
+
+    def refresh(self, max_age_days=None):
+        """Scrapes new snapshots (and the change history) only when the stored ones are missing or too old."""
+        max_age_days = config.UNIVERSE_SNAPSHOT_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        today = datetime.now().date()
+        latest = self.latest_snapshot_date()
+        if latest is not None and (today - latest).days <= max_age_days: return
+        for index_name, url in INDEX_PAGES.items():
+            try:
+                current, changes = fetch_index_history(url)
+            except Exception as e:
+                print(f"Could not refresh {index_name} constituents, using stored snapshots: {e}")
+                continue
+            for effective_date, members in reconstruct_history(current, changes):
+                self.save_snapshot(effective_date, index_name, members)
+            self.save_snapshot(today, index_name, current)
+            self.save_meta(index_name, today, len(changes))
+            print(f"Saved {index_name} snapshot with {len(current)} members and {len(changes)} historical changes.")
+            if not changes:
+                print(f"WARNING: No changes table found for {index_name}; its history is today's members, so results are survivorship-biased.")
+
+    def members_as_of(self, as_of):
+        """Returns the union of all index members on a date (the earliest snapshot is used before coverage starts)."""
+        members = set()
+        for snapshot_dates, snapshots in self._load_index().values():
+            idx = bisect.bisect_right(snapshot_dates, as_of) - 1
+            members |= snapshots[max(idx, 0)]
+        return members
+
+    def members_between(self, start_date, end_date):
+        """Returns every ticker that was a member at any point between the two dates."""
+        members = set()
+        for snapshot_dates, snapshots in self._load_index().values():
+            lo = max(bisect.bisect_right(snapshot_dates, start_date) - 1, 0)
+            hi = bisect.bisect_right(snapshot_dates, end_date)
+            for snapshot in snapshots[lo:max(hi, lo + 1)]:
+                members |= snapshot
+        return sorted(members)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_universe_store():
+    """Returns the shared UniverseStore instance."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UniverseStore(os.path.join(config.CACHE_DIR, 'universe.sqlite'))
+        return _store
@@ -0,0 +1,70 @@
+import numpy as np
+
+def _yang_zhang_terms(open_, high, low, close, prev_close):
+    """Returns the per-bar (overnight, close-to-close, Rogers-Satchell) variance terms."""
+    log_ho = np.log(high / open_)
+    log_lo = np.log(low / open_)
+    log_co = np.log(close / open_)
+    log_oc = np.log(open_ / prev_close)
+    log_cc = np.log(close / prev_close)
+    rs = log_ho * (log_ho - log_co) + log_lo * (log_lo - log_co)
+    return log_oc**2, log_cc**2, rs
+
+def _combine(open_sum, close_sum, rs_sum, window, trading_periods):
+    open_vol = open_sum * (1.0 / (window - 1.0))
+    close_vol = close_sum * (1.0 / (window - 1.0))
+    window_rs = rs_sum * (1.0 / (window - 1.0))
+    k = 0.34 / (1.34 + ((window + 1) / (window - 1)))
+    return np.sqrt(open_vol + k * close_vol + (1 - k) * window_rs) * np.sqrt(trading_periods)
+
+def _as_2d(values):
+    return np.atleast_2d(np.asarray(values, dtype=float))
+
+def yang_zhang_latest(open_, high, low, close, window=30, trading_periods=252):
+    """
+    Calculates the latest Yang-Zhang volatility for every ticker in one pass.
+
+    Args:
+        open_, high, low, close: Arrays shaped (tickers, days), oldest bar first. Shorter histories
+            can be left-padded with NaN.
+        window (int): The rolling window length in bars.
+        trading_periods (int): Bars per year used to annualize.
+
+    Returns:
+        np.ndarray: One volatility per ticker. NaN where fewer than window + 1 bars are available.
+    """
+    open_, high, low, close = (_as_2d(a)[:, -(window + 1):] for a in (open_, high, low, close))
+    if close.shape[1] < window + 1:
+        return np.full(close.shape[0], np.nan)
+    open_sq, close_sq, rs = _yang_zhang_terms(open_[:, 1:], high[:, 1:], low[:, 1:], close[:, 1:], close[:, :-1])
+    return _combine(open_sq.sum(axis=1), close_sq.sum(axis=1), rs.sum(axis=1), window, trading_periods)
+
+class RollingYangZhang:
+    """ Keeps rolling Yang-Zhang sums per ticker so each new daily bar is an O(1) update. """
+    def __init__(self, open_, high, low, close, window=30, trading_periods=252):
+        open_, high, low, close = (_as_2d(a)[:, -(window + 1):] for a in (open_, high, low, close))
+        if close.shape[1] < window + 1:
+            raise ValueError(f"At least {window + 1} bars are needed to seed the rolling window.")
+        self.window = window
+        self.trading_periods = trading_periods
+        terms = _yang_zhang_terms(open_[:, 1:], high[:, 1:], low[:, 1:], close[:, 1:], close[:, :-1])
+        self.terms = np.stack(terms, axis=-1)
+        self.sums = self.terms.sum(axis=1)
+        self.last_close = close[:, -1].copy()
+        self.pos = 0
+
+    def update(self, open_, high, low, close):
+        """Adds one new bar per ticker (1-D arrays) and returns the updated volatilities."""
+        open_, high, low, close = (np.asarray(a, dtype=float) for a in (open_, high, low, close))
+        new_terms = np.stack(_yang_zhang_terms(open_, high, low, close, self.last_close), axis=-1)
+        self.sums += new_terms - self.terms[:, self.pos]
+        self.terms[:, self.pos] = new_terms
+        self.pos = (self.pos + 1) % self.window
+        # Re-sum once per full window so floating-point drift (and any NaN that has left the window) is cleared.
+        if self.pos == 0: self.sums = self.terms.sum(axis=1)
+        self.last_close = close.copy()
+        return self.value()
+
+    def value(self):
+        """Returns the current volatility for every ticker."""
+        return _combine(self.sums[:, 0], self.sums[:, 1], self.sums[:, 2], self.window, self.trading_periods)